@@ -4,6 +4,7 @@ from itertools import permutations
 
 class Player:
     FIRST_PLAYER = "red"
+    SECOND_PLAYER = "blue"
 
     def __init__(self, player, n):
         """
@@ -100,6 +101,39 @@ class Player:
         for hex in self.possibleMoves.keys():
             self.possibleMoves[hex] = self.evalFunction(hex, player)
 
+    def setup(self, cells, nturns):
+        """
+        Called instead of turn (for each turn so far) when the game starts from a given position. The parameter
+        cells maps each occupied (r, q) to the colour of its token, and nturns is the number of turns played so far
+        """
+        self.hexTaken = [hex for hex, colour in cells.items() if colour == self.player]
+        self.opponentTaken = [hex for hex, colour in cells.items() if colour != self.player]
+        self.possibleMoves = {}
+        for row in range(self.n):
+            for column in range(self.n):
+                if (row, column) not in cells:
+                    self.possibleMoves[(row, column)] = None
+
+        # Turns played by this player so far (red moves first)
+        if self.player == Player.FIRST_PLAYER:
+            self.numTurns = (nturns + 1) // 2
+        else:
+            self.numTurns = nturns // 2
+
+        # The first move is needed to handle a STEAL on the next turn
+        if nturns == 1 and len(cells) == 1:
+            firstMove = next(iter(cells))
+            if self.player == Player.FIRST_PLAYER:
+                self.lastMove = firstMove
+            else:
+                self.opponentMove = firstMove
+
+        # Update evalScores in possibleMoves (as turn does after each move)
+        if nturns > 0:
+            player = Player.FIRST_PLAYER if nturns % 2 == 1 else Player.SECOND_PLAYER
+            for hex in self.possibleMoves.keys():
+                self.possibleMoves[hex] = self.evalFunction(hex, player)
+
     def invert(self, coordinate):
         """
         Finds the inverse hex across the main line of symmetry
@@ -3,6 +3,9 @@ import random
 from itertools import permutations
 from statistics import stdev
 
+from ..common.evalcache import EvalCache, ZobristHash
+from ..common.position import unpackPosition
+
 
 class Player:
     FIRST_PLAYER = 'red'
@@ -26,6 +29,10 @@ class Player:
         self.opponentTaken = []
         self.hexTaken = []
         self.possibleMoves = {}
+        self.resetSearchStats()
+        # Leaf evaluations, kept across turns
+        self.evalCache = EvalCache()
+        self.zobrist = ZobristHash(n)
 
         for row in range(n):
             for column in range(n):
@@ -103,20 +110,32 @@ class Player:
         """
 
         # Update evalScores in possibleMoves
+        self.searchStats["depth"] = Player.CUTOFF_DEPTH + 1
+        positionHash = self.zobrist.positionHash(self.hexTaken, self.opponentTaken)
+        rotatedHash = self.zobrist.rotatedHash(self.hexTaken, self.opponentTaken)
+        # If the position is the same after a half turn of the board, each hex leads to the same position as
+        # the hex it is turned onto (but turned), so only the smaller of the two is searched
+        symmetric = positionHash == rotatedHash
         for hex in self.possibleMoves:
+            if symmetric and self.rotate(hex) < hex:
+                continue
             # Copy the current state
-            # newState = [hexTaken, opponentTaken, possibleMoves]
-            state = [self.hexTaken, self.opponentTaken, self.possibleMoves]
+            # newState = [hexTaken, opponentTaken, possibleMoves, hash, hash after a half turn]
+            state = [self.hexTaken, self.opponentTaken, self.possibleMoves, positionHash, rotatedHash]
             # State is represented as hexTaken and opponentTaken
             self.possibleMoves[hex] = self.minimaxValue(self.applyHex(state, hex, True), Player.CUTOFF_DEPTH, True,
                                                         -inf, inf)
+        if symmetric:
+            for hex in self.possibleMoves:
+                if self.rotate(hex) < hex:
+                    self.possibleMoves[hex] = self.possibleMoves[self.rotate(hex)]
         return max(self.possibleMoves, key=self.possibleMoves.get)
 
     def applyHex(self, state, hex, isMax):
         """
-        Returns a state represented by copies of hexTaken, opponentTaken and possibleMoves
+        Returns a state represented by copies of hexTaken, opponentTaken and possibleMoves, and its hashes
         """
-        newState = [state[0].copy(), state[1].copy(), state[2].copy()]
+        newState = [state[0].copy(), state[1].copy(), state[2].copy(), state[3], state[4]]
 
         # Add changes to the state
         if self.player == Player.FIRST_PLAYER:
@@ -126,49 +145,103 @@ class Player:
 
         if isMax:
             newState[0].append(hex)
+            newState[3] ^= self.zobrist.ownKeys[hex]
+            newState[4] ^= self.zobrist.rotatedOwnKeys[hex]
             # Add capture hexes to possibleMoves
             for coordinates in self.capture(hex, player, newState[0], newState[1]):
                 newState[1].remove(coordinates)
                 newState[2][coordinates] = 0
+                newState[3] ^= self.zobrist.opponentKeys[coordinates]
+                newState[4] ^= self.zobrist.rotatedOpponentKeys[coordinates]
         else:
             newState[1].append(hex)
+            newState[3] ^= self.zobrist.opponentKeys[hex]
+            newState[4] ^= self.zobrist.rotatedOpponentKeys[hex]
             for coordinates in self.capture(hex, player, newState[0], newState[1]):
                 newState[0].remove(coordinates)
                 newState[2][coordinates] = 0
+                newState[3] ^= self.zobrist.ownKeys[coordinates]
+                newState[4] ^= self.zobrist.rotatedOwnKeys[coordinates]
         newState[2].pop(hex)
 
         return newState
 
     def minimaxValue(self, state, cutoff, isMax, alpha, beta):
+        self.searchStats["nodes"] += 1
         if cutoff == 0:
-            return self.evalFunction(state[0], state[1])
+            self.searchStats["leaves"] += 1
+            return self.cachedEval(state)
         if isMax:
             best = -inf
+            # Order moves by their last evaluation, best first
+            moves = state[2]
             if None not in state[2].values():
-                state[2] = sorted(state[2].items(), key=lambda x: x[1], reverse=True)
-            for hex in state[2]:
+                moves = sorted(state[2], key=state[2].get, reverse=True)
+            for i, hex in enumerate(moves):
                 newState = self.applyHex(state, hex, isMax)
                 best = max(best, self.minimaxValue(newState, cutoff - 1, not isMax, alpha, beta))
                 alpha = max(alpha, best)
 
                 if beta <= alpha:
+                    self.countCutoff(i)
                     break
 
             return best
         else:
             best = inf
-            for hex in state[2]:
+            for i, hex in enumerate(state[2]):
                 newState = self.applyHex(state, hex, isMax)
                 best = min(best, self.minimaxValue(newState, cutoff - 1, not isMax, alpha, beta))
                 beta = min(beta, best)
 
                 if beta <= alpha:
+                    self.countCutoff(i)
                     break
             return best
 
+    def search_stats(self):
+        """
+        Called by the referee after each action to collect counters describing
+        the search done since the previous call
+        """
+        stats = self.searchStats
+        stats["eval_cache_hits"], stats["eval_cache_misses"] = self.evalCache.takeCounts()
+        self.resetSearchStats()
+        return stats
+
+    def set_space_limit(self, megabytes):
+        """
+        Called by the referee after __init__ (if there is a space limit) with this player's space limit in MB
+        """
+        self.evalCache.setSpaceLimit(megabytes)
+
+    def resetSearchStats(self):
+        """
+        Resets the search counters
+        """
+        self.searchStats = {"nodes": 0, "leaves": 0, "cutoffs": 0, "first_move_cutoffs": 0, "depth": 0}
+
+    def countCutoff(self, moveIndex):
+        """
+        Counts a beta cutoff caused by the move at moveIndex in the move ordering
+        """
+        self.searchStats["cutoffs"] += 1
+        if moveIndex == 0:
+            self.searchStats["first_move_cutoffs"] += 1
+
+    def setup(self, cells, nturns):
+        """
+        Called instead of turn (for each turn so far) when the game starts from a given position. The parameter
+        cells maps each occupied (r, q) to the colour of its token, and nturns is the number of turns played so far
+        """
+        self.possibleMoves = dict.fromkeys(unpackPosition(self, cells, nturns), 0)
+
     def invert(self, coordinate):
         return (coordinate[1], coordinate[0])
 
+    def rotate(self, coordinate):
+        return (self.n - 1 - coordinate[0], self.n - 1 - coordinate[1])
+
     def capture(self, coordinate, player, hexTaken, opponentTaken):
         """
         Returns a list of hexes to be removed as a result of capturing
@@ -240,6 +313,18 @@ class Player:
     def inOpponentHex(self, hex):
         return not (hex in self.hexTaken) or not (hex in self.possibleMoves) and self.hexInBoard(hex)
 
+    def cachedEval(self, state):
+        """
+        Returns the evaluation of a state, from the eval cache if it or its half turn (which evaluates the same)
+        has been evaluated before
+        """
+        key = min(state[3], state[4])
+        value = self.evalCache.get(key)
+        if value is None:
+            value = self.evalFunction(state[0], state[1])
+            self.evalCache.put(key, value)
+        return value
+
     def evalFunction(self, hexTaken, opponentTaken):
         """
         Updates the evaluation score for a hex using weighted features
@@ -302,23 +387,19 @@ class Player:
         if len(opponentTaken) == 0:
             return 0
 
-        teamCount = 0
         freqTable = {}
+        teamTable = {}
         for i in range(self.n):
             freqTable[i] = 0
-
-        if self.player == Player.FIRST_PLAYER:
-            for hex in opponentTaken:
-                freqTable[hex[0]] += 1
-            mostFreq = max(freqTable, key=freqTable.get)
-            for hex in hexTaken:
-                if hex[0] == mostFreq:
-                    teamCount += 1
-        else:
-            for hex in opponentTaken:
-                freqTable[hex[1]] += 1
-            mostFreq = max(freqTable, key=freqTable.get)
-            for hex in hexTaken:
-                if hex[1] == mostFreq:
-                    teamCount += 1
-        return teamCount / freqTable[mostFreq]
\ No newline at end of file
+            teamTable[i] = 0
+
+        axis = 0 if self.player == Player.FIRST_PLAYER else 1
+        for hex in opponentTaken:
+            freqTable[hex[axis]] += 1
+        for hex in hexTaken:
+            teamTable[hex[axis]] += 1
+        mostFreq = max(freqTable.values())
+        # Of the rows tied for the most enemy tokens, count the one with the most player's tokens (rather than
+        # the first), so that the evaluation is the same after a half turn of the board
+        teamCount = max(teamTable[i] for i in freqTable if freqTable[i] == mostFreq)
+        return teamCount / mostFreq
\ No newline at end of file
@@ -1,9 +1,18 @@
 import random
 from itertools import permutations
 
+from ..common.candidates import CandidateGenerator
+from ..common.connection import ConnectionDistance
+from ..common.position import unpackPosition
+
 
 class Player:
     FIRST_PLAYER = "red"
+    SECOND_PLAYER = "blue"
+    # Boards at least this size evaluate only candidate hexes (see CandidateGenerator): those within
+    # CANDIDATE_RADIUS of a token, capturing hexes and hexes connecting tokens to the edges
+    CANDIDATE_MIN_SIZE = 8
+    CANDIDATE_RADIUS = 2
 
     def __init__(self, player, n):
         """
@@ -22,12 +31,16 @@ class Player:
         self.opponentTaken = []
         self.hexTaken = []
         self.possibleMoves = {}
+        self.candidates = None
+        if n >= Player.CANDIDATE_MIN_SIZE:
+            self.candidates = CandidateGenerator(n, Player.CANDIDATE_RADIUS)
 
         # Build possibleMoves dictionary
         for row in range(n):
             for column in range(n):
                 # Key rerpresents coordinates, Value represents eval function
                 self.possibleMoves[(row, column)] = None
+        self.buildConnections()
 
     def action(self):
         """
@@ -47,7 +60,8 @@ class Player:
                     chosen = (start, self.n // 2)
         else:
             # Choose hex with highest evaluation function
-            chosen = max(self.possibleMoves, key=self.possibleMoves.get)
+            evaluated = [hex for hex in self.possibleMoves if self.possibleMoves[hex] is not None]
+            chosen = max(evaluated, key=self.possibleMoves.get)
         return ("PLACE", chosen[0], chosen[1])
 
     def turn(self, player, action):
@@ -71,14 +85,18 @@ class Player:
                 self.lastMove = invertedHex
                 self.possibleMoves.pop(invertedHex)
                 self.hexTaken.append(invertedHex)
+                self.setConnections(self.opponentMove, ConnectionDistance.EMPTY)
+                self.setConnections(invertedHex, ConnectionDistance.OWN)
             elif action[0] == 'PLACE':
                 self.lastMove = (action[1], action[2])
                 self.possibleMoves.pop(self.lastMove)
                 self.hexTaken.append(self.lastMove)
+                self.setConnections(self.lastMove, ConnectionDistance.OWN)
                 # Add capture hexes to possibleMoves
                 for hex in self.capture(self.lastMove, player):
                     self.opponentTaken.remove(hex)
                     self.possibleMoves[hex] = None
+                    self.setConnections(hex, ConnectionDistance.EMPTY)
             self.numTurns += 1
         else:
             if action[0] == "STEAL":
@@ -88,18 +106,64 @@ class Player:
                 self.opponentMove = invertedHex
                 self.possibleMoves.pop(invertedHex)
                 self.opponentTaken.append(invertedHex)
+                self.setConnections(self.lastMove, ConnectionDistance.EMPTY)
+                self.setConnections(invertedHex, ConnectionDistance.BLOCKED)
             elif action[0] == 'PLACE':
                 self.opponentMove = (action[1], action[2])
                 self.possibleMoves.pop(self.opponentMove)
                 self.opponentTaken.append(self.opponentMove)
+                self.setConnections(self.opponentMove, ConnectionDistance.BLOCKED)
                 for hex in self.capture(self.opponentMove, player):
                     self.hexTaken.remove(hex)
                     self.possibleMoves[hex] = None
+                    self.setConnections(hex, ConnectionDistance.EMPTY)
 
         # Update evalScores in possibleMoves
-        for hex in self.possibleMoves.keys():
+        self.evaluateMoves(player)
+
+    def setup(self, cells, nturns):
+        """
+        Called instead of turn (for each turn so far) when the game starts from a given position. The parameter
+        cells maps each occupied (r, q) to the colour of its token, and nturns is the number of turns played so far
+        """
+        self.possibleMoves = dict.fromkeys(unpackPosition(self, cells, nturns))
+        self.buildConnections()
+
+        # Update evalScores in possibleMoves (as turn does after each move)
+        if nturns > 0:
+            player = Player.FIRST_PLAYER if nturns % 2 == 1 else Player.SECOND_PLAYER
+            self.evaluateMoves(player)
+
+    def evaluateMoves(self, player):
+        """
+        Updates evalScores in possibleMoves: of every hex on small boards, and otherwise of only the
+        candidate hexes, leaving the others unevaluated
+        """
+        hexes = self.possibleMoves.keys()
+        if self.candidates is not None:
+            lineAxis = 0 if self.player == Player.FIRST_PLAYER else 1
+            hexes = self.candidates.generate(self.hexTaken, self.opponentTaken, self.possibleMoves, lineAxis)
+            for hex in self.possibleMoves:
+                self.possibleMoves[hex] = None
+        for hex in hexes:
             self.possibleMoves[hex] = self.evalFunction(hex, player)
 
+    def buildConnections(self):
+        """
+        Finds the two-distance of each hex from either of the player's edges
+        """
+        lineAxis = 0 if self.player == Player.FIRST_PLAYER else 1
+        self.connections = [ConnectionDistance(self.n, lineAxis, self.hexTaken, self.opponentTaken, True, fromEnd)
+                            for fromEnd in (False, True)]
+
+    def setConnections(self, hex, state):
+        """
+        Updates the two-distances for a hex now holding a token of the player, no token or an opponent token
+        (ConnectionDistance.OWN, EMPTY or BLOCKED)
+        """
+        for connection in self.connections:
+            connection.setState(hex, state)
+
     def invert(self, coordinate):
         """
         Finds the inverse hex across the main line of symmetry
@@ -217,20 +281,13 @@ class Player:
 
     def pathHeuristic(self, hex):
         """
-        Calculates the value of placing a token in a row
+        Calculates the value of placing a token on the player's best paths between their edges, from the
+        hex's two-distances to either edge
         """
-        tokens = 0
-        if self.player == Player.FIRST_PLAYER:
-            for coordinate in self.hexTaken:
-                if coordinate[0] == hex[0]:
-                    tokens += 1
-        else:
-            for coordinate in self.hexTaken:
-                if coordinate[1] == hex[1]:
-                    tokens += 1
+        potential = self.connections[0].distance(hex) + self.connections[1].distance(hex)
 
-        # Inverse relationship; the less tokens, the higher the value
-        return self.n / (tokens + 1)
+        # Inverse relationship; the shorter the paths through the hex, the higher the value
+        return self.n / potential
 
     def captureHeuristic(self, hex, player):
         """
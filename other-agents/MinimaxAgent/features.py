@@ -0,0 +1,169 @@
+from math import sqrt
+
+from ..common.connection import ConnectionDistance
+
+
+class FeatureAccumulator:
+    """
+    Line and cross line counts and connection distances (see ConnectionDistance) of both players' tokens, kept
+    up to date as tokens are added and removed, from which each of the features of Player.evalFunction is read
+    without going over the tokens.
+
+    Lines are the coordinate (0 for rows, 1 for columns) that the player's rows filled and blocking features
+    count by and the player connects the ends of, and cross lines are the other coordinate, which the spread
+    feature counts by and the opponent connects the ends of
+    """
+
+    def __init__(self, n, lineAxis, hexTaken, opponentTaken):
+        self.n = n
+        self.lineAxis = lineAxis
+        self.crossAxis = 1 - lineAxis
+        self.ownTokens = 0
+        self.opponentTokens = 0
+
+        # The player's tokens in each line, and the number of lines holding any
+        self.ownLines = [0] * n
+        self.filledLines = 0
+
+        # The sum and sum of squares of the player's cross line coordinates
+        self.crossSum = 0
+        self.crossSquares = 0
+
+        # The opponent's tokens in each line, a bitmask of the lines holding each number of tokens and the
+        # most tokens in any line
+        self.opponentLines = [0] * n
+        self.opponentMasks = [(1 << n) - 1] + [0] * n
+        self.opponentMax = 0
+
+        # Moves made, for unmake
+        self.moves = []
+
+        for hex in hexTaken:
+            self.addOwn(hex)
+        for hex in opponentTaken:
+            self.addOpponent(hex)
+
+        self.ownConnection = ConnectionDistance(n, lineAxis, hexTaken, opponentTaken)
+        self.opponentConnection = ConnectionDistance(n, self.crossAxis, opponentTaken, hexTaken)
+
+    def make(self, hex, isMax, captured):
+        """
+        Places a token at hex (the player's if isMax, else the opponent's), removing the captured tokens
+        """
+        if isMax:
+            self.addOwn(hex)
+            for coordinates in captured:
+                self.removeOpponent(coordinates)
+        else:
+            self.addOpponent(hex)
+            for coordinates in captured:
+                self.removeOwn(coordinates)
+        self.ownConnection.make(hex, isMax, captured)
+        self.opponentConnection.make(hex, not isMax, captured)
+        self.moves.append((hex, isMax, captured))
+
+    def unmake(self):
+        """
+        Undoes the last move made
+        """
+        hex, isMax, captured = self.moves.pop()
+        if isMax:
+            self.removeOwn(hex)
+            for coordinates in captured:
+                self.addOpponent(coordinates)
+        else:
+            self.removeOpponent(hex)
+            for coordinates in captured:
+                self.addOwn(coordinates)
+        self.ownConnection.unmake()
+        self.opponentConnection.unmake()
+
+    def addOwn(self, hex):
+        line, cross = hex[self.lineAxis], hex[self.crossAxis]
+        self.ownTokens += 1
+        if self.ownLines[line] == 0:
+            self.filledLines += 1
+        self.ownLines[line] += 1
+        self.crossSum += cross
+        self.crossSquares += cross * cross
+
+    def removeOwn(self, hex):
+        line, cross = hex[self.lineAxis], hex[self.crossAxis]
+        self.ownTokens -= 1
+        self.ownLines[line] -= 1
+        if self.ownLines[line] == 0:
+            self.filledLines -= 1
+        self.crossSum -= cross
+        self.crossSquares -= cross * cross
+
+    def addOpponent(self, hex):
+        line = hex[self.lineAxis]
+        self.opponentTokens += 1
+        count = self.opponentLines[line]
+        self.opponentLines[line] = count + 1
+        self.opponentMasks[count] ^= 1 << line
+        self.opponentMasks[count + 1] |= 1 << line
+        if count + 1 > self.opponentMax:
+            self.opponentMax = count + 1
+
+    def removeOpponent(self, hex):
+        line = hex[self.lineAxis]
+        self.opponentTokens -= 1
+        count = self.opponentLines[line]
+        self.opponentLines[line] = count - 1
+        self.opponentMasks[count] ^= 1 << line
+        self.opponentMasks[count - 1] |= 1 << line
+        if count == self.opponentMax and self.opponentMasks[count] == 0:
+            self.opponentMax = count - 1
+
+    def spread(self):
+        """
+        The inverse of the standard deviation of the player's cross line coordinates (as spreadHeuristic)
+        """
+        k = self.ownTokens
+        if k < 2:
+            return 0
+        variance = (k * self.crossSquares - self.crossSum * self.crossSum) / (k * (k - 1))
+        return 1 / (sqrt(variance) + 1)
+
+    def linesFilled(self):
+        """
+        The ratio of lines holding the player's tokens (as heuristic2)
+        """
+        return self.filledLines / self.n
+
+    def connection(self):
+        """
+        How many fewer tokens the player needs to connect their edges than the opponent (as connectionHeuristic)
+        """
+        return min(self.opponentConnection.connectionDistance(), self.n + 1) - \
+            min(self.ownConnection.connectionDistance(), self.n + 1)
+
+    def captures(self):
+        """
+        The inverse of the number of opponent tokens (as captureHeuristic)
+        """
+        if self.opponentTokens == 0:
+            return 1
+        return 1 / self.opponentTokens
+
+    def placed(self):
+        """
+        The number of the player's tokens (as placedEvaluation)
+        """
+        return self.ownTokens
+
+    def blocking(self):
+        """
+        The ratio of the player's tokens to the opponent's in the line holding the most opponent tokens, or of
+        such lines, the one holding the most of the player's tokens (as blockingEvaluation)
+        """
+        if self.opponentTokens == 0:
+            return 0
+        mask = self.opponentMasks[self.opponentMax]
+        teamCount = 0
+        while mask:
+            line = (mask & -mask).bit_length() - 1
+            teamCount = max(teamCount, self.ownLines[line])
+            mask &= mask - 1
+        return teamCount / self.opponentMax
@@ -1,13 +1,55 @@
-from math import inf
+from math import inf, log
 import random
+import weakref
+import multiprocessing
 from itertools import permutations
 from statistics import stdev
 
+from ..common.candidates import CandidateGenerator
+from ..common.connection import ConnectionDistance
+from ..common.evalcache import EvalCache, ZobristHash
+from ..common.hexes import captureMoves
+from ..common.position import unpackPosition
+from ..common.resistance import ResistanceNetwork
+from ..common.transposition import SharedTranspositionTable
+from .features import FeatureAccumulator
+
 
 class Player:
     FIRST_PLAYER = 'red'
     SECOND_PLAYER = 'blue'
     CUTOFF_DEPTH = 2
+    # Half width of the aspiration window around the previous iteration's score
+    ASPIRATION_WINDOW = 0.5
+    # Width of the null windows that moves after the first are tested with
+    NULL_WINDOW = 1e-6
+    # Moves searched to full depth at each node before late moves are reduced by a ply,
+    # and the fewest plies left for a reduction
+    LMR_FULL_MOVES = 3
+    LMR_MIN_DEPTH = 2
+    # Most nodes searched by the capture quiescence search below each leaf
+    QUIESCENCE_NODES = 64
+    # Worker processes the root moves are split across (0 to search in this process only)
+    ROOT_WORKERS = 0
+    # Buckets in the transposition table the root search's processes share (a power of two)
+    TABLE_BUCKETS = 1 << 14
+    # Boards at least this size search only candidate hexes (see CandidateGenerator): those within
+    # CANDIDATE_RADIUS of a token, capturing hexes and hexes connecting tokens to the edges
+    CANDIDATE_MIN_SIZE = 8
+    CANDIDATE_RADIUS = 2
+    # Candidates searched at each node below the root, plus more for each ply left to search
+    CANDIDATE_WIDTH = 6
+    CANDIDATE_WIDENING = 6
+    # Weights of the evaluation features
+    SPREAD_WEIGHT = 0.2
+    ROW_WEIGHT = 0.2
+    CONNECTION_WEIGHT = 0.3
+    CAPTURE_WEIGHT = 0.1
+    PLACED_WEIGHT = 0.1
+    BLOCKING_WEIGHT = 0.1
+    # Weight of the root hexes' resistance term: the log of the ratio of the opponent's resistance between
+    # their edges to this player's, after the hex is taken (see ResistanceNetwork)
+    RESISTANCE_WEIGHT = 0.3
 
     def __init__(self, player, n):
         """
@@ -26,11 +68,31 @@ class Player:
         self.opponentTaken = []
         self.hexTaken = []
         self.possibleMoves = {}
+        self.bestMove = None
+        self.resetSearchStats()
+        # Leaf evaluations, kept across turns
+        self.evalCache = EvalCache()
+        self.zobrist = ZobristHash(n)
+        self.candidates = None
+        if n >= Player.CANDIDATE_MIN_SIZE:
+            self.candidates = CandidateGenerator(n, Player.CANDIDATE_RADIUS)
+
+        # The root search's worker processes (not in the workers themselves), and the best root value found
+        # so far and transposition table, which they share
+        self.pool = None
+        self.table = None
+        if Player.ROOT_WORKERS > 0 and _sharedBound is None:
+            self.sharedBound = multiprocessing.Value("d", -inf)
+            self.table = SharedTranspositionTable(Player.TABLE_BUCKETS)
+            self.pool = multiprocessing.Pool(Player.ROOT_WORKERS, initializer=_initWorker,
+                                             initargs=(self.sharedBound, self.table.name, Player.TABLE_BUCKETS))
+            weakref.finalize(self, _closeWorkers, self.pool, self.table)
 
         for row in range(n):
             for column in range(n):
                 # Value represents eval function
                 self.possibleMoves[(row, column)] = None
+        self.buildNetworks()
 
     def action(self):
         """
@@ -48,6 +110,8 @@ class Player:
                     return ("STEAL",)
                 else:
                     chosen = (start, self.n // 2)
+        elif self.bestMove in self.possibleMoves:
+            chosen = self.bestMove
         else:
             chosen = max(self.possibleMoves, key=self.possibleMoves.get)
         return ("PLACE", chosen[0], chosen[1])
@@ -72,14 +136,18 @@ class Player:
                 self.lastMove = invertedHex
                 self.possibleMoves.pop(invertedHex)
                 self.hexTaken.append(invertedHex)
+                self.setNetworks(self.opponentMove, ResistanceNetwork.EMPTY)
+                self.setNetworks(invertedHex, ResistanceNetwork.OWN)
             elif action[0] == 'PLACE':
                 self.lastMove = (action[1], action[2])
                 self.possibleMoves.pop(self.lastMove)
                 self.hexTaken.append(self.lastMove)
+                self.setNetworks(self.lastMove, ResistanceNetwork.OWN)
                 # Add capture hexes to possibleMoves
                 for hex in self.capture(self.lastMove, player, self.hexTaken, self.opponentTaken):
                     self.opponentTaken.remove(hex)
                     self.possibleMoves[hex] = None
+                    self.setNetworks(hex, ResistanceNetwork.EMPTY)
             self.numTurns += 1
         else:
             if action[0] == "STEAL":
@@ -89,26 +157,228 @@ class Player:
                 self.opponentMove = invertedHex
                 self.possibleMoves.pop(invertedHex)
                 self.opponentTaken.append(invertedHex)
+                self.setNetworks(self.lastMove, ResistanceNetwork.EMPTY)
+                self.setNetworks(invertedHex, ResistanceNetwork.BLOCKED)
             elif action[0] == 'PLACE':
                 self.opponentMove = (action[1], action[2])
                 self.possibleMoves.pop(self.opponentMove)
                 self.opponentTaken.append(self.opponentMove)
+                self.setNetworks(self.opponentMove, ResistanceNetwork.BLOCKED)
                 for hex in self.capture(self.opponentMove, player, self.hexTaken, self.opponentTaken):
                     self.hexTaken.remove(hex)
                     self.possibleMoves[hex] = None
+                    self.setNetworks(hex, ResistanceNetwork.EMPTY)
 
-        for hex in self.possibleMoves:
-            # Copy the current state
-            state = [self.hexTaken, self.opponentTaken, self.possibleMoves]
+            # Search now that it is this player's move
+            self.evaluateMoves()
 
-            # Choose the best minimax value for a hex
-            self.possibleMoves[hex] = self.minimaxValue(self.applyHex(state, hex, True), Player.CUTOFF_DEPTH, True, -inf, inf)
+    def evaluateMoves(self):
+        """
+        Updates the minimax value of each hex in possibleMoves and the best move, with an iteratively
+        deepened principal variation search from the current state
+        """
+        self.bestMove = None
+        if not self.possibleMoves:
+            return
+        state = self.rootState(self.hexTaken, self.opponentTaken, self.possibleMoves)
+        self.flows = self.currentFlows()
+        self.resistanceTerms = self.rootResistanceTerms()
+        # Red's rows filled and blocking features count by row, blue's by column
+        lineAxis = 0 if self.player == Player.FIRST_PLAYER else 1
+        self.features = FeatureAccumulator(self.n, lineAxis, self.hexTaken, self.opponentTaken)
+        score = None
+        for cutoff in range(Player.CUTOFF_DEPTH + 1):
+            # Search a window around the previous iteration's score, widening it if the score falls outside
+            if score is None:
+                alpha, beta = -inf, inf
+            else:
+                alpha, beta = score - Player.ASPIRATION_WINDOW, score + Player.ASPIRATION_WINDOW
+            while True:
+                if self.pool is None:
+                    score, bestMove = self.rootSearch(state, cutoff, alpha, beta)
+                else:
+                    score, bestMove = self.parallelRootSearch(state, cutoff, alpha, beta)
+                self.copyTurnedValues(state)
+                # (a won or lost position scores outside any window, so stop once the window is unbounded)
+                if score <= alpha and alpha > -inf:
+                    alpha = -inf
+                elif score >= beta and beta < inf:
+                    beta = inf
+                else:
+                    break
+            self.bestMove = bestMove
+            self.searchStats["depth"] = cutoff + 1
+
+    def rootState(self, hexTaken, opponentTaken, possibleMoves):
+        """
+        Returns the search state for the given tokens and empty hexes: [hexTaken, opponentTaken,
+        possibleMoves, hash, hash after a half turn of the board]
+        """
+        return [hexTaken, opponentTaken, possibleMoves, self.zobrist.positionHash(hexTaken, opponentTaken),
+                self.zobrist.rotatedHash(hexTaken, opponentTaken)]
+
+    def rootMoves(self, state):
+        """
+        Returns the hexes to search at the root, best first by their last value: every empty hex, even on
+        boards whose other nodes search only candidates, since the evaluation rewards tokens far from the others.
+        If the position is the same after a half turn of the board, each hex leads to the same position as the
+        hex it is turned onto (but turned), so only the smaller of the two is searched
+        """
+        moves = self.orderMoves(state[2])
+        if state[3] == state[4]:
+            moves = [hex for hex in moves if self.rotate(hex) >= hex]
+        return moves
+
+    def copyTurnedValues(self, state):
+        """
+        Gives the hexes rootMoves skipped the values of the hexes they are turned onto
+        """
+        if state[3] == state[4]:
+            for hex in state[2]:
+                if self.rotate(hex) < hex:
+                    state[2][hex] = state[2][self.rotate(hex)]
+
+    def rootSearch(self, state, cutoff, alpha, beta):
+        """
+        Searches each hex (best first by its last value) cutoff plies deep, storing the values (or bounds)
+        found in possibleMoves. Returns the best value and hex
+        """
+        best, bestMove = -inf, None
+        for i, hex in enumerate(self.rootMoves(state)):
+            value = self.searchRootHex(state, hex, cutoff, i, alpha, beta)
+            self.possibleMoves[hex] = value
+            if value > best:
+                best, bestMove = value, hex
+            alpha = max(alpha, best)
+            if beta <= alpha:
+                self.countCutoff(i)
+                break
+        return best, bestMove
+
+    def parallelRootSearch(self, state, cutoff, alpha, beta):
+        """
+        As rootSearch, but with the hexes after the first split across the worker processes. The first hex is
+        searched here, to give the workers a bound to start from. The workers share the best value found so
+        far, raising each other's alpha as they go, and their results are merged in hex order, so that the
+        best hex does not depend on which worker finished first
+        """
+        moves = self.rootMoves(state)
+        best = self.searchRootHex(state, moves[0], cutoff, 0, alpha, beta)
+        self.possibleMoves[moves[0]] = best
+        bestMove = moves[0]
+        alpha = max(alpha, best)
+        if beta <= alpha or len(moves) == 1:
+            if beta <= alpha:
+                self.countCutoff(0)
+            return best, bestMove
+
+        # Deal the remaining hexes out in turn, so that each worker has some of the most promising
+        self.sharedBound.value = alpha
+        workers = Player.ROOT_WORKERS
+        tasks = []
+        for worker in range(workers):
+            indexedMoves = [(i, moves[i]) for i in range(1 + worker, len(moves), workers)]
+            tasks.append((self.player, self.n, self.hexTaken, self.opponentTaken, self.possibleMoves, self.flows,
+                          self.resistanceTerms, cutoff, indexedMoves, alpha, beta))
+        results = []
+        for workerResults, workerStats in self.pool.map(_searchRootMoves, tasks):
+            results.extend(workerResults)
+            for key, count in workerStats.items():
+                if key != "depth":
+                    self.searchStats[key] = self.searchStats.get(key, 0) + count
+
+        # A value no better than the bound it was searched with is only an upper bound, so the hex could not
+        # be better than the one that set the bound
+        results.sort()
+        bestIndex = 0
+        for i, hex, value, searchAlpha in results:
+            self.possibleMoves[hex] = value
+            if value > best and value > searchAlpha:
+                best, bestMove, bestIndex = value, hex, i
+
+        # But it may have tied with it, if it failed low on exactly the best value. Search such hexes again to
+        # take the first of tied hexes, as rootSearch does
+        for i, hex, value, searchAlpha in results:
+            if i >= bestIndex:
+                break
+            if value == best and value <= searchAlpha:
+                term = self.resistanceTerms[hex]
+                value = self.minimaxValue(self.applyHex(state, hex, True), cutoff, False,
+                                          best - term - Player.NULL_WINDOW, best - term)
+                self.features.unmake()
+                if value >= best - term:
+                    bestMove = hex
+                    break
+        if best >= beta:
+            self.countCutoff(1)
+        return best, bestMove
+
+    def candidateMoves(self, state, isMax, width=None):
+        """
+        Returns the hexes to search from a state (for the max player if isMax), best first by their last root
+        value: every empty hex on small boards, and otherwise the candidate hexes (by current flow within each
+        group), only the first width of them if width is given
+        """
+        if self.candidates is None:
+            return self.orderMoves(state[2])
+        own, opponent = (state[0], state[1]) if isMax else (state[1], state[0])
+        lineAxis = 0 if (self.player == Player.FIRST_PLAYER) == isMax else 1
+        moves = self.candidates.generate(own, opponent, state[2], lineAxis, width, lambda hex: -self.flows[hex])
+        return sorted(moves, key=lambda hex: -inf if state[2][hex] is None else state[2][hex], reverse=True)
+
+    def orderMoves(self, possibleMoves):
+        """
+        Returns the hexes in possibleMoves ordered by their last root value (best first), with
+        unevaluated hexes last, and hexes of the same value by current flow
+        """
+        return sorted(possibleMoves, key=lambda hex: (-inf if possibleMoves[hex] is None else possibleMoves[hex],
+                                                      self.flows[hex]), reverse=True)
+
+    def searchRootHex(self, state, hex, cutoff, moveIndex, alpha, beta):
+        """
+        Returns the value of taking hex at the root (the move at moveIndex): its resistance term plus the value
+        of the state it reaches, which is searched with the window shifted to match
+        """
+        term = self.resistanceTerms[hex]
+        value = self.searchChild(self.applyHex(state, hex, True), cutoff, moveIndex, True, alpha - term, beta - term)
+        self.features.unmake()
+        # (a bound stays outside the window, however the term's addition rounds)
+        if value <= alpha - term:
+            return min(term + value, alpha)
+        if value >= beta - term:
+            return max(term + value, beta)
+        return term + value
+
+    def searchChild(self, state, cutoff, moveIndex, isMax, alpha, beta):
+        """
+        Returns the value of the state reached by the move at moveIndex (made by the max player if isMax),
+        using principal variation search: only the first move is searched with the full window. Later
+        moves are tested with a null window (one ply shallower if they are late moves), and searched
+        again only if they might be better than the moves before them
+        """
+        if moveIndex == 0:
+            return self.minimaxValue(state, cutoff, not isMax, alpha, beta)
+
+        if isMax:
+            window = (alpha, alpha + Player.NULL_WINDOW)
+        else:
+            window = (beta - Player.NULL_WINDOW, beta)
+        reduced = moveIndex >= Player.LMR_FULL_MOVES and cutoff >= Player.LMR_MIN_DEPTH
+        value = self.minimaxValue(state, cutoff - 1 if reduced else cutoff, not isMax, *window)
+
+        improves = (lambda value: value > alpha) if isMax else (lambda value: value < beta)
+        if reduced and improves(value):
+            value = self.minimaxValue(state, cutoff, not isMax, *window)
+        if improves(value) and alpha < value < beta:
+            value = self.minimaxValue(state, cutoff, not isMax, alpha, beta)
+        return value
 
     def applyHex(self, state, hex, isMax):
         """
-        Returns a state represented by copies of hexTaken, opponentTaken and possibleMoves
+        Returns a state represented by copies of hexTaken, opponentTaken and possibleMoves, and its hashes.
+        Also makes the move in the feature accumulator, which the caller undoes with self.features.unmake()
         """
-        newState = [state[0].copy(), state[1].copy(), state[2].copy()]
+        newState = [state[0].copy(), state[1].copy(), state[2].copy(), state[3], state[4]]
 
         # Add changes to the state
         if self.player == Player.FIRST_PLAYER:
@@ -119,45 +389,226 @@ class Player:
         if isMax:
             newState[0].append(hex)
             newState[2].pop(hex)
+            newState[3] ^= self.zobrist.ownKeys[hex]
+            newState[4] ^= self.zobrist.rotatedOwnKeys[hex]
+            captured = self.capture(hex, player, newState[0], newState[1])
             # Add capture hexes to possibleMoves
-            for coordinates in self.capture(hex, player, newState[0], newState[1]):
+            for coordinates in captured:
                 newState[1].remove(coordinates)
                 newState[2][coordinates] = None
+                newState[3] ^= self.zobrist.opponentKeys[coordinates]
+                newState[4] ^= self.zobrist.rotatedOpponentKeys[coordinates]
         else:
             newState[1].append(hex)
             newState[2].pop(hex)
-            for coordinates in self.capture(hex, player, newState[0], newState[1]):
+            newState[3] ^= self.zobrist.opponentKeys[hex]
+            newState[4] ^= self.zobrist.rotatedOpponentKeys[hex]
+            captured = self.capture(hex, player, newState[0], newState[1])
+            for coordinates in captured:
                 newState[0].remove(coordinates)
                 newState[2][coordinates] = None
+                newState[3] ^= self.zobrist.ownKeys[coordinates]
+                newState[4] ^= self.zobrist.rotatedOwnKeys[coordinates]
+        self.features.make(hex, isMax, captured)
 
         return newState
 
     def minimaxValue(self, state, cutoff, isMax, alpha, beta):
         """
-        
+        Returns the alpha-beta minimax value of a state, searching cutoff plies deep. With a transposition
+        table, a result stored for the state is used if it was searched deep enough and decides the value
+        within the window, and otherwise its best move is searched first
         """
+        self.searchStats["nodes"] += 1
         if cutoff == 0:
-            return self.evalFunction(state[0], state[1])
+            self.quiescenceNodes = Player.QUIESCENCE_NODES
+            return self.quiescenceValue(state, isMax, alpha, beta)
+        # Progressive widening: more candidates where more plies are left
+        moves = self.candidateMoves(state, isMax, Player.CANDIDATE_WIDTH + Player.CANDIDATE_WIDENING * cutoff)
+        if self.table is not None:
+            # The table holds each position once, as whichever of it and its half turn has the smaller hash
+            # (with the best move turned to match)
+            side = 0 if isMax else self.zobrist.sideKey
+            key = min(state[3] ^ side, state[4] ^ side)
+            turned = state[4] ^ side < state[3] ^ side
+            entry = self.table.probe(key)
+            if entry is not None:
+                depth, bound, value, move = entry
+                if depth >= cutoff and (bound == SharedTranspositionTable.EXACT or
+                                        (bound == SharedTranspositionTable.LOWER and value >= beta) or
+                                        (bound == SharedTranspositionTable.UPPER and value <= alpha)):
+                    self.searchStats["tt_hits"] += 1
+                    return value
+                if move is not None:
+                    move = (move // self.n, move % self.n)
+                    if turned:
+                        move = self.rotate(move)
+                    if move in state[2]:
+                        # (searched even if it is not one of the node's candidates)
+                        if move in moves:
+                            moves.remove(move)
+                        moves.insert(0, move)
+            windowAlpha, windowBeta = alpha, beta
+
+        bestHex = None
         if isMax:
             best = -inf
-            for hex in state[2]:
+            for i, hex in enumerate(moves):
                 newState = self.applyHex(state, hex, isMax)
-                best = max(best, self.minimaxValue(newState, cutoff - 1, not isMax, alpha, beta))
+                value = self.searchChild(newState, cutoff - 1, i, isMax, alpha, beta)
+                self.features.unmake()
+                if value > best:
+                    best, bestHex = value, hex
 
                 alpha = max(alpha, best)
                 if beta <= alpha:
+                    self.countCutoff(i)
                     break
-            return best
         else:
             best = inf
-            for hex in state[2]:
+            for i, hex in enumerate(moves):
                 newState = self.applyHex(state, hex, isMax)
-                best = min(best, self.minimaxValue(newState, cutoff - 1, not isMax, alpha, beta))
+                value = self.searchChild(newState, cutoff - 1, i, isMax, alpha, beta)
+                self.features.unmake()
+                if value < best:
+                    best, bestHex = value, hex
 
                 beta = min(beta, best)
                 if beta <= alpha:
+                    self.countCutoff(i)
                     break
+
+        if self.table is not None and bestHex is not None:
+            if best <= windowAlpha:
+                bound = SharedTranspositionTable.UPPER
+            elif best >= windowBeta:
+                bound = SharedTranspositionTable.LOWER
+            else:
+                bound = SharedTranspositionTable.EXACT
+            if turned:
+                bestHex = self.rotate(bestHex)
+            self.table.store(key, cutoff, bound, best, bestHex[0] * self.n + bestHex[1])
+        return best
+
+    def quiescenceValue(self, state, isMax, alpha, beta):
+        """
+        Returns the value of a state at the search horizon, searching only capturing moves until the
+        position is quiet (or the node budget runs out). The player to move may also stand pat on the
+        state's evaluation instead of capturing
+        """
+        self.searchStats["leaves"] += 1
+        best = self.cachedEval(state)
+        if self.quiescenceNodes <= 0:
             return best
+        if isMax:
+            if best >= beta:
+                return best
+            alpha = max(alpha, best)
+        else:
+            if best <= alpha:
+                return best
+            beta = min(beta, best)
+
+        own, opponent = (state[0], state[1]) if isMax else (state[1], state[0])
+        for i, hex in enumerate(captureMoves(own, opponent, state[2])):
+            if self.quiescenceNodes <= 0:
+                break
+            self.quiescenceNodes -= 1
+            self.searchStats["nodes"] += 1
+            self.searchStats["quiescence_nodes"] += 1
+            value = self.quiescenceValue(self.applyHex(state, hex, isMax), not isMax, alpha, beta)
+            self.features.unmake()
+            if isMax:
+                best = max(best, value)
+                alpha = max(alpha, best)
+            else:
+                best = min(best, value)
+                beta = min(beta, best)
+            if beta <= alpha:
+                self.countCutoff(i)
+                break
+        return best
+
+    def search_stats(self):
+        """
+        Called by the referee after each action to collect counters describing
+        the search done since the previous call
+        """
+        stats = self.searchStats
+        hits, misses = self.evalCache.takeCounts()
+        stats["eval_cache_hits"] += hits
+        stats["eval_cache_misses"] += misses
+        self.resetSearchStats()
+        return stats
+
+    def set_space_limit(self, megabytes):
+        """
+        Called by the referee after __init__ (if there is a space limit) with this player's space limit in MB
+        """
+        self.evalCache.setSpaceLimit(megabytes)
+
+    def resetSearchStats(self):
+        """
+        Resets the search counters
+        """
+        self.searchStats = {"nodes": 0, "leaves": 0, "cutoffs": 0, "first_move_cutoffs": 0, "tt_hits": 0,
+                            "depth": 0, "quiescence_nodes": 0, "eval_cache_hits": 0, "eval_cache_misses": 0}
+
+    def countCutoff(self, moveIndex):
+        """
+        Counts a beta cutoff caused by the move at moveIndex in the move ordering
+        """
+        self.searchStats["cutoffs"] += 1
+        if moveIndex == 0:
+            self.searchStats["first_move_cutoffs"] += 1
+
+    def setup(self, cells, nturns):
+        """
+        Called instead of turn (for each turn so far) when the game starts from a given position. The parameter
+        cells maps each occupied (r, q) to the colour of its token, and nturns is the number of turns played so far
+        """
+        self.possibleMoves = dict.fromkeys(unpackPosition(self, cells, nturns))
+        self.buildNetworks()
+
+        # Search if it is this player's move (red moves on even turns)
+        if nturns > 0 and (nturns % 2 == 0) == (self.player == Player.FIRST_PLAYER):
+            self.evaluateMoves()
+
+    def buildNetworks(self):
+        """
+        Builds the resistance networks of this player's and the opponent's connections
+        """
+        lineAxis = 0 if self.player == Player.FIRST_PLAYER else 1
+        self.networks = [ResistanceNetwork(self.n, lineAxis, self.hexTaken, self.opponentTaken),
+                         ResistanceNetwork(self.n, 1 - lineAxis, self.opponentTaken, self.hexTaken)]
+
+    def setNetworks(self, hex, state):
+        """
+        Updates the resistance networks for a hex now holding this player's token, no token or the opponent's
+        token (ResistanceNetwork.OWN, EMPTY or BLOCKED)
+        """
+        self.networks[0].setState(hex, state)
+        self.networks[1].setState(hex, ResistanceNetwork.BLOCKED - state)
+
+    def currentFlows(self):
+        """
+        Returns the share of the current between each player's edges through each hex, summed over both
+        players: the hexes their connections depend on most, which are searched first
+        """
+        flows = sum(network.currentFlow() * network.resistance() for network in self.networks).tolist()
+        return {(row, column): flows[row][column] for row in range(self.n) for column in range(self.n)}
+
+    def rootResistanceTerms(self):
+        """
+        Returns the resistance term of each hex this player could take: RESISTANCE_WEIGHT times the log of the
+        ratio of the opponent's resistance between their edges to this player's, after the hex is taken
+        """
+        terms = {}
+        for hex in self.possibleMoves:
+            own = self.networks[0].resistanceAfter(hex, ResistanceNetwork.OWN)
+            opponent = self.networks[1].resistanceAfter(hex, ResistanceNetwork.BLOCKED)
+            terms[hex] = Player.RESISTANCE_WEIGHT * log(opponent / own)
+        return terms
 
     def invert(self, coordinate):
         """
@@ -165,6 +616,12 @@ class Player:
         """
         return (coordinate[1], coordinate[0])
 
+    def rotate(self, coordinate):
+        """
+        Finds the hex a half turn of the board takes a hex onto
+        """
+        return (self.n - 1 - coordinate[0], self.n - 1 - coordinate[1])
+
     def capture(self, coordinate, player, hexTaken, opponentTaken):
         """
         Returns a list of hexes to be removed as a result of capturing
@@ -242,20 +699,37 @@ class Player:
         """
         return not (hex in self.hexTaken) or not (hex in self.possibleMoves) and self.hexInBoard(hex)
 
+    def cachedEval(self, state):
+        """
+        Returns the evaluation of a state (the current state of the feature accumulator), from the eval cache
+        if it or its half turn (which evaluates the same) has been evaluated before
+        """
+        key = min(state[3], state[4])
+        value = self.evalCache.get(key)
+        if value is None:
+            value = self.featureEval()
+            self.evalCache.put(key, value)
+        return value
+
+    def featureEval(self):
+        """
+        Returns evalFunction of the current search state, read from the feature accumulator
+        """
+        features = self.features
+        return (Player.SPREAD_WEIGHT * features.spread()) + (Player.ROW_WEIGHT * features.linesFilled()) + \
+                (Player.CONNECTION_WEIGHT * features.connection()) + (Player.CAPTURE_WEIGHT * features.captures()) + \
+                (Player.PLACED_WEIGHT * features.placed()) + (Player.BLOCKING_WEIGHT * features.blocking())
+
     def evalFunction(self, hexTaken, opponentTaken):
         """
         Updates the evaluation score for a hex using weighted features
         """
-        SPREAD_WEIGHT = 0.2
-        ROW_WEIGHT = 0.2
-        PATH_WEIGHT = 0.3
-        CAPTURE_WEIGHT = 0.1
-        PLACED_WEIGHT = 0.1
-        BLOCKING_WEIGHT = 0.1
-        return (SPREAD_WEIGHT * self.heuristic1(hexTaken)) + (ROW_WEIGHT * self.heuristic2(hexTaken)) + \
-                (PATH_WEIGHT * self.heuristic3(hexTaken)) + (CAPTURE_WEIGHT * self.captureHeuristic(opponentTaken)) + \
-                (PLACED_WEIGHT * self.placedEvaluation(hexTaken)) + \
-                (BLOCKING_WEIGHT * self.blockingEvaluation(hexTaken, opponentTaken))
+        return (Player.SPREAD_WEIGHT * self.spreadHeuristic(hexTaken)) + \
+                (Player.ROW_WEIGHT * self.heuristic2(hexTaken)) + \
+                (Player.CONNECTION_WEIGHT * self.connectionHeuristic(hexTaken, opponentTaken)) + \
+                (Player.CAPTURE_WEIGHT * self.captureHeuristic(opponentTaken)) + \
+                (Player.PLACED_WEIGHT * self.placedEvaluation(hexTaken)) + \
+                (Player.BLOCKING_WEIGHT * self.blockingEvaluation(hexTaken, opponentTaken))
 
     def spreadHeuristic(self, hexTaken):
         """
@@ -289,26 +763,22 @@ class Player:
                 filled[coordinate[1]] = True
         return filled.count(True) / self.n
 
-    def heuristic3(self, hexTaken):
+    def connectionHeuristic(self, hexTaken, opponentTaken):
         """
-        Finds the length of the longest straight winning path
+        Finds how many fewer tokens the player needs to connect their edges than the opponent (a player
+        who has been cut off needing n + 1)
         """
-        freq = []
-        for i in range(self.n):
-            freq.append(0)
-
-        if self.player == Player.FIRST_PLAYER:
-            for coordinate in hexTaken:
-                freq[coordinate[1]] += 1
-        else:
-            for coordinate in hexTaken:
-                freq[coordinate[0]] += 1
-        return max(freq)
+        lineAxis = 0 if self.player == Player.FIRST_PLAYER else 1
+        own = ConnectionDistance(self.n, lineAxis, hexTaken, opponentTaken).connectionDistance()
+        opponent = ConnectionDistance(self.n, 1 - lineAxis, opponentTaken, hexTaken).connectionDistance()
+        return min(opponent, self.n + 1) - min(own, self.n + 1)
 
     def captureHeuristic(self, opponentTaken):
         """
         Returns the inverse of number of enemy tokens in the board
         """
+        if len(opponentTaken) == 0:
+            return 1
         return 1 / len(opponentTaken)
 
     def placedEvaluation(self, hexTaken):
@@ -321,23 +791,67 @@ class Player:
         if len(opponentTaken) == 0:
             return 0
 
-        teamCount = 0
         freqTable = {}
+        teamTable = {}
         for i in range(self.n):
             freqTable[i] = 0
-
-        if self.player == Player.FIRST_PLAYER:
-            for hex in opponentTaken:
-                freqTable[hex[0]] += 1
-            mostFreq = max(freqTable, key=freqTable.get)
-            for hex in hexTaken:
-                if hex[0] == mostFreq:
-                    teamCount += 1
-        else:
-            for hex in opponentTaken:
-                freqTable[hex[1]] += 1
-            mostFreq = max(freqTable, key=freqTable.get)
-            for hex in hexTaken:
-                if hex[1] == mostFreq:
-                    teamCount += 1
-        return teamCount / freqTable[mostFreq]
\ No newline at end of file
+            teamTable[i] = 0
+
+        axis = 0 if self.player == Player.FIRST_PLAYER else 1
+        for hex in opponentTaken:
+            freqTable[hex[axis]] += 1
+        for hex in hexTaken:
+            teamTable[hex[axis]] += 1
+        mostFreq = max(freqTable.values())
+        # Of the rows tied for the most enemy tokens, count the one with the most player's tokens (rather than
+        # the first), so that the evaluation is the same after a half turn of the board
+        teamCount = max(teamTable[i] for i in freqTable if freqTable[i] == mostFreq)
+        return teamCount / mostFreq
+
+
+# The root search's worker processes keep the shared bound and transposition table, and a player per colour and
+# board size (whose eval caches last between searches)
+_sharedBound = None
+_sharedTable = None
+_workerPlayers = {}
+
+
+def _initWorker(sharedBound, tableName, tableBuckets):
+    global _sharedBound, _sharedTable
+    _sharedBound = sharedBound
+    _sharedTable = SharedTranspositionTable(tableBuckets, tableName)
+
+
+def _closeWorkers(pool, table):
+    pool.terminate()
+    table.close()
+
+
+def _searchRootMoves(task):
+    """
+    Searches the given root hexes in a worker process, raising alpha to the shared bound before each hex and
+    publishing values that improve on it. Returns (move index, hex, value, alpha searched with) for each hex
+    searched, and the search counters
+    """
+    player, n, hexTaken, opponentTaken, possibleMoves, flows, resistanceTerms, cutoff, indexedMoves, alpha, beta = task
+    if (player, n) not in _workerPlayers:
+        _workerPlayers[(player, n)] = Player(player, n)
+        _workerPlayers[(player, n)].table = _sharedTable
+    searcher = _workerPlayers[(player, n)]
+    searcher.hexTaken, searcher.opponentTaken, searcher.possibleMoves = hexTaken, opponentTaken, possibleMoves
+    searcher.flows, searcher.resistanceTerms = flows, resistanceTerms
+    state = searcher.rootState(hexTaken, opponentTaken, possibleMoves)
+    lineAxis = 0 if player == Player.FIRST_PLAYER else 1
+    searcher.features = FeatureAccumulator(n, lineAxis, hexTaken, opponentTaken)
+
+    results = []
+    for i, hex in indexedMoves:
+        alpha = max(alpha, _sharedBound.value)
+        if beta <= alpha:
+            break
+        value = searcher.searchRootHex(state, hex, cutoff, i, alpha, beta)
+        results.append((i, hex, value, alpha))
+        if value > alpha:
+            with _sharedBound.get_lock():
+                _sharedBound.value = max(_sharedBound.value, value)
+    return results, searcher.search_stats()
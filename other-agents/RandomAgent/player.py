@@ -1,6 +1,8 @@
 import random
 from itertools import permutations
 
+from ..common.position import unpackPosition
+
 
 class Player:
     FIRST_PLAYER = "red"
@@ -91,6 +93,17 @@ class Player:
                     self.hexTaken.remove(hex)
                     self.possibleMoves.append(hex)
 
+    def setup(self, cells, nturns):
+        """
+        Called instead of turn (for each turn so far) when the game starts from a given position. The parameter
+        cells maps each occupied (r, q) to the colour of its token, and nturns is the number of turns played so far
+        """
+        self.possibleMoves = unpackPosition(self, cells, nturns)
+
+        # The centre is only allowed after our first move
+        if self.numTurns == 0 and (self.n // 2, self.n // 2) in self.possibleMoves and self.n % 2 != 0:
+            self.possibleMoves.remove((self.n // 2, self.n // 2))
+
     def invert(self, coordinate):
         return (coordinate[1], coordinate[0])
 
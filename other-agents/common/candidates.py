@@ -0,0 +1,56 @@
+from .hexes import captureMoves
+
+
+class CandidateGenerator:
+    """
+    Chooses the empty hexes worth searching in a position, so that the cost of a search does not grow with
+    the area of the board: the hexes within a radius of any token, the hexes where either player's token would
+    capture, and the hexes on the edges of the player to move near their tokens (which connect them to the
+    edge). Falls back to every empty hex when there are too few candidates (such as on an empty board).
+
+    Candidates are returned most promising first (captures, then the nearest to a token), so that a search
+    can widen progressively by taking only the first few candidates where few plies remain
+    """
+    def __init__(self, n, radius=2, edgeRadius=3, minCandidates=8):
+        self.n = n
+        self.minCandidates = minCandidates
+        hexes = [(row, column) for row in range(n) for column in range(n)]
+
+        # The hexes at each distance (from 1 to radius) from each hex
+        self.rings = {hex: [frozenset(cell for cell in hexes if self.distance(hex, cell) == distance)
+                            for distance in range(1, radius + 1)] for hex in hexes}
+        # For each axis, the hexes within edgeRadius of each hex on the edges at either end of the axis
+        self.edgeCells = [{hex: frozenset(cell for cell in hexes if cell[axis] in (0, n - 1) and
+                                          0 < self.distance(hex, cell) <= edgeRadius) for hex in hexes}
+                          for axis in (0, 1)]
+
+    def distance(self, hex1, hex2):
+        """
+        Returns the number of steps between two hexes
+        """
+        dr, dq = hex2[0] - hex1[0], hex2[1] - hex1[1]
+        return (abs(dr) + abs(dq) + abs(dr + dq)) // 2
+
+    def generate(self, own, opponent, empty, lineAxis, limit=None, key=None):
+        """
+        Returns the candidate hexes (of the collection of empty hexes) for the player to move, whose tokens
+        are own and who connects the edges at either end of the given axis (0 for rows, 1 for columns), most
+        promising first: capturing hexes (for either player), then by distance to the nearest token, then the
+        hexes connecting the player's tokens to their edges (each group in order of key, if given). If limit
+        is given, returns at most that many
+        """
+        tokens = own + opponent
+        tiers = [captureMoves(own, opponent, empty) | captureMoves(opponent, own, empty)]
+        found = set(tiers[0])
+        for distance in range(len(self.rings[(0, 0)])):
+            tier = set().union(*(self.rings[hex][distance] for hex in tokens)).intersection(empty) - found
+            tiers.append(tier)
+            found |= tier
+        tiers.append(set().union(*(self.edgeCells[lineAxis][hex] for hex in own)).intersection(empty) - found)
+
+        moves = [cell for tier in tiers for cell in sorted(tier, key=key)]
+        if len(moves) < self.minCandidates:
+            moves = list(empty)
+        if limit is not None:
+            moves = moves[:limit]
+        return moves
@@ -0,0 +1,145 @@
+import random
+import argparse
+
+import numpy as np
+
+from .connection import ConnectionDistance
+from .resistance import ResistanceNetwork
+
+# Relative difference allowed between a ResistanceNetwork's values and those of one built from scratch (its
+# Woodbury updates drift from the exact inverse by up to about 2e-5 between refactors, on networks cut off by
+# the opponent's tokens)
+RESISTANCE_TOLERANCE = 1e-4
+
+def randomTokens(n, rng):
+    """
+    Returns the tokens of two players on a randomly filled board of size n, as two lists of hexes
+    """
+    hexes = [(row, column) for row in range(n) for column in range(n)]
+    rng.shuffle(hexes)
+    filled = rng.randrange(len(hexes) * 2 // 3)
+    return hexes[:filled:2], hexes[1:filled:2]
+
+
+def randomMove(n, ownTaken, opponentTaken, rng):
+    """
+    Returns a random move on the given tokens: an empty hex, whether it is the player's token, and the tokens
+    it captures (a pair of the other player's tokens, some of the time)
+    """
+    taken = set(ownTaken) | set(opponentTaken)
+    hex = rng.choice([(row, column) for row in range(n) for column in range(n) if (row, column) not in taken])
+    own = rng.random() < 0.5
+    others = opponentTaken if own else ownTaken
+    captured = rng.sample(others, 2) if len(others) >= 2 and rng.random() < 0.3 else []
+    return hex, own, captured
+
+
+def checkConnectionDistance(n, sequences, moves, rng):
+    """
+    Makes and unmakes random moves (with captures) in ConnectionDistances of every kind, and raises
+    AssertionError if their distances ever differ from those of one built from scratch for the same tokens.
+    Returns the number of positions checked
+    """
+    checked = 0
+    for sequence in range(sequences):
+        lineAxis, twoDistance, fromEnd = rng.randrange(2), rng.random() < 0.5, rng.random() < 0.5
+        ownTaken, opponentTaken = randomTokens(n, rng)
+        distance = ConnectionDistance(n, lineAxis, ownTaken, opponentTaken, twoDistance, fromEnd)
+        stack = []
+        for step in range(moves):
+            if stack and (rng.random() < 0.4 or len(ownTaken) + len(opponentTaken) == n * n):
+                distance.unmake()
+                ownTaken, opponentTaken = stack.pop()
+            else:
+                hex, own, captured = randomMove(n, ownTaken, opponentTaken, rng)
+                stack.append((ownTaken, opponentTaken))
+                distance.make(hex, own, captured)
+                if own:
+                    ownTaken = ownTaken + [hex]
+                    opponentTaken = [other for other in opponentTaken if other not in captured]
+                else:
+                    opponentTaken = opponentTaken + [hex]
+                    ownTaken = [other for other in ownTaken if other not in captured]
+            fresh = ConnectionDistance(n, lineAxis, ownTaken, opponentTaken, twoDistance, fromEnd)
+            assert distance.states == fresh.states, (n, sequence, step)
+            assert distance.distances == fresh.distances, (n, sequence, step, twoDistance, fromEnd)
+            checked += 1
+    return checked
+
+
+def checkResistanceNetwork(n, sequences, moves, rng):
+    """
+    Changes random hexes of ResistanceNetworks to random states (for more than REFACTOR_UPDATES updates), and
+    raises AssertionError if their resistances and current flows, or the resistance resistanceAfter gives for
+    another random change, ever differ from those of one built from scratch. Returns the number of positions
+    checked
+    """
+    hexes = [(row, column) for row in range(n) for column in range(n)]
+    checked = 0
+    for sequence in range(sequences):
+        lineAxis = rng.randrange(2)
+        ownTaken, opponentTaken = randomTokens(n, rng)
+        network = ResistanceNetwork(n, lineAxis, ownTaken, opponentTaken)
+        states = dict.fromkeys(hexes, ResistanceNetwork.EMPTY)
+        states.update(dict.fromkeys(ownTaken, ResistanceNetwork.OWN))
+        states.update(dict.fromkeys(opponentTaken, ResistanceNetwork.BLOCKED))
+        for step in range(moves):
+            hex, state = rng.choice(hexes), rng.randrange(3)
+            before = network.states.copy(), network.updates
+            resistance = network.resistanceAfter(hex, state)
+            assert (network.states == before[0]).all() and network.updates == before[1], (n, sequence, step)
+            fresh = freshNetwork(n, lineAxis, {**states, hex: state})
+            assert isClose(resistance, fresh.resistance()), (n, sequence, step, hex, state)
+
+            hex, state = rng.choice(hexes), rng.randrange(3)
+            network.setState(hex, state)
+            states[hex] = state
+            fresh = freshNetwork(n, lineAxis, states)
+            assert (network.states == fresh.states).all(), (n, sequence, step)
+            assert isClose(network.resistance(), fresh.resistance()), (n, sequence, step)
+            assert isClose(network.currentFlow(), fresh.currentFlow()), (n, sequence, step)
+            checked += 1
+    return checked
+
+
+def isClose(values, expected):
+    """
+    Returns whether each of values (a resistance or current flows) differs from the value expected by at most
+    RESISTANCE_TOLERANCE times the largest value expected
+    """
+    return np.allclose(values, expected, rtol=0, atol=RESISTANCE_TOLERANCE * np.max(expected))
+
+
+def freshNetwork(n, lineAxis, states):
+    """
+    Returns a ResistanceNetwork built from scratch with each hex in the given state
+    """
+    ownTaken = [hex for hex, state in states.items() if state == ResistanceNetwork.OWN]
+    opponentTaken = [hex for hex, state in states.items() if state == ResistanceNetwork.BLOCKED]
+    return ResistanceNetwork(n, lineAxis, ownTaken, opponentTaken)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="other-agents.common.check",
+        description="check the agents' incrementally updated evaluators against ones built from scratch, "
+        "over random sequences of moves, captures and undone moves.",
+    )
+    parser.add_argument("n", type=int, nargs="+", help="sizes of the game board")
+    parser.add_argument("-k", "--sequences", type=int, default=50,
+                        help="number of move sequences per board size (default: %(default)s)")
+    parser.add_argument("-m", "--moves", type=int, default=40,
+                        help="number of moves made or unmade in each sequence (default: %(default)s)")
+    parser.add_argument("-r", "--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    options = parser.parse_args(argv)
+
+    rng = random.Random(options.seed)
+    for n in options.n:
+        checked = checkConnectionDistance(n, options.sequences, options.moves, rng)
+        print(f"n={n}: ConnectionDistance agrees on {checked} positions")
+        checked = checkResistanceNetwork(n, options.sequences, options.moves, rng)
+        print(f"n={n}: ResistanceNetwork agrees on {checked} positions")
+
+
+if __name__ == "__main__":
+    main()
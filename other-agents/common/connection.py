@@ -0,0 +1,179 @@
+from heapq import heappop, heappush
+from math import inf
+
+from .hexes import HEX_STEPS
+
+
+class ConnectionDistance:
+    """
+    How far a player is from connecting their two edges: for each hex, the distance to it from the start edge
+    (line 0 of the player's axis, or line n - 1 if fromEnd), where the player's tokens cost nothing to pass
+    through, empty hexes cost one token and the opponent's tokens are blocked. The connection distance is the
+    distance to the far edge, the number of tokens the player still needs to place to connect.
+
+    With twoDistance, uses the Hex two-distance instead: an empty hex is one more than the second nearest of
+    its neighbours (the start edge counting as two neighbours of the hexes on it), since the opponent can
+    always block the nearest. (Tokens of a chain count as separate neighbours)
+
+    Distances are updated incrementally as hexes change: only the hexes whose distances can change are
+    searched again (with Dijkstra's algorithm, from their neighbours). Changes are recorded, so that the
+    tokens placed by make can be taken back by unmake
+    """
+    OWN = 0
+    EMPTY = 1
+    BLOCKED = 2
+
+    def __init__(self, n, lineAxis, ownTaken, opponentTaken, twoDistance=False, fromEnd=False):
+        self.n = n
+        self.lineAxis = lineAxis
+        self.twoDistance = twoDistance
+
+        # Hexes are numbered r * n + q
+        self.neighbours = []
+        for row in range(n):
+            for column in range(n):
+                self.neighbours.append([(row + dr) * n + column + dq for dr, dq in HEX_STEPS
+                                        if 0 <= row + dr < n and 0 <= column + dq < n])
+        startLine, endLine = (n - 1, 0) if fromEnd else (0, n - 1)
+        self.start = [divmod(index, n)[lineAxis] == startLine for index in range(n * n)]
+        self.end = [index for index in range(n * n) if divmod(index, n)[lineAxis] == endLine]
+
+        self.states = [ConnectionDistance.EMPTY] * (n * n)
+        for hex in ownTaken:
+            self.states[hex[0] * n + hex[1]] = ConnectionDistance.OWN
+        for hex in opponentTaken:
+            self.states[hex[0] * n + hex[1]] = ConnectionDistance.BLOCKED
+
+        # The distance changes made by the moves still to be unmade, as (index, old distance), and for each
+        # such move, the number of changes before it and the hexes it changed with their old states
+        self.changes = []
+        self.moves = []
+
+        self.distances = [inf] * (n * n)
+        queue = []
+        for index in range(n * n):
+            if self.start[index]:
+                self.update(index, queue)
+        self.search(queue)
+
+    def make(self, hex, own, captured):
+        """
+        Places a token at hex (the player's if own, else the opponent's), removing the captured tokens
+        """
+        changed = [(hex, self.states[hex[0] * self.n + hex[1]])]
+        self.moves.append((len(self.changes), changed))
+        self.setState(hex, ConnectionDistance.OWN if own else ConnectionDistance.BLOCKED)
+        for coordinates in captured:
+            changed.append((coordinates, self.states[coordinates[0] * self.n + coordinates[1]]))
+            self.setState(coordinates, ConnectionDistance.EMPTY)
+
+    def unmake(self):
+        """
+        Undoes the last move made
+        """
+        mark, changed = self.moves.pop()
+        for hex, state in changed:
+            self.states[hex[0] * self.n + hex[1]] = state
+        while len(self.changes) > mark:
+            index, distance = self.changes.pop()
+            self.distances[index] = distance
+
+    def setState(self, hex, state):
+        """
+        Changes hex to hold the player's token, no token or the opponent's token (OWN, EMPTY or BLOCKED),
+        updating the distances it affects
+        """
+        index = hex[0] * self.n + hex[1]
+        old = self.states[index]
+        self.states[index] = state
+        queue = []
+        if state < old:
+            # Distances can only fall, starting from the hex's own
+            self.update(index, queue)
+        elif state > old:
+            # Distances can only rise, for the hexes whose distances could have come through the hex: those
+            # at least the distance of a neighbour they could have come from (plus their own cost)
+            distances, states = self.distances, self.states
+            affected = {index}
+            stack = [index]
+            while stack:
+                current = stack.pop()
+                for neighbour in self.neighbours[current]:
+                    cost = 1 if states[neighbour] == ConnectionDistance.EMPTY else 0
+                    if neighbour not in affected and distances[current] + cost <= distances[neighbour] < inf:
+                        affected.add(neighbour)
+                        stack.append(neighbour)
+            for current in affected:
+                self.setDistance(current, inf)
+            for current in affected:
+                self.update(current, queue)
+        self.search(queue)
+
+    def setDistance(self, index, distance):
+        if self.moves:
+            self.changes.append((index, self.distances[index]))
+        self.distances[index] = distance
+
+    def localDistance(self, index):
+        """
+        Returns the distance of a hex given its neighbours' distances
+        """
+        state = self.states[index]
+        if state == ConnectionDistance.BLOCKED:
+            return inf
+        distances = [self.distances[neighbour] for neighbour in self.neighbours[index]]
+        if self.start[index]:
+            distances += [0, 0]
+        if state == ConnectionDistance.OWN:
+            return min(distances)
+        if self.twoDistance:
+            distances.sort()
+            return distances[1] + 1 if len(distances) > 1 else inf
+        return min(distances) + 1
+
+    def update(self, index, queue):
+        """
+        Lowers the distance of a hex if its neighbours allow, queueing it to update its own neighbours
+        """
+        distance = self.localDistance(index)
+        if distance < self.distances[index]:
+            self.setDistance(index, distance)
+            heappush(queue, (distance, index))
+
+    def search(self, queue):
+        """
+        Updates the neighbours of queued hexes, nearest first, until no distance can fall further
+        """
+        distances, states = self.distances, self.states
+        while queue:
+            distance, index = heappop(queue)
+            if distance != distances[index]:
+                continue
+            for neighbour in self.neighbours[index]:
+                state = states[neighbour]
+                if state == ConnectionDistance.BLOCKED:
+                    continue
+                if self.twoDistance and state == ConnectionDistance.EMPTY:
+                    # (which depends on more than its nearest neighbour)
+                    self.update(neighbour, queue)
+                elif distance + state < distances[neighbour]:
+                    # (the states of the hexes that can be passed through are also their costs)
+                    self.setDistance(neighbour, distance + state)
+                    heappush(queue, (distance + state, neighbour))
+
+    def distance(self, hex):
+        """
+        Returns the distance of hex from the start edge
+        """
+        return self.distances[hex[0] * self.n + hex[1]]
+
+    def connectionDistance(self):
+        """
+        Returns the distance between the player's edges (inf if the opponent has cut them off), which is 0
+        once they are connected
+        """
+        if not self.twoDistance:
+            return min(self.distances[index] for index in self.end)
+        distances = sorted(self.distances[index] for index in self.end)
+        connected = [self.distances[index] for index in self.end if self.states[index] == ConnectionDistance.OWN]
+        return min(connected + distances[1:2])
@@ -0,0 +1,109 @@
+import random
+from collections import OrderedDict
+
+
+class EvalCache:
+    """
+    A bounded cache of position evaluations keyed by position hash (see ZobristHash), which evicts the least
+    recently used evaluation when it is full. Counts its hits and misses
+    """
+    # Default number of evaluations kept when there is no space limit
+    DEFAULT_SIZE = 1 << 15
+    # Approximate memory used by each entry (the dict entry, its hash key and value), in bytes
+    ENTRY_BYTES = 160
+    # Share of the player's space limit used by the cache
+    SPACE_FRACTION = 0.25
+
+    def __init__(self, maxSize=DEFAULT_SIZE):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns the evaluation stored for key, or None if there is none
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Stores the evaluation for key, evicting the least recently used evaluation if the cache is full
+        """
+        self.entries[key] = value
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def setSpaceLimit(self, megabytes):
+        """
+        Sizes the cache to its share of a space limit (in MB), evicting evaluations if it shrinks
+        """
+        self.maxSize = max(1, int(megabytes * EvalCache.SPACE_FRACTION * 2 ** 20 / EvalCache.ENTRY_BYTES))
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def takeCounts(self):
+        """
+        Returns the hits and misses since the last call, and resets them
+        """
+        counts = self.hits, self.misses
+        self.hits = self.misses = 0
+        return counts
+
+
+class ZobristHash:
+    """
+    Random 64 bit keys for each hex and token owner, whose XOR over a position's tokens is its hash. The hash
+    of a position is updated by XORing in the key of each token placed or removed.
+
+    A position is worth the same to both players after a half turn of the board ((r, q) -> (n - 1 - r,
+    n - 1 - q)), so caches key positions by their canonical hash: the smaller of the position's hash and the
+    hash of the turned position, which is kept alongside it with the rotated keys. (Transposing the board
+    and swapping the colours also gives an equivalent position, but with the other player to move, which the
+    players' evaluations are not symmetric under)
+    """
+    SEED = 0
+
+    def __init__(self, n):
+        # (a separate generator, so that the players' own use of random is unaffected)
+        rng = random.Random(ZobristHash.SEED)
+        self.ownKeys = {}
+        self.opponentKeys = {}
+        for row in range(n):
+            for column in range(n):
+                self.ownKeys[(row, column)] = rng.getrandbits(64)
+                self.opponentKeys[(row, column)] = rng.getrandbits(64)
+        # XORed into the hash of positions where the opponent is to move, where the side to move matters
+        self.sideKey = rng.getrandbits(64)
+        # The keys of the hex each hex is turned onto
+        self.rotatedOwnKeys = {hex: self.ownKeys[(n - 1 - hex[0], n - 1 - hex[1])] for hex in self.ownKeys}
+        self.rotatedOpponentKeys = {hex: self.opponentKeys[(n - 1 - hex[0], n - 1 - hex[1])]
+                                    for hex in self.opponentKeys}
+
+    def positionHash(self, hexTaken, opponentTaken):
+        """
+        Returns the hash of the position with the given tokens
+        """
+        hash = 0
+        for hex in hexTaken:
+            hash ^= self.ownKeys[hex]
+        for hex in opponentTaken:
+            hash ^= self.opponentKeys[hex]
+        return hash
+
+    def rotatedHash(self, hexTaken, opponentTaken):
+        """
+        Returns the hash of the position with the given tokens after a half turn of the board
+        """
+        hash = 0
+        for hex in hexTaken:
+            hash ^= self.rotatedOwnKeys[hex]
+        for hex in opponentTaken:
+            hash ^= self.rotatedOpponentKeys[hex]
+        return hash
@@ -0,0 +1,38 @@
+# Neighbouring hex steps in clockwise order
+HEX_STEPS = [(1, -1), (1, 0), (0, 1), (-1, 1), (-1, 0), (0, -1)]
+
+
+def captureOffsets():
+    """
+    Returns each way two tokens can form one diagonal of a capture diamond: the offset of the second token
+    from the first, and the offsets from the first of the other diagonal's hexes
+    """
+    offsets = []
+    for i, step in enumerate(HEX_STEPS):
+        before, after = HEX_STEPS[i - 1], HEX_STEPS[(i + 1) % 6]
+        offsets.append((step, before, after))
+        offsets.append(((step[0] + after[0], step[1] + after[1]), step, after))
+    return offsets
+
+
+CAPTURE_OFFSETS = captureOffsets()
+
+
+def captureMoves(own, opponent, empty):
+    """
+    Returns the empty hexes (of the collection empty) where placing a token of the player whose tokens are
+    own would capture, found from the pairs of opponent tokens on one diagonal of a diamond whose other
+    diagonal has a token of the player at one end and an empty hex at the other
+    """
+    ownSet, opponentSet = set(own), set(opponent)
+    moves = set()
+    for hex in opponent:
+        for offset, end1, end2 in CAPTURE_OFFSETS:
+            if (hex[0] + offset[0], hex[1] + offset[1]) in opponentSet:
+                hex1 = (hex[0] + end1[0], hex[1] + end1[1])
+                hex2 = (hex[0] + end2[0], hex[1] + end2[1])
+                if hex1 in ownSet and hex2 in empty:
+                    moves.add(hex2)
+                elif hex2 in ownSet and hex1 in empty:
+                    moves.add(hex1)
+    return moves
@@ -0,0 +1,24 @@
+def unpackPosition(agent, cells, nturns):
+    """
+    Sets an agent's hexTaken, opponentTaken and numTurns from a position given to its setup method (cells maps
+    each occupied (r, q) to the colour of its token, and nturns is the number of turns played so far), and the
+    first move as its lastMove or opponentMove after the first turn, which is needed to handle a STEAL on the
+    next turn. Returns the empty hexes, row by row
+    """
+    agent.hexTaken = [hex for hex, colour in cells.items() if colour == agent.player]
+    agent.opponentTaken = [hex for hex, colour in cells.items() if colour != agent.player]
+
+    # Turns played by the agent so far (the first player moves first)
+    if agent.player == agent.FIRST_PLAYER:
+        agent.numTurns = (nturns + 1) // 2
+    else:
+        agent.numTurns = nturns // 2
+
+    if nturns == 1 and len(cells) == 1:
+        firstMove = next(iter(cells))
+        if agent.player == agent.FIRST_PLAYER:
+            agent.lastMove = firstMove
+        else:
+            agent.opponentMove = firstMove
+
+    return [(row, column) for row in range(agent.n) for column in range(agent.n) if (row, column) not in cells]
@@ -0,0 +1,185 @@
+import numpy as np
+
+from .hexes import HEX_STEPS
+
+
+class ResistanceNetwork:
+    """
+    A player's position as an electrical circuit between their two edges (the ends of the player's axis, 0 for
+    rows and 1 for columns): each hex is a resistor, of low resistance if it holds the player's token, 1 if it
+    is empty and very high if it holds the opponent's, and neighbouring hexes are joined through the sum of
+    their resistances. The fewer and shorter the player's open paths between their edges, the higher the
+    resistance between them.
+
+    The network's Laplacian is inverted once, and a hex changing (a move or capture) changes only the
+    conductances of that hex's joins, a low rank update that is applied to the inverse with the Woodbury
+    identity. The inverse is computed again from scratch after REFACTOR_UPDATES updates, or instead of an
+    update that is ill conditioned (such as blocking a hex between the player's tokens), so that rounding
+    errors do not build up. (On the boards played, of at most a few hundred hexes, the dense inverse of the
+    Laplacian is both smaller and faster to apply than a banded factorisation solved row by row in Python)
+    """
+    OWN = 0
+    EMPTY = 1
+    BLOCKED = 2
+    # Resistance of a hex in each state
+    RESISTANCES = [0.01, 1.0, 1e4]
+    REFACTOR_UPDATES = 16
+    # Largest condition number of the Woodbury identity's inner matrix that an update is applied with
+    MAX_CONDITION = 1e4
+    # The joins between hexes of each board size, shared by all of its networks
+    structures = {}
+
+    def __init__(self, n, lineAxis, ownTaken, opponentTaken):
+        self.n = n
+        self.joins, self.incidence, lines = self.structure(n)
+        # The hexes (numbered r * n + q) joined to each edge
+        self.start = lines[lineAxis] == 0
+        self.end = lines[lineAxis] == n - 1
+
+        self.states = np.full(n * n, ResistanceNetwork.EMPTY)
+        for hex in ownTaken:
+            self.states[hex[0] * n + hex[1]] = ResistanceNetwork.OWN
+        for hex in opponentTaken:
+            self.states[hex[0] * n + hex[1]] = ResistanceNetwork.BLOCKED
+        self.refactor()
+
+    def structure(self, n):
+        """
+        Returns the pairs of hexes joined on a board of size n, the incidence matrix of the joins (+1 and -1 at
+        the two hexes of each join) and each hex's row and column
+        """
+        if n not in ResistanceNetwork.structures:
+            joins = []
+            for row in range(n):
+                for column in range(n):
+                    for dr, dq in HEX_STEPS[:3]:
+                        if 0 <= row + dr < n and 0 <= column + dq < n:
+                            joins.append((row * n + column, (row + dr) * n + column + dq))
+            joins = np.array(joins)
+            incidence = np.zeros((len(joins), n * n))
+            incidence[np.arange(len(joins)), joins[:, 0]] = 1
+            incidence[np.arange(len(joins)), joins[:, 1]] = -1
+            lines = np.divmod(np.arange(n * n), n)
+            ResistanceNetwork.structures[n] = joins, incidence, lines
+        return ResistanceNetwork.structures[n]
+
+    def conductances(self):
+        """
+        Returns the conductance of each join, and of each hex's joins to the start and end edges
+        """
+        resistances = np.array(ResistanceNetwork.RESISTANCES)[self.states]
+        joins = 1 / (resistances[self.joins[:, 0]] + resistances[self.joins[:, 1]])
+        return joins, np.where(self.start, 1 / resistances, 0), np.where(self.end, 1 / resistances, 0)
+
+    def laplacian(self):
+        """
+        Returns the Laplacian of the network's current conductances, and the conductances
+        """
+        conductances = joins, start, end = self.conductances()
+        return (self.incidence.T * joins) @ self.incidence + np.diag(start + end), conductances
+
+    def refactor(self):
+        """
+        Inverts the Laplacian of the network's current conductances
+        """
+        self.inverse = np.linalg.inv(self.laplacian()[0])
+        self.updates = 0
+
+    def change(self, index, state):
+        """
+        Returns the change to the Laplacian if hex index held the given state, as U and D (the Laplacian
+        changing by U D U^T), and the conductances it would have
+        """
+        oldJoins, oldStart, oldEnd = self.conductances()
+        old, self.states[index] = self.states[index], state
+        conductances = joins, start, end = self.conductances()
+        self.states[index] = old
+
+        # A column of U for each of the hex's joins (its incidence) and for its joins to the edges, scaled by
+        # the change in conductance in D
+        changed = np.flatnonzero((self.joins[:, 0] == index) | (self.joins[:, 1] == index))
+        columns = [self.incidence[changed].T]
+        changes = [joins[changed] - oldJoins[changed]]
+        edge = start[index] + end[index] - oldStart[index] - oldEnd[index]
+        if edge:
+            column = np.zeros((self.n * self.n, 1))
+            column[index] = 1
+            columns.append(column)
+            changes.append([edge])
+        return np.hstack(columns), np.concatenate(changes), conductances
+
+    def woodbury(self, u, d):
+        """
+        Returns A^-1 U and the inner matrix I + D U^T A^-1 U of the Woodbury identity for the change U D U^T,
+        (A + U D U^T)^-1 = A^-1 - A^-1 U (I + D U^T A^-1 U)^-1 D U^T A^-1, or None if the inner matrix is ill
+        conditioned
+        """
+        w = self.inverse @ u
+        middle = np.eye(len(d)) + d[:, None] * (u.T @ w)
+        if np.linalg.cond(middle) > ResistanceNetwork.MAX_CONDITION:
+            return None
+        return w, middle
+
+    def setState(self, hex, state):
+        """
+        Changes hex to hold the player's token, no token or the opponent's token (OWN, EMPTY or BLOCKED),
+        updating the inverse Laplacian
+        """
+        index = hex[0] * self.n + hex[1]
+        if self.states[index] == state:
+            return
+        u, d, conductances = self.change(index, state)
+        terms = self.woodbury(u, d) if self.updates < ResistanceNetwork.REFACTOR_UPDATES else None
+        self.states[index] = state
+        if terms is None:
+            self.refactor()
+            return
+        w, middle = terms
+        self.inverse -= w @ np.linalg.solve(middle, d[:, None] * w.T)
+        self.updates += 1
+
+    def potentials(self):
+        """
+        Returns the voltage at each hex with the start edge held at 1 and the end edge at 0, and the
+        conductances they were found with
+        """
+        conductances = self.conductances()
+        return self.inverse @ conductances[1], conductances
+
+    def resistance(self):
+        """
+        Returns the resistance between the player's edges
+        """
+        voltages, (joins, start, end) = self.potentials()
+        return 1 / (start @ (1 - voltages))
+
+    def resistanceAfter(self, hex, state):
+        """
+        Returns the resistance between the player's edges if hex held the given state, leaving the network
+        unchanged: the Woodbury identity is applied to the start edge's conductances rather than to the inverse
+        (and the Laplacian solved directly if it is ill conditioned), so this never refactors the network
+        """
+        index = hex[0] * self.n + hex[1]
+        if self.states[index] == state:
+            return self.resistance()
+        u, d, (joins, start, end) = self.change(index, state)
+        terms = self.woodbury(u, d)
+        if terms is None:
+            old, self.states[index] = self.states[index], state
+            laplacian = self.laplacian()[0]
+            self.states[index] = old
+            voltages = np.linalg.solve(laplacian, start)
+        else:
+            w, middle = terms
+            voltages = self.inverse @ start - w @ np.linalg.solve(middle, d * (w.T @ start))
+        return 1 / (start @ (1 - voltages))
+
+    def currentFlow(self):
+        """
+        Returns the current through each hex (as an n by n array) with the player's edges 1 volt apart, which
+        is highest on the paths the player's connection depends on most
+        """
+        voltages, (joins, start, end) = self.potentials()
+        currents = joins * np.abs(self.incidence @ voltages)
+        flow = np.abs(self.incidence).T @ currents + start * np.abs(1 - voltages) + end * np.abs(voltages)
+        return (flow / 2).reshape(self.n, self.n)
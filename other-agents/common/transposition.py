@@ -0,0 +1,91 @@
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedTranspositionTable:
+    """
+    A transposition table in shared memory, through which processes searching the same game share what they
+    have found. Buckets of entries are indexed by the low bits of position hashes (see ZobristHash), and each
+    entry packs a search result: the hash, the depth searched, whether the value is exact or a bound, the value
+    and the best move (as an index, r * n + q).
+
+    Processes read and write entries without locking. An entry's check word is the XOR of the hash with its
+    other words, so an entry torn by writes from two processes at once fails verification and reads as a miss
+    """
+    BUCKET_SIZE = 4
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+    NO_MOVE = 0xFFFF
+    ENTRY = np.dtype([("check", np.uint64), ("data", np.uint64), ("value", np.float64)])
+
+    def __init__(self, buckets, name=None):
+        """
+        Creates a table with the given number of buckets (a power of two), or attaches to the table in the
+        shared memory block with the given name
+        """
+        self.owner = name is None
+        size = buckets * SharedTranspositionTable.BUCKET_SIZE * SharedTranspositionTable.ENTRY.itemsize
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.buckets = buckets
+        self.mask = buckets - 1
+        self.entries = np.ndarray((buckets, SharedTranspositionTable.BUCKET_SIZE),
+                                  dtype=SharedTranspositionTable.ENTRY, buffer=self.memory.buf)
+        # The same memory as (check, data, value bits) words, for reading and writing whole entries at once
+        self.words = self.entries.view(np.uint64).reshape(buckets, SharedTranspositionTable.BUCKET_SIZE, 3)
+        if self.owner:
+            self.words[:] = 0
+
+    def probe(self, hash):
+        """
+        Returns (depth, bound, value, move) stored for the position with the given hash, or None if there is
+        no entry for it (move is None if there is no best move)
+        """
+        for check, data, valueBits in self.words[hash & self.mask].tolist():
+            if data and check ^ data ^ valueBits == hash:
+                move = data >> 10
+                return ((data & 0xFF) - 1, (data >> 8) & 0x3, struct.unpack("<d", struct.pack("<Q", valueBits))[0],
+                        None if move == SharedTranspositionTable.NO_MOVE else move)
+        return None
+
+    def store(self, hash, depth, bound, value, move=None):
+        """
+        Stores a search result for the position with the given hash, replacing the bucket's entry for the
+        same position (unless it was searched deeper), or else an empty entry or the shallowest one
+        """
+        bucket = self.words[hash & self.mask]
+        slot = None
+        shallowest = None
+        for i, (check, data, valueBits) in enumerate(bucket.tolist()):
+            if data and check ^ data ^ valueBits == hash:
+                if (data & 0xFF) - 1 > depth and bound != SharedTranspositionTable.EXACT:
+                    return
+                slot = i
+                break
+            if not data:
+                shallowest = -1, i
+            elif shallowest is None or (data & 0xFF) < shallowest[0]:
+                shallowest = data & 0xFF, i
+        if slot is None:
+            slot = shallowest[1]
+
+        if move is None:
+            move = SharedTranspositionTable.NO_MOVE
+        data = (depth + 1) | (bound << 8) | (move << 10)
+        valueBits = struct.unpack("<Q", struct.pack("<d", value))[0]
+        bucket[slot] = (hash ^ data ^ valueBits, data, valueBits)
+
+    def close(self):
+        """
+        Detaches from the shared memory (and frees it, if this table created it)
+        """
+        del self.entries, self.words
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,392 @@
+"""
+Play batches of games between 2 Player classes in long-lived ("warm")
+worker processes.
+
+Each worker imports the referee and the player packages once, and then
+plays games from a queue of game specifications (board size, which player
+is red, and a random seed), returning a result for each. Every game still
+gets fresh Player instances (and player wrappers, with fresh time limits),
+and a fresh space accounting window.
+
+Usage: python -m referee.batch [options] n red blue
+(run `python -m referee.batch --help` for details)
+"""
+
+import gc
+import json
+import random
+import argparse
+import collections
+import multiprocessing
+
+from referee.log import config, comment, quiet
+from referee.game import play, IllegalActionException
+from referee.player import PlayerWrapper, ResourceLimitException
+from referee.player import set_space_line, game_stats, _load_player_class
+from referee.latency import LatencyRecorder, format_summary
+from referee.openings import read_suite
+from referee.options import PackageSpecAction, parse_board_sizes
+
+
+# A single game to play: board size n, (module, class) specifications of
+# the red and blue players, the seed for the `random` module, and the
+# opening actions to play before the players choose their own
+GameSpec = collections.namedtuple(
+    "GameSpec", "n red blue seed opening", defaults=((),)
+)
+
+
+def make_specs(sizes, player_locs, games, seed=0, swap=True, openings=None):
+    """
+    Generate `games` game specifications for each board size. If swap is
+    True, consecutive games are played with the colours swapped (so each
+    player plays each colour equally often for an even number of games).
+    Seeds are consecutive, starting from `seed`.
+
+    If `openings` (a dict from board size to a list of openings, as read
+    by referee.openings.read_suite) is given, games start from these
+    openings in turn; with swap, both games of a pair use the same opening.
+    """
+    specs = []
+    for n in sizes:
+        for i in range(games):
+            red, blue = player_locs
+            if swap and i % 2 == 1:
+                red, blue = blue, red
+            opening = ()
+            if openings and openings[n]:
+                pair = i // 2 if swap else i
+                opening = openings[n][pair % len(openings[n])]
+            specs.append(GameSpec(n, red, blue, seed + len(specs), opening))
+    return specs
+
+
+class GamePool:
+    """
+    Pool of warm worker processes for playing games. Use as a context
+    manager, or call close() when done:
+
+        with GamePool(4, player_locs) as pool:
+            for result in pool.play(specs):
+                ...
+
+    With 0 workers, games are played one at a time in this process.
+    """
+
+    def __init__(
+        self,
+        workers,
+        player_locs,
+        time_limit=None,
+        space_limit=None,
+        memory_profile=False,
+    ):
+        settings = (player_locs, time_limit, space_limit, memory_profile)
+        if workers > 0:
+            self._pool = multiprocessing.Pool(
+                workers,
+                initializer=_init_worker,
+                initargs=settings,
+            )
+        else:
+            self._pool = None
+            _init_worker(*settings, quiet=False)
+
+    def play(self, specs, ordered=True):
+        """
+        Play the given games, yielding a result dict for each (see
+        run_game). Results are yielded in order of the specs unless
+        ordered is False (then they are yielded as soon as they finish).
+        """
+        if self._pool is None:
+            return map(_run_game_quietly, specs)
+        if ordered:
+            return self._pool.imap(run_game, specs)
+        return self._pool.imap_unordered(run_game, specs)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+# Settings shared by all games played by this (worker) process
+_WORKER_SETTINGS = None
+
+
+def _init_worker(
+    player_locs, time_limit, space_limit, memory_profile, quiet=True
+):
+    """
+    Warm up a worker: silence commentary and import the player classes
+    (the import is cached, so each game's wrappers find them ready).
+    """
+    global _WORKER_SETTINGS
+    if quiet:
+        config(level=0)
+    for player_pkg, player_cls in player_locs:
+        _load_player_class(player_pkg, player_cls)
+    _WORKER_SETTINGS = (time_limit, space_limit, memory_profile)
+    # the timer collects garbage before every player call; move everything
+    # imported so far out of the collector's sight so that only objects
+    # created by the games themselves need to be scanned
+    gc.collect()
+    gc.freeze()
+
+
+def run_game(spec, **play_kwargs):
+    """
+    Play a single game in this process, returning a dict with the game's
+    spec, its result string, the number of turns played, and the players'
+    statistics (as written to --stats files).
+    """
+    time_limit, space_limit, memory_profile = _WORKER_SETTINGS
+    random.seed(spec.seed)
+    players = [
+        PlayerWrapper(
+            f"player {num}",
+            player_loc,
+            time_limit=time_limit,
+            space_limit=space_limit,
+            memory_profile=memory_profile,
+        )
+        for num, player_loc in enumerate((spec.red, spec.blue), 1)
+    ]
+    # start a fresh space accounting window for this game
+    set_space_line()
+    try:
+        result = play(
+            players,
+            n=spec.n,
+            print_state=False,
+            opening=spec.opening,
+            **play_kwargs,
+        )
+    except (IllegalActionException, ResourceLimitException) as e:
+        result = f"error: {e}"
+    except Exception as e:
+        # a crashing player should not bring down the whole batch
+        result = f"error: {type(e).__name__}: {e}"
+    return {
+        "spec": spec._asdict(),
+        "result": result,
+        "turns": max(p.nturns for p in players),
+        "stats": game_stats(players, spec.n, result),
+    }
+
+
+def compact_result(result):
+    """
+    The parts of a game result that depend only on the game's spec (i.e.
+    not on timing), for comparing results between runs.
+    """
+    return {key: result[key] for key in ("spec", "result", "turns")}
+
+
+def write_results(filename, results):
+    """
+    Write compact results (one JSON object per line) to a file.
+    """
+    with open(filename, "w") as results_file:
+        for result in results:
+            results_file.write(json.dumps(compact_result(result)) + "\n")
+
+
+def _run_game_quietly(spec):
+    # (for playing games in the main process, without its commentary)
+    with quiet():
+        return run_game(spec)
+
+
+def tally(results):
+    """
+    Count wins, draws and errors for each player package, by board size.
+    Returns a dict from n to a Counter of outcomes.
+    """
+    tallies = collections.defaultdict(collections.Counter)
+    for r in results:
+        spec = GameSpec(**r["spec"])
+        outcome = r["result"]
+        if outcome.startswith("winner: "):
+            winner = spec.red if outcome.endswith("red") else spec.blue
+            tallies[spec.n][f"{_spec_name(winner)} wins"] += 1
+        else:
+            tallies[spec.n][outcome.split(":")[0] + "s"] += 1
+    return tallies
+
+
+def describe_result(result):
+    spec = GameSpec(**result["spec"])
+    return (
+        f"n={spec.n} seed={spec.seed} red={_spec_name(spec.red)} "
+        f"blue={_spec_name(spec.blue)}: {result['result']}"
+    )
+
+
+def _spec_name(player_loc):
+    return ":".join(player_loc)
+
+
+def get_options(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.batch",
+        description="play a batch of Cachex games between 2 Player classes "
+        "in warm worker processes.",
+    )
+    parser.add_argument(
+        "n",
+        type=parse_board_sizes,
+        help="size of the game board, or a range of sizes (e.g. 3-6)",
+    )
+    for colour in ("red", "blue"):
+        parser.add_argument(
+            f"{colour}_loc",
+            metavar=colour,
+            action=PackageSpecAction,
+            help=f"location of {colour.title()}'s Player class in the first "
+            "game of each pair",
+        )
+    parser.add_argument(
+        "-g",
+        "--games",
+        type=int,
+        default=10,
+        help="number of games to play per board size (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of worker processes, or 0 to play in this process "
+        "(default: number of CPUs)",
+    )
+    parser.add_argument(
+        "-r",
+        "--seed",
+        type=int,
+        default=0,
+        help="random seed for the first game (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--openings",
+        metavar="SUITEFILE",
+        help="start games from the openings in SUITEFILE (see "
+        "referee.openings), each used by a pair of games with the colours "
+        "swapped.",
+    )
+    parser.add_argument(
+        "--no-swap",
+        dest="swap",
+        action="store_false",
+        help="don't swap colours between consecutive games",
+    )
+    parser.add_argument(
+        "-s",
+        "--space",
+        metavar="space_limit",
+        type=float,
+        default=0,
+        help="limit on memory space (float, MB) for each player.",
+    )
+    parser.add_argument(
+        "-t",
+        "--time",
+        metavar="time_limit",
+        type=float,
+        default=0,
+        help="limit on CPU time (float, seconds) for each player.",
+    )
+    parser.add_argument(
+        "-m",
+        "--memory-profile",
+        action="store_true",
+        help="profile each player call's allocations with tracemalloc.",
+    )
+    parser.add_argument(
+        "-o",
+        "--results",
+        metavar="RESULTSFILE",
+        help="write the result of each game (one JSON object per line, in "
+        "order) to RESULTSFILE.",
+    )
+    parser.add_argument(
+        "-j",
+        "--stats",
+        metavar="STATSFILE",
+        help="append a JSON record of each game's statistics to STATSFILE.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = get_options(argv)
+    player_locs = (options.red_loc, options.blue_loc)
+    openings = None
+    if options.openings is not None:
+        openings = read_suite(options.openings)
+    specs = make_specs(
+        options.n,
+        player_locs,
+        options.games,
+        options.seed,
+        options.swap,
+        openings,
+    )
+
+    config(level=1)
+    results = []
+    latency = collections.defaultdict(LatencyRecorder)
+    with GamePool(
+        options.workers,
+        player_locs,
+        time_limit=options.time,
+        space_limit=options.space,
+        memory_profile=options.memory_profile,
+    ) as pool:
+        for result in pool.play(specs):
+            results.append(result)
+            comment(describe_result(result))
+            for player in result["stats"]["players"]:
+                recorder = LatencyRecorder.from_dict(player["latency"])
+                latency[player["package"]].merge(recorder)
+            if options.stats is not None:
+                with open(options.stats, "a") as stats_file:
+                    stats_file.write(json.dumps(result["stats"]) + "\n")
+        pool.close()
+
+    if options.results is not None:
+        write_results(options.results, results)
+    report_results(results, latency)
+
+
+def report_results(results, latency=None):
+    """
+    Display the tally of a batch's results by board size (and the merged
+    latency summary of each player package, if given).
+    """
+    comment("batch results:", depth=-1)
+    for n, counts in sorted(tally(results).items()):
+        outcomes = ", ".join(f"{c} {o}" for o, c in sorted(counts.items()))
+        comment(f"n={n}: {outcomes}", depth=1)
+    if latency is None:
+        return
+    comment("latency summary:", depth=-1)
+    for package, recorder in sorted(latency.items()):
+        comment(package, depth=1)
+        for line in format_summary(recorder):
+            comment(line, depth=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Benchmark Player classes' per-call latency and memory on a fixed set of
+positions, and compare the results against a stored baseline to catch
+performance regressions.
+
+For each Player class, board size and position (from a corpus file, see
+referee.corpus, or generated with the same seeded procedure), the
+benchmark times:
+* `__init__`,
+* `setup()` (to put the player in the position; see referee.position),
+* `action()`, and
+* `turn()` with the action the player chose,
+repeating each measurement with a fresh player. It reports the median and
+95th percentile latency of each method per board size, and the peak memory
+allocated during a call (measured with tracemalloc, in a separate untimed
+pass, since tracing slows down the calls).
+
+Usage:
+    python -m referee.benchmark run [options] [player ...]
+    python -m referee.benchmark compare [-T TOLERANCE] BASELINE RESULTS
+(run with --help for details)
+"""
+
+import gc
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import tracemalloc
+import collections
+
+from referee.corpus import Corpus, build_corpus, position_from_row
+from referee.position import occupied_cells
+from referee.options import parse_package_spec, parse_board_sizes
+from referee.player import _load_player_class
+
+BENCHMARK_VERSION = 1
+
+DEFAULT_PLAYERS = (
+    "br4h",
+    "other-agents/GreedyAgent/player",
+    "other-agents/MinimaxAgent/player",
+    "other-agents/BranchOrder/player",
+    "other-agents/RandomAgent/player",
+)
+
+METHODS = ("init", "setup", "action", "turn")
+
+# Latencies below this (seconds) are too noisy to compare
+_MIN_COMPARABLE_LATENCY = 1e-4
+
+
+def benchmark_player(Player, positions, repeats=5, seed=0):
+    """
+    Time each method of a Player class on each of the given positions (all
+    for the same board size). Returns a dict from method name to a list of
+    latency samples (seconds), and a dict from method name to the peak
+    memory (bytes) allocated by any call.
+    """
+    samples = collections.defaultdict(list)
+    for num, position in enumerate(positions):
+        for repeat in range(repeats):
+            times = _run_calls(Player, position, seed + num)
+            for method, elapsed in times.items():
+                samples[method].append(elapsed)
+
+    peaks = dict.fromkeys(METHODS, 0)
+    tracemalloc.start()
+    try:
+        for num, position in enumerate(positions):
+            peak = _run_calls(Player, position, seed + num, traced=True)
+            for method in METHODS:
+                peaks[method] = max(peaks[method], peak[method])
+    finally:
+        tracemalloc.stop()
+    return samples, peaks
+
+
+def _run_calls(Player, position, seed, traced=False):
+    """
+    Construct a player, set it up in the position, ask it for an action and
+    tell it about that action. Returns a dict from method name to the time
+    each call took (seconds), or if traced, the peak memory (bytes) it
+    allocated (tracemalloc must be tracing).
+    """
+    cells = occupied_cells(position)
+    colour = position.to_move
+    results = {}
+    # (some players print debugging output; keep it out of the report)
+    with contextlib.redirect_stdout(io.StringIO()):
+        random.seed(seed)
+        calls = (
+            ("init", lambda: Player(colour, position.n)),
+            ("setup", lambda: player.setup(cells, position.nturns)),
+            ("action", lambda: player.action()),
+            ("turn", lambda: player.turn(colour, action)),
+        )
+        for method, call in calls:
+            gc.collect()
+            if traced:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                result = call()
+                results[method] = tracemalloc.get_traced_memory()[1] - baseline
+            else:
+                start = time.perf_counter()
+                result = call()
+                results[method] = time.perf_counter() - start
+            if method == "init":
+                player = result
+            elif method == "action":
+                action = result
+    return results
+
+
+def _percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def run_benchmarks(player_locs, corpus_sections, repeats=5, seed=0):
+    """
+    Benchmark each Player class on each board size of a corpus (a dict
+    from n to a list of positions). Returns a list of result records, one
+    per (player, method, n).
+    """
+    records = []
+    for player_loc in player_locs:
+        Player = _load_player_class(*player_loc)
+        for n, positions in sorted(corpus_sections.items()):
+            samples, peaks = benchmark_player(Player, positions, repeats, seed)
+            for method in METHODS:
+                records.append({
+                    "player": ":".join(player_loc),
+                    "method": method,
+                    "n": n,
+                    "calls": len(samples[method]),
+                    "median": _percentile(samples[method], 50),
+                    "p95": _percentile(samples[method], 95),
+                    "peak_memory": peaks[method],
+                })
+    return records
+
+
+def load_positions(sizes, fills, count, seed=0, corpus_filename=None):
+    """
+    A dict from board size to a list of positions: from a corpus file if
+    given, or else generated as referee.corpus would.
+    """
+    if corpus_filename is not None:
+        corpus = Corpus(corpus_filename)
+        return {
+            n: [corpus.position(n, i) for i in range(len(corpus.meta(n)))]
+            for n in corpus.sizes()
+            if n in sizes
+        }
+    sections = build_corpus(sizes, fills, count, seed)
+    return {
+        n: [position_from_row(c, m) for c, m in zip(cells, meta)]
+        for n, (cells, meta, _) in sections.items()
+    }
+
+
+def compare_results(baseline, results, tolerance=0.1):
+    """
+    Compare two benchmark results. Returns a list of (record key, metric,
+    baseline value, new value) for each metric that got worse by more than
+    the tolerance (a fraction, e.g. 0.1 for 10%).
+    """
+    old = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for record in results["results"]:
+        key = _key(record)
+        if key not in old:
+            continue
+        for metric in ("median", "p95", "peak_memory"):
+            before, after = old[key][metric], record[metric]
+            if metric != "peak_memory" and after < _MIN_COMPARABLE_LATENCY:
+                continue
+            if after > before * (1 + tolerance):
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+def _key(record):
+    return record["player"], record["method"], record["n"]
+
+
+def format_results(results):
+    """
+    Lines of a table summarising benchmark results.
+    """
+    lines = []
+    player = None
+    for r in results["results"]:
+        if r["player"] != player:
+            player = r["player"]
+            lines.append(player)
+        lines.append(
+            f"  n={r['n']:2d} {r['method']:>6s}: {r['calls']:4d} calls  "
+            f"median: {r['median'] * 1000:10.3f}ms  "
+            f"p95: {r['p95'] * 1000:10.3f}ms  "
+            f"peak: {r['peak_memory'] / 1024:9.1f}KB"
+        )
+    return lines
+
+
+def format_regression(regression):
+    (player, method, n), metric, before, after = regression
+    if metric == "peak_memory":
+        values = f"{before / 1024:.1f}KB -> {after / 1024:.1f}KB"
+    else:
+        values = f"{before * 1000:.3f}ms -> {after * 1000:.3f}ms"
+    change = (after / before - 1) if before else float("inf")
+    return f"{player} {method} n={n} {metric}: {values} ({change:+.0%})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.benchmark",
+        description="benchmark Cachex Player classes' per-call latency and "
+        "memory on fixed positions.",
+    )
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    run_parser = modes.add_parser("run", help="run the benchmarks.")
+    run_parser.add_argument(
+        "player_locs",
+        metavar="player",
+        nargs="*",
+        type=parse_package_spec,
+        help="location of a Player class (default: all bundled agents)",
+    )
+    run_parser.add_argument("-n", "--sizes", type=parse_board_sizes,
+        default=parse_board_sizes("4-7"),
+        help="board size, or a range of sizes (default: 4-7)")
+    run_parser.add_argument("-c", "--corpus", metavar="CORPUSFILE",
+        help="take the positions from a corpus file (see referee.corpus) "
+        "instead of generating them")
+    run_parser.add_argument("-f", "--fill", type=float, nargs="+",
+        default=[0.25, 0.5, 0.75],
+        help="fill levels of generated positions (default: %(default)s)")
+    run_parser.add_argument("-k", "--count", type=int, default=2,
+        help="generated positions per board size and fill level "
+        "(default: %(default)s)")
+    run_parser.add_argument("-R", "--repeats", type=int, default=5,
+        help="timed repeats per position (default: %(default)s)")
+    run_parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+    run_parser.add_argument("-o", "--output", metavar="RESULTSFILE",
+        help="write the results (JSON) to RESULTSFILE")
+    run_parser.add_argument("-b", "--baseline", metavar="BASELINE",
+        help="compare the results against a baseline results file")
+    run_parser.add_argument("-T", "--tolerance", type=float, default=0.1,
+        help="allowed slowdown (fraction) before a change counts as a "
+        "regression (default: %(default)s)")
+
+    compare_parser = modes.add_parser("compare",
+        help="compare results against a baseline.")
+    compare_parser.add_argument("baseline", metavar="BASELINE")
+    compare_parser.add_argument("results", metavar="RESULTSFILE")
+    compare_parser.add_argument("-T", "--tolerance", type=float, default=0.1,
+        help="allowed slowdown (fraction) before a change counts as a "
+        "regression (default: %(default)s)")
+    options = parser.parse_args(argv)
+
+    if options.mode == "run":
+        player_locs = options.player_locs or [
+            parse_package_spec(loc) for loc in DEFAULT_PLAYERS
+        ]
+        positions = load_positions(
+            options.sizes, options.fill, options.count, options.seed,
+            options.corpus,
+        )
+        results = {
+            "version": BENCHMARK_VERSION,
+            "settings": {
+                "sizes": options.sizes,
+                "corpus": options.corpus,
+                "fills": options.fill,
+                "count": options.count,
+                "repeats": options.repeats,
+                "seed": options.seed,
+                "python": sys.version.split()[0],
+            },
+            "results": run_benchmarks(
+                player_locs, positions, options.repeats, options.seed
+            ),
+        }
+        for line in format_results(results):
+            print(line)
+        if options.output is not None:
+            with open(options.output, "w") as results_file:
+                json.dump(results, results_file, indent=1)
+        if options.baseline is None:
+            return
+        results_filename = None
+    else:
+        results_filename = options.results
+
+    with open(options.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if results_filename is not None:
+        with open(results_filename) as results_file:
+            results = json.load(results_file)
+    regressions = compare_results(baseline, results, options.tolerance)
+    for regression in regressions:
+        print("regression: " + format_regression(regression))
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions (tolerance {options.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+A fixed, versioned corpus of positions for benchmarking players, stored in
+one compact file that can be memory-mapped (so that parallel benchmark
+workers share a single copy of it).
+
+The corpus is built by seeded random play through `Game.update` (so
+captures are applied exactly as in real games), stopping at given board
+fill levels. For each board size n, the file holds a (K, n, n) int8 array
+of cells (0 empty, 1 red, 2 blue, as in `Board`) and a length K array of
+metadata: the number of turns played, the colour to move (1 red, 2 blue)
+and whether STEAL is allowed.
+
+File layout: the magic bytes b"CACHEXPC", the length of the header (4 byte
+little-endian unsigned int), then a JSON header describing the corpus and
+the offset of each array, then the arrays themselves (each aligned to
+_ALIGN bytes).
+
+Usage:
+    python -m referee.corpus build [options] n CORPUSFILE
+    python -m referee.corpus info CORPUSFILE
+(run with --help for details)
+"""
+
+import json
+import random
+import struct
+import hashlib
+import argparse
+
+import numpy as np
+
+from referee.board import Board
+from referee.game import _PLAYER_TURN_ORDER
+from referee.options import parse_board_sizes
+from referee.position import Position, random_position, occupied_cells
+
+CORPUS_VERSION = 1
+
+_MAGIC = b"CACHEXPC"
+_ALIGN = 64
+
+# Metadata for each position (cells are stored separately)
+META_DTYPE = np.dtype([("nturns", "<i2"), ("to_move", "i1"), ("steal", "i1")])
+
+_SYMBOLS = ".rb"
+
+# Give up on a fill level after this many random games end before reaching it
+_MAX_FAILURES = 100
+
+
+def build_corpus(sizes, fills, count, seed=0):
+    """
+    Generate `count` positions for each board size and fill level. Returns
+    a dict from n to a (cells, meta, fills) triple: arrays with rows
+    ordered by fill level, and the fill levels included. (A fill level is
+    left out for a board size if random games keep ending before reaching
+    it, e.g. by the maximum number of turns on large boards.) The result
+    depends only on the arguments.
+    """
+    sections = {}
+    for n in sizes:
+        rng = random.Random(seed * 1000 + n)
+        positions = []
+        included = []
+        for fill in fills:
+            found = []
+            failures = 0
+            while len(found) < count and failures < _MAX_FAILURES:
+                position = random_position(n, fill, rng)
+                if position is None:
+                    failures += 1
+                else:
+                    found.append(position)
+            if len(found) == count:
+                positions.extend(found)
+                included.append(fill)
+        cells = np.zeros((len(positions), n, n), dtype=np.int8)
+        meta = np.zeros(len(positions), dtype=META_DTYPE)
+        for i, position in enumerate(positions):
+            for r, row in enumerate(position.cells):
+                cells[i, r] = [_SYMBOLS.index(symbol) for symbol in row]
+            meta[i] = (
+                position.nturns,
+                _PLAYER_TURN_ORDER.index(position.to_move) + 1,
+                position.steal,
+            )
+        sections[n] = cells, meta, included
+    return sections
+
+
+def write_corpus(filename, sections, **info):
+    """
+    Write a corpus (a dict from n to (cells, meta, fills), see
+    build_corpus) to a file. Extra keyword arguments are stored in the
+    header (e.g. how the corpus was built).
+    """
+    header = {"version": CORPUS_VERSION, **info, "sections": []}
+    offset = 0
+    blocks = []
+    for n, (cells, meta, fills) in sorted(sections.items()):
+        entry = {"n": n, "count": len(cells), "fills": fills}
+        for name, array in (("cells", cells), ("meta", meta)):
+            entry[name] = offset
+            data = array.tobytes()
+            blocks.append(data)
+            offset = _aligned(offset + len(data))
+            blocks.append(bytes(offset - entry[name] - len(data)))
+        entry["sha256"] = hashlib.sha256(cells.tobytes()).hexdigest()
+        header["sections"].append(entry)
+
+    encoded = json.dumps(header).encode()
+    start = _aligned(len(_MAGIC) + 4 + len(encoded))
+    encoded += b" " * (start - len(_MAGIC) - 4 - len(encoded))
+    with open(filename, "wb") as corpus_file:
+        corpus_file.write(_MAGIC + struct.pack("<I", len(encoded)) + encoded)
+        for block in blocks:
+            corpus_file.write(block)
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def position_from_row(cells, meta):
+    """
+    Convert one row of a corpus section (an (n, n) array of cells and its
+    metadata) into a Position snapshot (without a move list).
+    """
+    return Position(
+        len(cells),
+        tuple("".join(_SYMBOLS[token] for token in row) for row in cells),
+        _PLAYER_TURN_ORDER[meta["to_move"] - 1],
+        int(meta["nturns"]),
+        bool(meta["steal"]),
+    )
+
+
+class Corpus:
+    """
+    Read-only view of a corpus file. Arrays are memory-mapped, so opening a
+    corpus is cheap and processes reading the same file share its pages.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as corpus_file:
+            if corpus_file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{filename!r} is not a position corpus")
+            (length,) = struct.unpack("<I", corpus_file.read(4))
+            self.header = json.loads(corpus_file.read(length))
+        if self.header["version"] != CORPUS_VERSION:
+            raise ValueError(
+                f"unsupported corpus version {self.header['version']}"
+            )
+        start = len(_MAGIC) + 4 + length
+        self._sections = {}
+        for entry in self.header["sections"]:
+            n, count = entry["n"], entry["count"]
+            cells = np.memmap(filename, dtype=np.int8, mode="r",
+                offset=start + entry["cells"], shape=(count, n, n))
+            meta = np.memmap(filename, dtype=META_DTYPE, mode="r",
+                offset=start + entry["meta"], shape=(count,))
+            self._sections[n] = cells, meta
+
+    def sizes(self):
+        return sorted(self._sections)
+
+    def cells(self, n):
+        """
+        The (K, n, n) int8 array of cells for board size n.
+        """
+        return self._sections[n][0]
+
+    def meta(self, n):
+        """
+        The length K array of metadata for board size n (see META_DTYPE).
+        """
+        return self._sections[n][1]
+
+    def verify(self):
+        """
+        True iff every section's cells match the checksum in the header.
+        """
+        return all(
+            hashlib.sha256(self.cells(e["n"]).tobytes()).hexdigest()
+            == e["sha256"]
+            for e in self.header["sections"]
+        )
+
+    def board(self, n, i):
+        """
+        The i-th position for board size n, as a Board.
+        """
+        board = Board(n)
+        board._data = self.cells(n)[i].astype(int)
+        return board
+
+    def position(self, n, i):
+        """
+        The i-th position for board size n, as a Position snapshot (without
+        a move list; see referee.position).
+        """
+        return position_from_row(self.cells(n)[i], self.meta(n)[i])
+
+    def player(self, n, i, Player, colour=None):
+        """
+        A Player instance (of the given class) set up in the i-th position
+        for board size n, playing `colour` (default: the colour to move).
+        The Player class must have a setup() method (see referee.position).
+        """
+        position = self.position(n, i)
+        player = Player(colour or position.to_move, n)
+        player.setup(occupied_cells(position), position.nturns)
+        return player
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.corpus",
+        description="build or inspect a corpus of Cachex positions for "
+        "benchmarking players.",
+    )
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    build_parser = modes.add_parser("build", help="build a corpus.")
+    build_parser.add_argument(
+        "n",
+        type=parse_board_sizes,
+        help="size of the game board, or a range of sizes (e.g. 3-20)",
+    )
+    build_parser.add_argument("corpus", metavar="CORPUSFILE")
+    build_parser.add_argument("-f", "--fill", type=float, nargs="+",
+        default=[0.25, 0.5, 0.75],
+        help="fractions of the board to fill (default: %(default)s)")
+    build_parser.add_argument("-k", "--count", type=int, default=20,
+        help="number of positions per board size and fill level "
+        "(default: %(default)s)")
+    build_parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+
+    info_parser = modes.add_parser("info", help="describe a corpus.")
+    info_parser.add_argument("corpus", metavar="CORPUSFILE")
+    options = parser.parse_args(argv)
+
+    if options.mode == "build":
+        sections = build_corpus(
+            options.n, options.fill, options.count, options.seed
+        )
+        write_corpus(
+            options.corpus,
+            sections,
+            seed=options.seed,
+            fills=options.fill,
+            count=options.count,
+        )
+
+    corpus = Corpus(options.corpus)
+    info = {k: v for k, v in corpus.header.items() if k != "sections"}
+    print(f"{options.corpus}: " + ", ".join(f"{k}={v}" for k, v in info.items()))
+    for entry in corpus.header["sections"]:
+        meta = corpus.meta(entry["n"])
+        fills = ", ".join(f"{fill:g}" for fill in entry["fills"]) or "none"
+        turns = meta["nturns"]
+        if len(turns):
+            fills += f"; turns {turns.min()}-{turns.max()}"
+        print(f"n={entry['n']}: {len(meta)} positions (fills: {fills})")
+    if not corpus.verify():
+        print("checksum mismatch: the corpus file is corrupt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Play a batch of games across many machines: a coordinator hands out game
+specifications to workers over TCP and collects their (compact) results.
+
+Workers play each game with the same code as referee.batch (so results
+are identical to a single-process run with the same options), and may
+disconnect or crash at any time: their unfinished games are handed out
+again. The coordinator appends each finished game to a checkpoint file,
+so that a restarted run resumes without replaying finished games.
+
+Usage:
+    python -m referee.distributed coordinator [options] n red blue
+    python -m referee.distributed worker [-w WORKERS] [host:]port
+(run with --help for details)
+
+Messages are JSON objects, one per line. On connecting, a worker receives
+{"type": "config", ...} with the player packages and resource limits, then
+sends {"type": "ready"}. The coordinator replies with {"type": "game",
+"id": ..., "spec": ...} and the worker replies with {"type": "result",
+"id": ..., "result": ...}, and so on, until the coordinator sends
+{"type": "done"}.
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+import collections
+import multiprocessing
+
+from referee.log import config, comment
+from referee.batch import GameSpec, make_specs, run_game, _init_worker
+from referee.batch import compact_result, describe_result, report_results
+from referee.batch import write_results, get_options as get_batch_options
+from referee.openings import read_suite
+
+DEFAULT_PORT = 7470
+
+# How long (seconds) a worker may hold a game before it is handed out again
+# (in case the worker is stuck rather than disconnected)
+LEASE_DEFAULT = 600
+
+# How long (seconds) a worker keeps trying to reach the coordinator
+CONNECT_TIMEOUT = 30
+
+
+class Coordinator:
+    """
+    Thread-safe bookkeeping of which games are pending, leased to a worker,
+    or finished.
+    """
+
+    def __init__(self, specs, settings, checkpoint=None, lease=LEASE_DEFAULT):
+        self.specs = specs
+        self.settings = settings
+        self.lease = lease
+        self.results = {}
+        self.leases = {}  # game id -> (worker, deadline)
+        self._checkpoint = checkpoint
+        self._cond = threading.Condition()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.results = _read_checkpoint(checkpoint, specs)
+        self.pending = collections.deque(
+            i for i in range(len(specs)) if i not in self.results
+        )
+
+    def finished(self):
+        with self._cond:
+            return len(self.results) == len(self.specs)
+
+    def next_game(self, worker):
+        """
+        Lease a game to a worker, waiting while all remaining games are
+        leased to other workers. Returns (id, spec), or None when all games
+        are finished.
+        """
+        with self._cond:
+            while True:
+                self._expire_leases()
+                if self.pending:
+                    game_id = self.pending.popleft()
+                    deadline = time.monotonic() + self.lease
+                    self.leases[game_id] = (worker, deadline)
+                    return game_id, self.specs[game_id]
+                if len(self.results) == len(self.specs):
+                    return None
+                self._cond.wait(timeout=1)
+
+    def complete(self, game_id, result):
+        """
+        Record a finished game (ignoring duplicates from expired leases).
+        """
+        with self._cond:
+            self.leases.pop(game_id, None)
+            if game_id in self.results:
+                return
+            if game_id in self.pending:
+                self.pending.remove(game_id)
+            self.results[game_id] = result
+            if self._checkpoint is not None:
+                with open(self._checkpoint, "a") as checkpoint_file:
+                    line = json.dumps({"id": game_id, **result})
+                    checkpoint_file.write(line + "\n")
+                    checkpoint_file.flush()
+                    os.fsync(checkpoint_file.fileno())
+            comment(f"[{len(self.results)}/{len(self.specs)}] "
+                f"{describe_result(result)}")
+            self._cond.notify_all()
+
+    def release(self, worker):
+        """
+        Hand out a (disconnected) worker's unfinished games again.
+        """
+        with self._cond:
+            for game_id, (holder, _) in list(self.leases.items()):
+                if holder == worker:
+                    del self.leases[game_id]
+                    self.pending.appendleft(game_id)
+            self._cond.notify_all()
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        for game_id, (_, deadline) in list(self.leases.items()):
+            if deadline < now:
+                comment(f"game {game_id} timed out; handing it out again")
+                del self.leases[game_id]
+                self.pending.append(game_id)
+
+
+def _read_checkpoint(filename, specs):
+    """
+    Read finished games from a checkpoint file, ignoring any that do not
+    match this run's specs (and any partially-written last line).
+    """
+    results = {}
+    with open(filename) as checkpoint_file:
+        for line in checkpoint_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            game_id = entry.pop("id")
+            if game_id < len(specs) and _same_spec(entry, specs[game_id]):
+                results[game_id] = entry
+    # terminate a partially-written last line before we append to it
+    with open(filename, "rb+") as checkpoint_file:
+        if checkpoint_file.seek(0, os.SEEK_END):
+            checkpoint_file.seek(-1, os.SEEK_END)
+            if checkpoint_file.read(1) != b"\n":
+                checkpoint_file.write(b"\n")
+    return results
+
+
+def _same_spec(result, spec):
+    # (compare via JSON, since tuples in the spec come back as lists)
+    return json.dumps(result["spec"]) == json.dumps(spec._asdict())
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """
+    Serve one worker connection.
+    """
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = self.client_address
+        comment(f"worker {worker[0]}:{worker[1]} connected")
+        try:
+            _send(self.wfile, {"type": "config", **coordinator.settings})
+            for line in self.rfile:
+                message = json.loads(line)
+                if message["type"] == "result":
+                    coordinator.complete(message["id"], message["result"])
+                game = coordinator.next_game(worker)
+                if game is None:
+                    _send(self.wfile, {"type": "done"})
+                    break
+                game_id, spec = game
+                _send(
+                    self.wfile,
+                    {"type": "game", "id": game_id, "spec": spec._asdict()},
+                )
+        except (ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            coordinator.release(worker)
+            comment(f"worker {worker[0]}:{worker[1]} disconnected")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def run_coordinator(coordinator, port=DEFAULT_PORT, host=""):
+    """
+    Serve games to workers until all games are finished. Returns the list
+    of results, in the order of the coordinator's specs.
+    """
+    with _Server((host, port), _WorkerHandler) as server:
+        server.coordinator = coordinator
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        comment(f"coordinator listening on port {server.server_address[1]}")
+        while not coordinator.finished():
+            time.sleep(0.1)
+        # give connected workers a moment to receive their "done" message
+        time.sleep(0.5)
+        server.shutdown()
+    return [coordinator.results[i] for i in range(len(coordinator.specs))]
+
+
+def run_worker(address):
+    """
+    Connect to a coordinator and play the games it hands out until it says
+    we are done (or goes away).
+    """
+    sock = _connect(address)
+    with sock, sock.makefile("rb") as rfile, sock.makefile("wb") as wfile:
+        settings = json.loads(rfile.readline())
+        _init_worker(
+            [tuple(loc) for loc in settings["player_locs"]],
+            settings["time_limit"],
+            settings["space_limit"],
+            False,
+        )
+        _send(wfile, {"type": "ready"})
+        for line in rfile:
+            message = json.loads(line)
+            if message["type"] != "game":
+                break
+            spec = message["spec"]
+            spec["red"], spec["blue"] = tuple(spec["red"]), tuple(spec["blue"])
+            spec["opening"] = tuple(map(tuple, spec["opening"]))
+            result = run_game(GameSpec(**spec))
+            _send(
+                wfile,
+                {
+                    "type": "result",
+                    "id": message["id"],
+                    "result": compact_result(result),
+                },
+            )
+
+
+def _connect(address):
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            return socket.create_connection(address)
+        except ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
+
+
+def _send(wfile, message):
+    wfile.write(json.dumps(message).encode() + b"\n")
+    wfile.flush()
+
+
+def _parse_address(arg):
+    host, _, port = arg.rpartition(":")
+    return host or "localhost", int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.distributed",
+        description="play a batch of Cachex games across many machines.",
+    )
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    coordinator_parser = modes.add_parser(
+        "coordinator",
+        help="hand out games to workers and collect the results "
+        "(takes the same options as referee.batch, except -w, -m and -j).",
+        add_help=False,
+    )
+    coordinator_parser.add_argument("-p", "--port", type=int,
+        default=DEFAULT_PORT)
+    coordinator_parser.add_argument("-k", "--checkpoint",
+        metavar="CHECKPOINTFILE",
+        help="append finished games to CHECKPOINTFILE, and skip games "
+        "already in it.")
+    coordinator_parser.add_argument("--lease", type=float,
+        default=LEASE_DEFAULT,
+        help="seconds before a game held by a worker is handed out again.")
+
+    worker_parser = modes.add_parser("worker", help="play games.")
+    worker_parser.add_argument("address", type=_parse_address,
+        help="[host:]port of the coordinator")
+    worker_parser.add_argument("-w", "--workers", type=int, default=1,
+        help="number of worker processes to run on this machine.")
+
+    options, rest = parser.parse_known_args(argv)
+    config(level=1)
+
+    if options.mode == "worker":
+        if rest:
+            parser.error(f"unrecognized arguments: {' '.join(rest)}")
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(options.address,))
+            for _ in range(options.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+
+    batch = get_batch_options(rest)
+    player_locs = (batch.red_loc, batch.blue_loc)
+    openings = None
+    if batch.openings is not None:
+        openings = read_suite(batch.openings)
+    specs = make_specs(batch.n, player_locs, batch.games, batch.seed,
+        batch.swap, openings)
+    settings = {
+        "player_locs": player_locs,
+        "time_limit": batch.time,
+        "space_limit": batch.space,
+    }
+    coordinator = Coordinator(specs, settings, options.checkpoint,
+        options.lease)
+    if coordinator.results:
+        comment(f"resuming: {len(coordinator.results)} of {len(specs)} "
+            "games already finished")
+    results = run_coordinator(coordinator, options.port)
+    if batch.results is not None:
+        write_results(batch.results, results)
+    report_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,9 @@ def play(
     log_filename=None,
     log_file=None,
     out_function=comment,
+    opening=(),
+    position=None,
+    update_hooks=(),
 ):
     """
     Coordinate a game, return a string describing the result.
@@ -55,6 +58,15 @@ def play(
     * log_filename   -- If not None, log all game actions to this path.
     * out_function   -- Use this function (instead of default 'comment')
                         for all output messages.
+    * opening        -- A sequence of actions to play (alternately for each
+                        player, starting with red) before asking the
+                        players for any actions.
+    * position       -- If not None, a position snapshot (see
+                        referee.position) to start the game from, instead
+                        of the empty board. Each player is set up in this
+                        position after initialisation.
+    * update_hooks   -- Functions to call with each valid action before it
+                        is applied (see Game).
     """
     # Configure behaviour of this function depending on parameters:
     if delay > 0:
@@ -94,20 +106,42 @@ def play(
 
     # Set up a new game and initialise the players (constructing the
     # Player classes including running their .__init__() methods).
-    game = Game(n, log_filename=log_filename, log_file=log_file)
+    game = Game(
+        n,
+        log_filename=log_filename,
+        log_file=log_file,
+        position=position,
+        update_hooks=update_hooks,
+    )
     comment("initialising players", depth=-1)
     for player, colour in zip(players, COLOURS):
         # NOTE: `player` here is actually a player wrapper. Your program
         # should still implement a method called `__init__()`, not one
         # called `init()`:
         player.init(colour, n)
+        if position is not None:
+            player.setup(position)
 
     # Display the initial state of the game.
     comment("game start!", depth=-1)
     display_state(game)
 
+    # Play out the opening (if any) as if the players had chosen it, up to
+    # the end of the game if the opening ends it
+    turn = game.nturns + 1
+    for action in opening:
+        if game.over():
+            break
+        comment(f"Turn {turn} (opening)", depth=-1)
+        colour = COLOURS[(turn - 1) % 2]
+        sanitised_action = game.update(colour, tuple(action))
+        for player in players:
+            player.turn(colour, sanitised_action)
+        turn += 1
+    if opening:
+        display_state(game)
+
     # Repeat the following until the game ends
-    turn = 1
     while not game.over():
         comment(f"Turn {turn}", depth=-1)
         curr_player = players[(turn - 1) % 2]
@@ -168,20 +202,41 @@ class Game:
     """
     Represent the evolving state of a game. Main useful methods
     are __init__, update, over, end, and __str__.
+
+    Each of `update_hooks` is called as hook(game, player, action) with
+    every valid action submitted to update, before the action is applied
+    (so the hook sees the position the action was chosen in).
     """
 
-    def __init__(self, n, log_filename=None, log_file=None):
+    def __init__(
+        self,
+        n,
+        log_filename=None,
+        log_file=None,
+        position=None,
+        update_hooks=(),
+    ):
         # Initialise game board
         self.board = Board(n)
 
         # Also keep track of some other state variables for win/draw
         # detection (number of turns, state history)
         self.nturns = 0
+        self.allow_steal = True
+        if position is not None:
+            # Start from a position snapshot (see referee.position) instead
+            # of the empty board
+            for r, row in enumerate(position.cells):
+                for q, symbol in enumerate(row):
+                    self.board[(r, q)] = _SYMBOL_TOKENS[symbol]
+            self.nturns = position.nturns
+            self.allow_steal = position.steal
         self.last_captures = []
         self.last_coord = (-1, -1)
         self.history = collections.Counter({self.board.digest(): 1})
         self.result = None
         self.result_cluster = set()
+        self.update_hooks = list(update_hooks)
 
         if log_file is not None:
             self.logger = logging.getLogger(name=log_filename)
@@ -225,6 +280,7 @@ class Game:
         # Validate/apply action based on type
         if atype == _ACTION_STEAL:
             self._validate_steal(action)
+            self._call_update_hooks(player, action)
 
             # Apply STEAL action
             self.board.swap()
@@ -232,6 +288,7 @@ class Game:
 
         elif atype == _ACTION_PLACE:
             self._validate_place(action)
+            self._call_update_hooks(player, action)
 
             # Apply PLACE action
             coord = tuple(aargs)
@@ -251,12 +308,19 @@ class Game:
 
         return (atype, *aargs) # action is sanitised at this point
 
+    def _call_update_hooks(self, player, action):
+        """
+        Pass a (valid, not yet applied) action to each update hook.
+        """
+        for hook in self.update_hooks:
+            hook(self, player, action)
+
     def _validate_steal(self, action):
         """
         Throw exception if given STEAL action is not allowed
         """
         # STEAL action is only allowed for blue's first move
-        if self.nturns != 1:
+        if self.nturns != 1 or not self.allow_steal:
             self._illegal_action(action,
                 "The STEAL action is not currently permitted. This "
                 "action may only be played by the blue player on their "
@@ -379,6 +443,9 @@ _CAPTURE_SYM = 'X'
 _POINT_TO = lambda s: f">{s}<"
 _STAR_TO = lambda s: f"*{s}*"
 
+# Board cell symbols (as used in position snapshots)
+_SYMBOL_TOKENS = {_RED_SYM: "red", _BLUE_SYM: "blue", ".": None}
+
 def _RENDER(
     game,
     message="",
@@ -0,0 +1,244 @@
+"""
+Rank many Player classes with far fewer games than a full round-robin.
+
+Games are played in rounds. Each round pairs up the players adaptively
+(Swiss-style): the pairs whose result we are least sure of (players with
+close ratings and wide confidence intervals) are chosen first. Each pairing
+plays two games with the colours swapped. After each round, Bradley-Terry
+ratings (on the Elo scale) and their confidence intervals are refitted to
+all results so far, and play stops once the ranking is stable: every two
+adjacent players' confidence intervals are separated, or the ranking has
+not changed for a number of rounds.
+
+Usage: python -m referee.ladder [options] n player [player ...]
+(run `python -m referee.ladder --help` for details)
+"""
+
+import math
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from referee.log import config, comment
+from referee.batch import GameSpec, GamePool, _spec_name
+from referee.sprt import score_for
+from referee.options import parse_package_spec, parse_board_sizes
+
+# Strength of the prior: each player is treated as having drawn this many
+# games against an average (0 Elo) player, which keeps ratings finite for
+# players who have won or lost every game so far
+PRIOR_GAMES = 1
+
+_ELO_PER_NAT = 400 / math.log(10)
+
+
+class BradleyTerry:
+    """
+    Bradley-Terry model of the results between k players. Draws count as
+    half a win for each player.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.points = np.zeros((k, k))  # points[i, j]: i's points against j
+
+    def add(self, i, j, score):
+        """
+        Record a game between i and j in which i scored `score`.
+        """
+        self.points[i, j] += score
+        self.points[j, i] += 1 - score
+
+    def games(self):
+        return self.points + self.points.T
+
+    def fit(self, iterations=100):
+        """
+        Return the players' ratings (Elo scale, mean 0) and their covariance
+        matrix, fitted by minorization-maximization.
+        """
+        games = self.games()
+        wins = self.points.sum(axis=1) + PRIOR_GAMES / 2
+        gamma = np.ones(self.k)
+        for _ in range(iterations):
+            pair_sums = gamma[:, None] + gamma[None, :]
+            denom = (games / pair_sums).sum(axis=1)
+            denom += PRIOR_GAMES / (gamma + 1)
+            gamma = wins / denom
+            gamma /= np.exp(np.log(gamma).mean())
+
+        # covariance from the inverse of the Fisher information in the
+        # log-strength parameters
+        p = gamma[:, None] / (gamma[:, None] + gamma[None, :])
+        info = -games * p * p.T
+        np.fill_diagonal(info, 0)
+        np.fill_diagonal(
+            info,
+            -info.sum(axis=1) + PRIOR_GAMES * gamma / (gamma + 1) ** 2,
+        )
+        # (only the differences between ratings matter, and the prior is all
+        # that pins down their mean, so centre the covariance on the mean)
+        centre = np.eye(self.k) - 1 / self.k
+        cov = centre @ np.linalg.inv(info) @ centre
+        return np.log(gamma) * _ELO_PER_NAT, cov * _ELO_PER_NAT ** 2
+
+
+def choose_pairings(ratings, cov, played):
+    """
+    Greedily choose disjoint pairs of players, most informative first:
+    those with the most uncertain expected result (close ratings, wide
+    intervals), preferring pairs that have played each other less.
+    """
+    k = len(ratings)
+    candidates = []
+    for i in range(k):
+        for j in range(i + 1, k):
+            p = 1 / (1 + 10 ** ((ratings[j] - ratings[i]) / 400))
+            spread = _diff_var(cov, i, j)
+            value = p * (1 - p) * spread / (1 + played[i, j])
+            candidates.append((-value, i, j))
+    pairings = []
+    paired = set()
+    for _, i, j in sorted(candidates):
+        if i not in paired and j not in paired:
+            pairings.append((i, j))
+            paired.update((i, j))
+    return pairings
+
+
+def _diff_var(cov, i, j):
+    return cov[i, i] + cov[j, j] - 2 * cov[i, j]
+
+
+def is_separated(ratings, cov, z):
+    """
+    True iff the rating difference between every two players adjacent in
+    the ranking is significant (more than z standard errors).
+    """
+    order = np.argsort(-ratings)
+    for a, b in zip(order, order[1:]):
+        gap = ratings[a] - ratings[b]
+        if gap <= z * math.sqrt(_diff_var(cov, a, b)):
+            return False
+    return True
+
+
+def run_ladder(pool, player_locs, sizes, max_rounds, patience, z, seed=0):
+    """
+    Play rounds of games until the ranking is stable (or max_rounds have
+    been played). Returns the ratings, their covariance, and the matrix of
+    games played between each pair of players.
+    """
+    model = BradleyTerry(len(player_locs))
+    ratings, cov = model.fit()
+    ranking, unchanged = None, 0
+    for round_num in range(max_rounds):
+        pairings = choose_pairings(ratings, cov, model.games())
+        n = sizes[round_num % len(sizes)]
+        specs = []
+        for num, (i, j) in enumerate(pairings):
+            game_seed = seed + round_num * len(pairings) + num
+            a, b = player_locs[i], player_locs[j]
+            specs.append(GameSpec(n, a, b, game_seed))
+            specs.append(GameSpec(n, b, a, game_seed))
+        for num, result in enumerate(pool.play(specs)):
+            i, j = pairings[num // 2]
+            score = score_for(result, player_locs[i])
+            # (count an error against nobody; it tells us nothing about
+            # the relative strength of the players)
+            if score is not None:
+                model.add(i, j, score)
+        ratings, cov = model.fit()
+
+        new_ranking = list(np.argsort(-ratings))
+        unchanged = unchanged + 1 if new_ranking == ranking else 0
+        ranking = new_ranking
+        comment(f"round {round_num + 1} (n={n}):", depth=-1)
+        _comment_table(player_locs, ratings, cov, model.games(), z)
+        if is_separated(ratings, cov, z):
+            comment("ranking is separated; stopping")
+            break
+        if unchanged >= patience:
+            comment(f"ranking unchanged for {patience} rounds; stopping")
+            break
+    return ratings, cov, model.games()
+
+
+def _comment_table(player_locs, ratings, cov, games, z):
+    errors = np.sqrt(np.diag(cov))
+    for rank, i in enumerate(np.argsort(-ratings), 1):
+        comment(
+            f"{rank:2d}. {ratings[i]:+7.1f} +/- {z * errors[i]:6.1f}  "
+            f"({int(games[i].sum()):4d} games)  {_spec_name(player_locs[i])}",
+            depth=1,
+        )
+
+
+def get_options(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.ladder",
+        description="rank many Cachex Player classes using adaptively "
+        "scheduled (Swiss-style) games.",
+    )
+    parser.add_argument(
+        "n",
+        type=parse_board_sizes,
+        help="size of the game board, or a range of sizes to cycle through "
+        "(e.g. 5-7)",
+    )
+    parser.add_argument(
+        "player_locs",
+        metavar="player",
+        nargs="+",
+        type=parse_package_spec,
+        help="location of a Player class (e.g. package name)",
+    )
+    parser.add_argument("--max-rounds", type=int, default=100,
+        help="give up after this many rounds (default: %(default)s)")
+    parser.add_argument("--patience", type=int, default=10,
+        help="stop once the ranking is unchanged for this many rounds "
+        "(default: %(default)s)")
+    parser.add_argument("-z", type=float, default=1.96,
+        help="width of the confidence intervals, in standard errors "
+        "(default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of worker processes, or 0 to play in this process "
+        "(default: number of CPUs)")
+    parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed for the first game (default: %(default)s)")
+    parser.add_argument("-t", "--time", metavar="time_limit", type=float,
+        default=0, help="limit on CPU time (float, seconds) for each player.")
+    parser.add_argument("-s", "--space", metavar="space_limit", type=float,
+        default=0, help="limit on memory space (float, MB) for each player.")
+    options = parser.parse_args(argv)
+    if len(options.player_locs) < 2:
+        parser.error("at least 2 players are needed")
+    return options
+
+
+def main(argv=None):
+    options = get_options(argv)
+    config(level=1)
+    with GamePool(
+        options.workers,
+        options.player_locs,
+        time_limit=options.time,
+        space_limit=options.space,
+    ) as pool:
+        ratings, cov, games = run_ladder(
+            pool,
+            options.player_locs,
+            options.n,
+            options.max_rounds,
+            options.patience,
+            options.z,
+            options.seed,
+        )
+    comment(f"final ranking ({int(games.sum()) // 2} games):", depth=-1)
+    _comment_table(options.player_locs, ratings, cov, games, options.z)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Provide compact, mergeable histograms for recording the latency of each
+call into a Player class (e.g. `action` and `turn`), so that the referee
+can report tail latency (p50, p90, p99, max) rather than just the most
+recent call and a running total.
+
+Durations are recorded into logarithmically-spaced buckets (8 buckets per
+doubling, so reported percentiles are within ~9% of the true value). Any
+number of histograms can be merged by adding bucket counts, which lets us
+combine results across the games of a batch.
+
+Run `python -m referee.latency STATSFILE [STATSFILE ...]` to print the
+merged latency summary of the per-game records appended to STATSFILE(s)
+by the referee's --stats option.
+"""
+
+import sys
+import json
+import math
+from collections import defaultdict
+
+# Bucket resolution: bucket i holds durations in
+# [_MIN_LATENCY * 2**(i/_SUBBUCKETS), _MIN_LATENCY * 2**((i+1)/_SUBBUCKETS))
+_MIN_LATENCY = 1e-6  # seconds
+_SUBBUCKETS = 8
+
+# Percentiles reported in summaries
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed histogram of durations (in seconds). Keeps exact count,
+    sum and max alongside the sparse bucket counts.
+    """
+
+    def __init__(self):
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed):
+        """
+        Record a single duration (in seconds).
+        """
+        self.buckets[_bucket_index(elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    def merge(self, other):
+        """
+        Add the contents of another histogram to this one (in place).
+        Returns self, for convenience.
+        """
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket containing the p-th percentile duration
+        (capped at the exact maximum), or 0 if the histogram is empty.
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "buckets": {str(i): c for i, c in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.count = data["count"]
+        hist.total = data["sum"]
+        hist.max = data["max"]
+        for index, count in data["buckets"].items():
+            hist.buckets[int(index)] = count
+        return hist
+
+
+def _bucket_index(elapsed):
+    if elapsed <= _MIN_LATENCY:
+        return 0
+    return int(math.log2(elapsed / _MIN_LATENCY) * _SUBBUCKETS)
+
+
+def _bucket_upper(index):
+    return _MIN_LATENCY * 2 ** ((index + 1) / _SUBBUCKETS)
+
+
+class LatencyRecorder:
+    """
+    Collection of latency histograms for one player, keyed by method name
+    (e.g. "action"), board size n, and game turn number. Histograms can be
+    aggregated over any of these keys with `select`.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+
+    def record(self, method, n, turn, elapsed):
+        key = (method, n, turn)
+        if key not in self.histograms:
+            self.histograms[key] = LatencyHistogram()
+        self.histograms[key].record(elapsed)
+
+    def merge(self, other):
+        """
+        Add the contents of another recorder to this one (in place).
+        Returns self, for convenience.
+        """
+        for key, hist in other.histograms.items():
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            self.histograms[key].merge(hist)
+        return self
+
+    def methods(self):
+        return sorted({method for method, _, _ in self.histograms})
+
+    def board_sizes(self):
+        return sorted({n for _, n, _ in self.histograms})
+
+    def select(self, method=None, n=None, turn=None):
+        """
+        Merge all histograms matching the given keys (None matches all).
+        """
+        merged = LatencyHistogram()
+        for (m, size, t), hist in self.histograms.items():
+            if method not in (None, m) or n not in (None, size):
+                continue
+            if turn not in (None, t):
+                continue
+            merged.merge(hist)
+        return merged
+
+    def by_turn(self, method, n=None):
+        """
+        Return a sorted list of (turn, histogram) pairs for a method.
+        """
+        turns = sorted({t for m, _, t in self.histograms if m == method})
+        return [(t, self.select(method, n, t)) for t in turns]
+
+    def to_dict(self):
+        return {
+            "histograms": [
+                {"method": m, "n": n, "turn": t, **hist.to_dict()}
+                for (m, n, t), hist in sorted(self.histograms.items())
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        recorder = cls()
+        for entry in data["histograms"]:
+            key = (entry["method"], entry["n"], entry["turn"])
+            recorder.histograms[key] = LatencyHistogram.from_dict(entry)
+        return recorder
+
+
+def format_summary(recorder, n=None):
+    """
+    Return a list of lines summarising per-method latency percentiles.
+    """
+    lines = []
+    for method in recorder.methods():
+        hist = recorder.select(method, n)
+        if not hist.count:
+            continue
+        pcts = "  ".join(
+            f"p{p}: {_ms(hist.percentile(p))}" for p in PERCENTILES
+        )
+        lines.append(
+            f"{method:>6}: {hist.count:4d} calls  {pcts}  "
+            f"max: {_ms(hist.max)}"
+        )
+    return lines
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:9.3f}ms"
+
+
+# # #
+# Reading per-game statistics records (as written by --stats)
+#
+
+
+def load_latency(paths):
+    """
+    Read per-game JSON records (one per line) from the given file paths and
+    merge their latency histograms by player package. Returns a dict from
+    package name to LatencyRecorder.
+    """
+    merged = {}
+    for path in paths:
+        with open(path) as stats_file:
+            for line in stats_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                for player in record["players"]:
+                    recorder = LatencyRecorder.from_dict(player["latency"])
+                    package = player["package"]
+                    if package not in merged:
+                        merged[package] = LatencyRecorder()
+                    merged[package].merge(recorder)
+    return merged
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        sys.exit("usage: python -m referee.latency STATSFILE [STATSFILE ...]")
+    for package, recorder in sorted(load_latency(paths).items()):
+        print(f"{package}:")
+        for n in recorder.board_sizes():
+            print(f"  n = {n}:")
+            for line in format_summary(recorder, n):
+                print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ formatting accross multiple parts of a program.
 """
 
 import sys
+import contextlib
 
 
 # Save the default print function
@@ -118,6 +119,21 @@ def config(**kwargs):
     _DEFAULT_STARLOG = StarLog(**kwargs)
 
 
+@contextlib.contextmanager
+def quiet():
+    """
+    Temporarily silence all but level-0 messages from the default logger
+    (e.g. while playing a game in the background).
+    """
+    global _DEFAULT_STARLOG
+    saved = _DEFAULT_STARLOG
+    _DEFAULT_STARLOG = StarLog(level=0, file=saved.kwargs["file"])
+    try:
+        yield
+    finally:
+        _DEFAULT_STARLOG = saved
+
+
 def log(*args, **kwargs):
     """
     See StarLog.log.
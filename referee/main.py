@@ -3,11 +3,15 @@ Driver program to instantiate two Player classes and begin a game
 between them.
 """
 
+import json
+
 from referee.log import config, print, comment, _print
 from referee.game import play, IllegalActionException
-from referee.player import PlayerWrapper
+from referee.player import PlayerWrapper, game_stats
 from referee.player import ResourceLimitException, set_space_line
 from referee.options import get_options
+from referee.openings import load_opening
+from referee.position import load_position
 
 
 def main():
@@ -22,6 +26,15 @@ def main():
     comment("(any other lines of output must be from your Player class).")
     comment()
 
+    # Load the opening or position to start from, if any (a file that can't
+    # be read, or that doesn't fit the board size, is a mistake in the
+    # options: print a clean error message rather than a trace)
+    try:
+        opening, position = load_start(options)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}")
+        return
+
     try:
         # Import player classes
         p1 = PlayerWrapper(
@@ -29,12 +42,14 @@ def main():
             options.player1_loc,
             time_limit=options.time,
             space_limit=options.space,
+            memory_profile=options.memory_profile,
         )
         p2 = PlayerWrapper(
             "player 2",
             options.player2_loc,
             time_limit=options.time,
             space_limit=options.space,
+            memory_profile=options.memory_profile,
         )
 
         # We'll start measuring space usage from now, after all
@@ -51,10 +66,13 @@ def main():
             use_colour=options.use_colour,
             use_unicode=options.use_unicode,
             log_filename=options.logfile,
+            opening=opening,
+            position=position,
         )
         # Display the final result of the game to the user.
         comment("game over!", depth=-1)
         print(result)
+        report_stats([p1, p2], options.n, result, options.stats)
 
     # In case the game ends in an abnormal way, print a clean error
     # message for the user (rather than a trace).
@@ -65,9 +83,51 @@ def main():
         comment("game error!", depth=-1)
         print("error: invalid action!")
         comment(e)
+        report_stats([p1, p2], options.n, "error: " + str(e), options.stats)
     except ResourceLimitException as e:
         comment("game error!", depth=-1)
         print("error: resource limit exceeded!")
         comment(e)
+        report_stats([p1, p2], options.n, "error: " + str(e), options.stats)
     # If it's another kind of error then it might be coming from the player
     # itself? Then, a traceback will be more helpful. Don't handle this.
+
+
+def load_start(options):
+    """
+    Load the opening (a sequence of actions, empty if none) and the position
+    snapshot (None if none) given by the options to start the game from.
+    """
+    opening = ()
+    if options.opening is not None:
+        opening = load_opening(options.opening, options.n)
+    position = None
+    if options.position is not None:
+        position = load_position(options.position)
+        if position.n != options.n:
+            raise ValueError(
+                f"position is for board size {position.n}, not {options.n}"
+            )
+    return opening, position
+
+
+def report_stats(players, n, result, stats_filename=None):
+    """
+    Display each player's per-call latency summary (and search statistics
+    and allocation summaries, where available), and (if stats_filename
+    is given) append a JSON record of the game's statistics to that file.
+    """
+    comment("latency summary:", depth=-1)
+    for player in players:
+        comment(player.name, depth=1)
+        for line in player.latency_summary():
+            comment(line, depth=2)
+        for line in player.search_summary():
+            comment(line, depth=2)
+        for line in player.memory_summary():
+            comment(line, depth=2)
+
+    if stats_filename is not None:
+        record = game_stats(players, n, result)
+        with open(stats_filename, "a") as stats_file:
+            stats_file.write(json.dumps(record) + "\n")
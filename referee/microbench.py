@@ -0,0 +1,247 @@
+"""
+Micro-benchmarks for the referee's rules engine (referee.board and
+referee.game), which is a fixed cost under every game played.
+
+Each benchmark times one operation on seeded synthetic positions for a
+range of board sizes, and reports operations per second (the best of a few
+timing runs, each at least ~0.2 seconds long). Where an operation changes
+the board, the time includes cheaply undoing the change, so that every
+repetition starts from the same position.
+
+Usage: python -m referee.microbench [options]
+(run `python -m referee.microbench --help` for details)
+"""
+
+import json
+import random
+import timeit
+import argparse
+import itertools
+
+from referee.board import Board, _CAPTURE_PATTERNS, _ADD
+from referee.game import Game, _MAX_TURNS
+from referee.position import random_position
+
+DEFAULT_SIZES = (3, 5, 8, 11, 15, 20, 25, 30)
+
+# Density of tokens in synthetic positions
+_DENSITY = 0.5
+
+
+def random_board(n, rng, density=_DENSITY):
+    """
+    A board with each cell independently empty, red or blue (not
+    necessarily reachable in a game).
+    """
+    board = Board(n)
+    for r in range(n):
+        for q in range(n):
+            if rng.random() < density:
+                board[(r, q)] = rng.choice(("red", "blue"))
+    return board
+
+
+def _place_no_capture(n, rng):
+    board = random_board(n, rng)
+    moves = []
+    for r in range(n):
+        for q in range(n):
+            token = rng.choice(("red", "blue"))
+            coord = (r, q)
+            if not board.is_occupied(coord):
+                if not _captures(board, token, coord):
+                    moves.append((token, coord))
+    moves = itertools.cycle(moves)
+
+    def place():
+        token, coord = next(moves)
+        board.place(token, coord)
+        board[coord] = None
+    return place, 1
+
+
+def _captures(board, token, coord):
+    # (whether placing token at coord would capture, without changing board)
+    copy = Board(board.n)
+    copy._data = board._data.copy()
+    return bool(copy.place(token, coord))
+
+
+def _place_capture(n, rng):
+    # set up diamonds (red, blue, blue, empty) which placing red captures
+    sites = []
+    while len(sites) < 16:
+        board = random_board(n, rng, density=_DENSITY / 2)
+        coord = (rng.randrange(n), rng.randrange(n))
+        pattern = rng.choice(_CAPTURE_PATTERNS)
+        opposite, mid1, mid2 = [_ADD(coord, step) for step in pattern]
+        if not all(map(board.inside_bounds, (opposite, mid1, mid2))):
+            continue
+        board[coord], board[mid1], board[mid2] = None, "blue", "blue"
+        board[opposite] = "red"
+        copy = Board(n)
+        copy._data = board._data.copy()
+        if sorted(copy.place("red", coord)) == sorted((mid1, mid2)):
+            sites.append((board, coord, (mid1, mid2)))
+    sites = itertools.cycle(sites)
+
+    def place():
+        board, coord, mids = next(sites)
+        board.place("red", coord)
+        board[coord] = None
+        for mid in mids:
+            board[mid] = "blue"
+    return place, 1
+
+
+def _swap(n, rng):
+    board = random_board(n, rng)
+    # (swapping twice restores the board, so no undo is needed)
+    return board.swap, 1
+
+
+def _connected_coords(n, rng):
+    # one cluster snaking across the whole board: every other row, joined
+    # at alternate ends
+    board = Board(n)
+    for r in range(n):
+        if r % 2 == 0:
+            board._data[r, :] = 1
+        else:
+            board._data[r, 0 if r % 4 == 1 else n - 1] = 1
+    return (lambda: board.connected_coords((0, 0))), 1
+
+
+def _digest(n, rng):
+    board = random_board(n, rng)
+    return board.digest, 1
+
+
+def _random_game(n, rng):
+    # (large boards cannot be filled as densely within the turn limit)
+    fill = min(_DENSITY, _MAX_TURNS / 2 / (n * n))
+    position = None
+    while position is None:
+        position = random_position(n, fill, rng)
+    game = Game(n)
+    for action in position.moves:
+        game.update(game._turn_player(), action)
+    return game, position.moves
+
+
+def _validate_place(n, rng):
+    game, _ = _random_game(n, rng)
+    actions = itertools.cycle([
+        ("PLACE", r, q)
+        for r in range(n)
+        for q in range(n)
+        if not game.board.is_occupied((r, q))
+    ])
+    return (lambda: game._validate_place(next(actions))), 1
+
+
+def _update(n, rng):
+    # replay whole (random) games through Game.update
+    games = [_random_game(n, rng)[1] for _ in range(4)]
+    games_cycle = itertools.cycle(games)
+
+    def replay():
+        game = Game(n)
+        for action in next(games_cycle):
+            game.update(game._turn_player(), action)
+    return replay, sum(map(len, games)) / len(games)
+
+
+def _turn_detect_end(n, rng):
+    game, moves = _random_game(n, rng)
+    player = "blue" if game.nturns % 2 == 0 else "red"
+    action = next(a for a in reversed(moves) if game.board[a[1:]] == player)
+    nturns = game.nturns
+    digest = game.board.digest()
+
+    def detect():
+        game._turn_detect_end(player, action)
+        game.nturns = nturns
+        game.history[digest] -= 1
+        game.result = None
+    return detect, 1
+
+
+# Benchmark name -> function(n, rng) returning (operation, ops per call)
+BENCHMARKS = {
+    "Board.place": _place_no_capture,
+    "Board.place (capture)": _place_capture,
+    "Board.swap": _swap,
+    "Board.connected_coords": _connected_coords,
+    "Board.digest": _digest,
+    "Game._validate_place": _validate_place,
+    "Game.update": _update,
+    "Game._turn_detect_end": _turn_detect_end,
+}
+
+
+def ops_per_sec(operation, ops_per_call=1, repeats=3):
+    """
+    Best rate (operations per second) over a few timing runs.
+    """
+    timer = timeit.Timer(operation)
+    best = 0
+    for _ in range(repeats):
+        number, elapsed = timer.autorange()
+        best = max(best, number * ops_per_call / elapsed)
+    return best
+
+
+def run_microbenchmarks(names, sizes, seed=0, repeats=3):
+    """
+    Run the named benchmarks for each board size. Returns a list of
+    records with the benchmark name, n and ops/sec.
+    """
+    records = []
+    for name in names:
+        for n in sizes:
+            rng = random.Random(seed * 1000 + n)
+            operation, ops_per_call = BENCHMARKS[name](n, rng)
+            rate = ops_per_sec(operation, ops_per_call, repeats)
+            records.append({"benchmark": name, "n": n, "ops_per_sec": rate})
+            print(f"{name:>24s}  n={n:2d}: {rate:12.0f} ops/s", flush=True)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.microbench",
+        description="micro-benchmark the Cachex referee's board and game "
+        "rules.",
+    )
+    parser.add_argument("-n", "--sizes", type=int, nargs="+",
+        default=DEFAULT_SIZES,
+        help="board sizes (default: %(default)s)")
+    parser.add_argument("-b", "--benchmark", dest="names", nargs="+",
+        choices=list(BENCHMARKS), default=list(BENCHMARKS),
+        metavar="NAME",
+        help="benchmarks to run (default: all): " + ", ".join(BENCHMARKS))
+    parser.add_argument("-R", "--repeats", type=int, default=3,
+        help="timing runs per benchmark (default: %(default)s)")
+    parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+    parser.add_argument("-o", "--output", metavar="RESULTSFILE",
+        help="write the results (JSON) to RESULTSFILE")
+    options = parser.parse_args(argv)
+    if min(options.sizes) < 3:
+        parser.error("board sizes must be at least 3")
+
+    records = run_microbenchmarks(
+        options.names, options.sizes, options.seed, options.repeats
+    )
+    if options.output is not None:
+        with open(options.output, "w") as results_file:
+            json.dump(
+                {"seed": options.seed, "results": records},
+                results_file,
+                indent=1,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Generate suites of diverse, roughly balanced opening positions, so that
+games between (mostly deterministic) Player classes start from many
+different positions instead of differing only in their first move.
+
+An opening is a short sequence of PLACE actions played from the empty
+board. The generator plays random legal openings through `Game.update`
+(so captures are applied) and keeps those that are:
+* balanced: the two players' connection distances (the number of empty
+  cells each would still need to fill to connect their edges) differ by
+  at most a given tolerance; and
+* distinct: no two openings lead to the same position, up to the 180
+  degree rotation of the board (which maps each player's goal onto
+  itself).
+
+Suites are stored one opening per line, as JSON objects like
+{"n": 5, "moves": [["PLACE", 1, 2], ["PLACE", 3, 3], ...]}. Playing each
+opening twice, with the players' colours swapped, cancels out most of any
+remaining imbalance (see referee.batch --openings).
+
+Usage: python -m referee.openings [options] n SUITEFILE
+(run `python -m referee.openings --help` for details)
+"""
+
+import json
+import random
+import argparse
+import collections
+
+from referee.game import Game, COLOURS, _PLAYER_AXIS
+from referee.options import parse_board_sizes
+
+# Give up on finding more openings after this many candidates per opening
+_MAX_ATTEMPTS = 1000
+
+
+def connection_distance(board, colour):
+    """
+    Number of empty cells `colour` would need to fill to connect their two
+    edges (0-1 BFS: own tokens cost 0, empty cells 1, opponent tokens are
+    blocked), or None if the opponent has already cut them off.
+    """
+    n = board.n
+    axis = _PLAYER_AXIS[colour]
+    cost = {None: 1, colour: 0}
+    dist = {}
+    queue = collections.deque()
+    for i in range(n):
+        coord = (0, i) if axis == 0 else (i, 0)
+        if board[coord] in cost:
+            dist[coord] = cost[board[coord]]
+            if cost[board[coord]]:
+                queue.append(coord)
+            else:
+                queue.appendleft(coord)
+    while queue:
+        coord = queue.popleft()
+        if coord[axis] == n - 1:
+            return dist[coord]
+        for neighbour in board._coord_neighbours(coord):
+            token = board[neighbour]
+            if token not in cost:
+                continue
+            new_dist = dist[coord] + cost[token]
+            if new_dist < dist.get(neighbour, n * n):
+                dist[neighbour] = new_dist
+                if cost[token]:
+                    queue.append(neighbour)
+                else:
+                    queue.appendleft(neighbour)
+    return None
+
+
+def imbalance(game):
+    """
+    How far the position favours red: blue's connection distance minus
+    red's (None if either player is already cut off).
+    """
+    red, blue = (connection_distance(game.board, c) for c in COLOURS)
+    if red is None or blue is None:
+        return None
+    return blue - red
+
+
+def canonical_digest(board):
+    """
+    Digest of a board which is the same for positions related by the 180
+    degree rotation of the board.
+    """
+    rotated = board._data[::-1, ::-1]
+    return min(board.digest(), rotated.tobytes())
+
+
+def random_opening(n, plies, rng):
+    """
+    Play `plies` random legal PLACE actions from the empty board. Returns
+    the actions and the resulting game (or None for the game if it ended).
+    """
+    game = Game(n)
+    moves = []
+    for _ in range(plies):
+        empty = [
+            (r, q)
+            for r in range(n)
+            for q in range(n)
+            if not game.board.is_occupied((r, q))
+            and not (game.nturns == 0 and r * 2 == q * 2 == n - 1)
+        ]
+        r, q = rng.choice(empty)
+        action = ("PLACE", r, q)
+        game.update(game._turn_player(), action)
+        moves.append(action)
+        if game.over():
+            return moves, None
+    return moves, game
+
+
+def generate_suite(n, count, plies, tolerance=1, seed=0):
+    """
+    Generate up to `count` distinct openings of `plies` moves each, whose
+    imbalance is at most `tolerance` either way. Returns a list of move
+    lists.
+    """
+    rng = random.Random(seed)
+    suite = []
+    seen = set()
+    for _ in range(count * _MAX_ATTEMPTS):
+        if len(suite) == count:
+            break
+        moves, game = random_opening(n, plies, rng)
+        if game is None:
+            continue
+        score = imbalance(game)
+        if score is None or abs(score) > tolerance:
+            continue
+        digest = canonical_digest(game.board)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        suite.append(moves)
+    return suite
+
+
+def write_suite(filename, n, suite, mode="a"):
+    with open(filename, mode) as suite_file:
+        for moves in suite:
+            suite_file.write(json.dumps({"n": n, "moves": moves}) + "\n")
+
+
+def read_suite(filename):
+    """
+    Read a suite file. Returns a dict from board size to a list of openings
+    (each a list of action tuples).
+    """
+    suite = collections.defaultdict(list)
+    with open(filename) as suite_file:
+        for line in suite_file:
+            if line.strip():
+                opening = json.loads(line)
+                moves = [tuple(action) for action in opening["moves"]]
+                suite[opening["n"]].append(moves)
+    return suite
+
+
+def load_opening(spec, n):
+    """
+    Load one opening for board size n given a specification of the form
+    SUITEFILE[:INDEX] (the INDEX-th opening for that size, default 0).
+    """
+    filename, _, index = spec.rpartition(":")
+    if not filename or not index.isdigit():
+        filename, index = spec, 0
+    openings = read_suite(filename)[n]
+    if not openings:
+        raise ValueError(f"no openings for n = {n} in {filename!r}")
+    if int(index) >= len(openings):
+        raise ValueError(
+            f"no opening {index} for n = {n} in {filename!r} "
+            f"(it has {len(openings)})"
+        )
+    return openings[int(index)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.openings",
+        description="generate a suite of diverse, roughly balanced Cachex "
+        "openings.",
+    )
+    parser.add_argument(
+        "n",
+        type=parse_board_sizes,
+        help="size of the game board, or a range of sizes (e.g. 3-6)",
+    )
+    parser.add_argument("suite", metavar="SUITEFILE",
+        help="file to append the openings to")
+    parser.add_argument("-k", "--count", type=int, default=50,
+        help="number of openings per board size (default: %(default)s)")
+    parser.add_argument("-p", "--plies", type=int, default=None,
+        help="number of moves in each opening (default: n // 2 rounded "
+        "up to an even number, at least 2)")
+    parser.add_argument("--tolerance", type=int, default=1,
+        help="largest allowed difference between the players' connection "
+        "distances (default: %(default)s)")
+    parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+    options = parser.parse_args(argv)
+
+    for n in options.n:
+        plies = options.plies or max(2, n // 2 + n // 2 % 2)
+        suite = generate_suite(
+            n, options.count, plies, options.tolerance, options.seed + n
+        )
+        write_suite(options.suite, n, suite)
+        print(f"n={n}: {len(suite)} openings of {plies} moves")
+
+
+if __name__ == "__main__":
+    main()
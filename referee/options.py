@@ -4,7 +4,9 @@ Provide a command-line argument parsing function using argparse
 
 -----------------------------------------------------------------------------
 usage: referee [-h] [-V] [-d [delay]] [-s [space_limit]] [-t [time_limit]]
-               [-D | -v [{0,1,2,3}]] [-l [LOGFILE]] [-c | -C] [-u | -a]
+               [-m] [-D | -v [{0,1,2,3}]] [-l [LOGFILE]] [-j [STATSFILE]]
+               [-O SUITEFILE[:INDEX]] [-P POSFILE[:INDEX]] [-c | -C]
+               [-u | -a]
                red blue n
 
 conduct a game of Cachex between 2 Player classes.
@@ -41,6 +43,9 @@ optional arguments:
                         limit on memory space (float, MB) for each player.
   -t [time_limit], --time [time_limit]
                         limit on CPU time (float, seconds) for each player.
+  -m, --memory-profile  record the allocation peak and top allocation sites
+                        of each player call using tracemalloc, and the peak
+                        resident set size (slows down the players).
   -D, --debug           switch to printing the debug board (with
                         more information) (equivalent to -v or -v3).
   -v [{0,1,2,3}], --verbosity [{0,1,2,3}]
@@ -53,6 +58,19 @@ optional arguments:
                         if you supply this flag the referee will create a
                         log of all game actions in a text file named LOGFILE
                         (default: game.log).
+  -j [STATSFILE], --stats [STATSFILE]
+                        if you supply this flag the referee will append a
+                        JSON record of each player's statistics for this
+                        game (e.g. per-call latency histograms) to a file
+                        named STATSFILE (default: stats.jsonl).
+  -O SUITEFILE[:INDEX], --opening SUITEFILE[:INDEX]
+                        start the game by playing the INDEX-th opening
+                        (default: 0) for this board size from an opening
+                        suite file (see referee.openings).
+  -P POSFILE[:INDEX], --position POSFILE[:INDEX]
+                        start the game from the INDEX-th position (default:
+                        0) in a position file (see referee.position),
+                        instead of the empty board.
   -c, --colour          force colour display using ANSI control sequences
                         (default behaviour is automatic based on system).
   -C, --colourless      force NO colour display (see -c).
@@ -100,6 +118,9 @@ VERBOSITY_NOVALUE = 3  # highest level, debug board
 LOGFILE_DEFAULT = None
 LOGFILE_NOVALUE = "game.log"
 
+STATSFILE_DEFAULT = None
+STATSFILE_NOVALUE = "stats.jsonl"
+
 PKG_SPEC_HELP = """
 The first argument is the size of the game board to play on (3 <= n <= 15).
 The next two arguments are 'package specifications'. These specify which
@@ -199,6 +220,14 @@ def get_options():
         const=TIME_LIMIT_NOVALUE,
         help="limit on CPU time (float, seconds) for each player.",
     )
+    optionals.add_argument(
+        "-m",
+        "--memory-profile",
+        action="store_true",
+        help="record the allocation peak and top allocation sites of each "
+        "player call using tracemalloc, and the peak resident set size "
+        "(slows down the players).",
+    )
 
     verbosity_group = optionals.add_mutually_exclusive_group()
     verbosity_group.add_argument(
@@ -234,6 +263,38 @@ def get_options():
         "all game actions in a text file named %(metavar)s "
         "(default: %(const)s).",
     )
+    optionals.add_argument(
+        "-j",
+        "--stats",
+        type=str,
+        nargs="?",
+        default=STATSFILE_DEFAULT,
+        const=STATSFILE_NOVALUE,
+        metavar="STATSFILE",
+        help="if you supply this flag the referee will append a JSON "
+        "record of each player's statistics for this game (e.g. per-call "
+        "latency histograms) to a file named %(metavar)s "
+        "(default: %(const)s).",
+    )
+    optionals.add_argument(
+        "-O",
+        "--opening",
+        type=str,
+        default=None,
+        metavar="SUITEFILE[:INDEX]",
+        help="start the game by playing the INDEX-th opening (default: 0) "
+        "for this board size from an opening suite file (see "
+        "referee.openings).",
+    )
+    optionals.add_argument(
+        "-P",
+        "--position",
+        type=str,
+        default=None,
+        metavar="POSFILE[:INDEX]",
+        help="start the game from the INDEX-th position (default: 0) in a "
+        "position file (see referee.position), instead of the empty board.",
+    )
 
     colour_group = optionals.add_mutually_exclusive_group()
     colour_group.add_argument(
@@ -297,19 +358,37 @@ def get_options():
 
 class PackageSpecAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
-        pkg_spec = values
-
-        # detect alternative class:
-        if ":" in pkg_spec:
-            pkg, cls = pkg_spec.split(":", maxsplit=1)
-        else:
-            pkg = pkg_spec
-            cls = "Player"
+        # save the result in the arguments namespace as a tuple
+        setattr(namespace, self.dest, parse_package_spec(values))
 
-        # try to convert path to module name
-        mod = pkg.strip("/\\").replace("/", ".").replace("\\", ".")
-        if mod.endswith(".py"):  # NOTE: Assumes submodule is not named `py`.
-            mod = mod[:-3]
 
-        # save the result in the arguments namespace as a tuple
-        setattr(namespace, self.dest, (mod, cls))
+def parse_package_spec(pkg_spec):
+    """
+    Convert a package specification (see PKG_SPEC_HELP) into a tuple of
+    (module name, class name).
+    """
+    # detect alternative class:
+    if ":" in pkg_spec:
+        pkg, cls = pkg_spec.split(":", maxsplit=1)
+    else:
+        pkg = pkg_spec
+        cls = "Player"
+
+    # try to convert path to module name
+    mod = pkg.strip("/\\").replace("/", ".").replace("\\", ".")
+    if mod.endswith(".py"):  # NOTE: Assumes submodule is not named `py`.
+        mod = mod[:-3]
+
+    return mod, cls
+
+
+def parse_board_sizes(arg):
+    """
+    Convert a board size or range of sizes (e.g. '5' or '3-6') into a list
+    of board sizes.
+    """
+    lo, _, hi = arg.partition("-")
+    sizes = range(int(lo), int(hi or lo) + 1)
+    if not sizes or min(sizes) < 3:
+        raise argparse.ArgumentTypeError(f"invalid board size(s): {arg!r}")
+    return list(sizes)
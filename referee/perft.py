@@ -0,0 +1,354 @@
+"""
+Check that alternative implementations of the capture rules ("engines")
+agree exactly with the referee's `Board`, and measure their speed:
+
+* perft: count the leaf positions and captured tokens of the full tree of
+  PLACE moves to a given depth from seed positions (like chess perft).
+  Every engine must produce the same counts.
+* fuzz: play random moves through the referee's board and another engine
+  side by side, comparing the captures of every move (and the whole board
+  at the end of each game), and report the first divergence.
+
+Both also report each engine's speed, in moves (placements) per second.
+
+Engines are either "board" (referee.board.Board) or the location of a
+Player class with a `.capture()` method (e.g. the bundled agents, as
+"other-agents/MinimaxAgent/player"), which is used as a rules engine by
+storing red's tokens in its `.hexTaken` list and blue's tokens in its
+`.opponentTaken` list.
+
+The trees and random games here only follow the capture rules: the game
+does not end when a player connects their edges, and there is no STEAL.
+
+Usage:
+    python -m referee.perft perft [options] n ENGINE [ENGINE ...]
+    python -m referee.perft fuzz [options] n ENGINE
+(run with --help for details)
+"""
+
+import time
+import random
+import argparse
+
+from referee.board import Board
+from referee.position import random_position, occupied_cells
+from referee.options import parse_package_spec, parse_board_sizes
+from referee.player import _load_player_class
+
+_OTHER = {"red": "blue", "blue": "red"}
+
+
+class BoardEngine:
+    """
+    The referee's Board (the reference implementation).
+    """
+
+    name = "board"
+
+    def __init__(self, n):
+        self.board = Board(n)
+
+    def load(self, cells):
+        """
+        Set up the position given by a dict from (r, q) to colour.
+        """
+        self.board = Board(self.board.n)
+        for coord, colour in cells.items():
+            self.board[coord] = colour
+
+    def place(self, colour, coord):
+        # (the board's captured coordinates are numpy ints)
+        return {(int(r), int(q)) for r, q in self.board.place(colour, coord)}
+
+    def undo(self, colour, coord, captured):
+        self.board[coord] = None
+        for capture in captured:
+            self.board[capture] = _OTHER[colour]
+
+    def cells(self):
+        n = self.board.n
+        return {
+            (r, q): self.board[(r, q)]
+            for r in range(n)
+            for q in range(n)
+            if self.board.is_occupied((r, q))
+        }
+
+
+class PlayerEngine:
+    """
+    A Player class's capture rules (its `.capture()` method).
+    """
+
+    def __init__(self, n, player_loc):
+        self.name = ":".join(player_loc)
+        self.player = _load_player_class(*player_loc)("red", n)
+        # (some players' capture methods take the token lists as arguments,
+        # others use the player's own lists)
+        self._explicit = self.player.capture.__code__.co_argcount > 3
+        self._tokens = {
+            "red": self.player.hexTaken,
+            "blue": self.player.opponentTaken,
+        }
+
+    def load(self, cells):
+        for colour, tokens in self._tokens.items():
+            tokens[:] = [c for c, token in cells.items() if token == colour]
+
+    def place(self, colour, coord):
+        self._tokens[colour].append(coord)
+        if self._explicit:
+            captured = self.player.capture(
+                coord, colour, self._tokens["red"], self._tokens["blue"]
+            )
+        else:
+            captured = self.player.capture(coord, colour)
+        captured = set(captured)
+        opponent = self._tokens[_OTHER[colour]]
+        for capture in captured:
+            opponent.remove(capture)
+        return captured
+
+    def undo(self, colour, coord, captured):
+        self._tokens[colour].remove(coord)
+        self._tokens[_OTHER[colour]].extend(captured)
+
+    def cells(self):
+        return {
+            coord: colour
+            for colour, tokens in self._tokens.items()
+            for coord in tokens
+        }
+
+
+def make_engine(spec, n):
+    if spec == "board":
+        return BoardEngine(n)
+    return PlayerEngine(n, parse_package_spec(spec))
+
+
+def perft(engine, empty, colour, depth):
+    """
+    Count the leaf positions of the tree of PLACE moves to the given depth,
+    the total number of tokens captured by all moves in it, and the number
+    of moves made, starting with `colour` to move (`empty` is the set of
+    empty cells, which is restored before returning). Returns (leaves,
+    captures, moves).
+    """
+    if depth == 0:
+        return 1, 0, 0
+    leaves = captures = moves = 0
+    for coord in sorted(empty):
+        captured = engine.place(colour, coord)
+        empty.remove(coord)
+        empty.update(captured)
+        sub_leaves, sub_captures, sub_moves = perft(
+            engine, empty, _OTHER[colour], depth - 1
+        )
+        leaves += sub_leaves
+        captures += sub_captures + len(captured)
+        moves += sub_moves + 1
+        empty.difference_update(captured)
+        empty.add(coord)
+        engine.undo(colour, coord, captured)
+    return leaves, captures, moves
+
+
+def seed_positions(n, count, fill, seed=0):
+    """
+    Random positions (reached by playing random moves through Game.update)
+    to start perft from.
+    """
+    rng = random.Random(seed * 1000 + n)
+    positions = []
+    while len(positions) < count:
+        position = random_position(n, fill, rng)
+        if position is not None:
+            positions.append(position)
+    return positions
+
+
+def run_perft(engine_specs, n, depth, positions):
+    """
+    Run perft with each engine from each position. Returns a dict from
+    engine name to a list of (leaves, captures) per position, and a dict
+    from engine name to moves per second.
+    """
+    counts, speeds = {}, {}
+    for spec in engine_specs:
+        engine = make_engine(spec, n)
+        results = []
+        moves = 0
+        start = time.perf_counter()
+        for position in positions:
+            cells = occupied_cells(position)
+            engine.load(cells)
+            empty = {(r, q) for r in range(n) for q in range(n)} - set(cells)
+            leaves, captures, tree_moves = perft(
+                engine, empty, position.to_move, depth
+            )
+            results.append((leaves, captures))
+            moves += tree_moves
+        elapsed = time.perf_counter() - start
+        counts[engine.name] = results
+        speeds[engine.name] = moves / elapsed if elapsed > 0 else 0.0
+    return counts, speeds
+
+
+def fuzz(engine, n, moves, rng):
+    """
+    Play `moves` random PLACE moves through the referee's board and the
+    given engine side by side (starting a new game whenever the board is
+    full, or after n * n * 2 moves). Returns (divergence, speeds):
+    divergence is None if the engines always agreed, or else a dict
+    describing the first move on which they differed; speeds is a dict
+    from engine name to moves per second.
+    """
+    reference = BoardEngine(n)
+    engines = (reference, engine)
+    elapsed = {e.name: 0.0 for e in engines}
+    played = 0
+    while played < moves:
+        for e in engines:
+            e.load({})
+        empty = [(r, q) for r in range(n) for q in range(n)]
+        history = []
+        colour = "red"
+        for _ in range(min(n * n * 2, moves - played)):
+            if not empty:
+                break
+            coord = empty.pop(rng.randrange(len(empty)))
+            captures = []
+            for e in engines:
+                start = time.perf_counter()
+                captures.append(e.place(colour, coord))
+                elapsed[e.name] += time.perf_counter() - start
+            played += 1
+            if captures[0] != captures[1]:
+                return {
+                    "n": n,
+                    "moves": history,
+                    "cells": _replay(n, history),
+                    "colour": colour,
+                    "coord": coord,
+                    "captures": dict(zip((e.name for e in engines), captures)),
+                }, _speeds(elapsed, played)
+            history.append((colour, coord))
+            empty.extend(captures[0])
+            colour = _OTHER[colour]
+        if reference.cells() != engine.cells():
+            return {
+                "n": n,
+                "moves": history,
+                "cells": reference.cells(),
+                "colour": None,
+                "coord": None,
+                "captures": {e.name: e.cells() for e in engines},
+            }, _speeds(elapsed, played)
+    return None, _speeds(elapsed, played)
+
+
+def _replay(n, history):
+    # (the position after the given moves, found with the reference board)
+    board = BoardEngine(n)
+    for colour, coord in history:
+        board.place(colour, coord)
+    return board.cells()
+
+
+def _speeds(elapsed, played):
+    return {name: played / t if t > 0 else 0.0 for name, t in elapsed.items()}
+
+
+def format_divergence(divergence):
+    """
+    Lines describing where two engines diverged.
+    """
+    n = divergence["n"]
+    symbols = {None: ".", "red": "r", "blue": "b"}
+    lines = [f"engines diverged on a {n}x{n} board after these moves:"]
+    lines.append("  " + " ".join(
+        f"{colour[0]}{coord}" for colour, coord in divergence["moves"]
+    ))
+    lines.append("position before the divergent move:")
+    for r in reversed(range(n)):
+        row = [symbols[divergence["cells"].get((r, q))] for q in range(n)]
+        lines.append("  " + " " * (n - 1 - r) + " ".join(row))
+    if divergence["coord"] is not None:
+        lines.append(f"move: {divergence['colour']} places at "
+            f"{divergence['coord']}")
+        what = "captured"
+    else:
+        what = "final tokens"
+    for name, captured in divergence["captures"].items():
+        lines.append(f"  {name} {what}: {sorted(captured)}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.perft",
+        description="check alternative Cachex capture-rule engines against "
+        "the referee's board, and measure their speed.",
+    )
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    perft_parser = modes.add_parser("perft",
+        help="count the move tree from seed positions with each engine.")
+    perft_parser.add_argument("n", type=int, help="size of the game board")
+    perft_parser.add_argument("engines", metavar="ENGINE", nargs="+",
+        help='"board" or the location of a Player class')
+    perft_parser.add_argument("-d", "--depth", type=int, default=2,
+        help="depth of the move tree (default: %(default)s)")
+    perft_parser.add_argument("-k", "--count", type=int, default=3,
+        help="number of seed positions (default: %(default)s)")
+    perft_parser.add_argument("-f", "--fill", type=float, default=0.5,
+        help="fill level of the seed positions (default: %(default)s)")
+    perft_parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+
+    fuzz_parser = modes.add_parser("fuzz",
+        help="play random moves through the board and another engine.")
+    fuzz_parser.add_argument("n", type=parse_board_sizes,
+        help="size of the game board, or a range of sizes (e.g. 3-9)")
+    fuzz_parser.add_argument("engine", metavar="ENGINE",
+        help='"board" or the location of a Player class')
+    fuzz_parser.add_argument("-m", "--moves", type=int, default=100000,
+        help="number of random moves per board size (default: %(default)s)")
+    fuzz_parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+    options = parser.parse_args(argv)
+
+    if options.mode == "perft":
+        positions = seed_positions(
+            options.n, options.count, options.fill, options.seed
+        )
+        counts, speeds = run_perft(
+            options.engines, options.n, options.depth, positions
+        )
+        reference = None
+        for name, results in counts.items():
+            print(f"{name}: {speeds[name]:.0f} moves/s")
+            for num, (leaves, captures) in enumerate(results):
+                print(f"  position {num}: {leaves} leaves, "
+                    f"{captures} tokens captured")
+            if reference is not None and results != reference:
+                print(f"  MISMATCH with {next(iter(counts))}")
+            reference = reference or results
+        return
+
+    for n in options.n:
+        engine = make_engine(options.engine, n)
+        rng = random.Random(options.seed * 1000 + n)
+        divergence, speeds = fuzz(engine, n, options.moves, rng)
+        rates = ", ".join(f"{k}: {v:.0f} moves/s" for k, v in speeds.items())
+        if divergence is not None:
+            for line in format_divergence(divergence):
+                print(line)
+            print(f"n={n}: diverged ({rates})")
+            break
+        print(f"n={n}: {options.moves} moves agree ({rates})")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,18 @@ being executed, etc.
 import gc
 import time
 import importlib
+import contextlib
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # (not available on windows)
+    resource = None
 
 from referee.log import comment, print
-from referee.game import NUM_PLAYERS
+from referee.game import NUM_PLAYERS, _PLAYER_TURN_ORDER
+from referee.position import occupied_cells
+from referee.latency import LatencyRecorder, format_summary
 
 
 class PlayerWrapper:
@@ -19,17 +28,44 @@ class PlayerWrapper:
     * `.init()` method constructs the Player instance (calling `.__init__()`)
     * `.action()` and `.update()` methods just delegate to the real Player's
         methods of the same name.
-    Each method enforces resource limits on the real Player's computation.
+    Each method enforces resource limits on the real Player's computation,
+    and records the duration of each call in a latency histogram.
+
+    Players may also opt in to reporting search statistics by defining a
+    `.search_stats()` method, returning a dict of counters describing the
+    search done since the previous call (see `SEARCH_COUNTERS`). It is
+    called after each `.action()`.
+
+    Players may likewise size their caches to the space limit by defining a
+    `.set_space_limit()` method, which is called (with the limit for each
+    player, in MB) just after the player is constructed, if there is a limit.
     """
 
-    def __init__(self, name, player_loc, time_limit=None, space_limit=None):
+    def __init__(
+        self,
+        name,
+        player_loc,
+        time_limit=None,
+        space_limit=None,
+        memory_profile=False,
+    ):
         self.name = name
+        self.player_loc = player_loc
 
         # create some context managers for resource limiting
         self.timer = _CountdownTimer(time_limit, self.name)
+        self.space_limit = space_limit
         if space_limit is not None:
             space_limit *= NUM_PLAYERS
         self.space = _MemoryWatcher(space_limit)
+        self.memory = _AllocationTracker(memory_profile)
+        self.latency = LatencyRecorder()
+        self.search = []
+        # (until .init() is called, e.g. if the other player's init fails)
+        self.colour = None
+        self.n = None
+        self.nturns = 0
+        self._search_clock = 0
 
         # import the Player class from given package
         player_pkg, player_cls = player_loc
@@ -41,33 +77,198 @@ class PlayerWrapper:
 
     def init(self, colour, n):
         self.colour = colour
+        self.n = n
+        self.nturns = 0
+        self._search_clock = 0
         self.name += f" ({colour})"
         player_cls = str(self.Player).strip("<class >")
         comment(f"initialising {self.colour} player as a {player_cls}")
-        with self.space, self.timer:
+        with self._measure("init", turn=0), self.memory, self.space, self.timer:
             # construct/initialise the player class
             self.player = self.Player(colour, n)
+            # (only for players that opt in by defining .set_space_limit())
+            set_space_limit = getattr(self.player, "set_space_limit", None)
+            if set_space_limit is not None and self.space_limit:
+                set_space_limit(self.space_limit)
         comment(self.timer.status(), depth=1)
         comment(self.space.status(), depth=1)
+        comment(self.memory.status(), depth=1)
+
+    def setup(self, position):
+        """
+        Synchronise the player with a position snapshot the game starts
+        from (see referee.position), with the player's `.setup()` method if
+        it has one, or else by replaying the position's moves through its
+        `.turn()` method.
+        """
+        setup = getattr(self.player, "setup", None)
+        if setup is None and position.moves is None:
+            raise ValueError(
+                f"{self.name}'s player has no setup() method, and the "
+                "position has no moves to replay"
+            )
+        comment(f"setting up {self.name} in the starting position...")
+        with self._measure("setup", turn=0), self.memory, self.space, self.timer:
+            if setup is not None:
+                setup(occupied_cells(position), position.nturns)
+            else:
+                for nturn, action in enumerate(position.moves):
+                    colour = _PLAYER_TURN_ORDER[nturn % 2]
+                    self.player.turn(colour, action)
+        self.nturns = position.nturns
+        comment(self.timer.status(), depth=1)
+        comment(self.space.status(), depth=1)
+        comment(self.memory.status(), depth=1)
 
     def action(self):
         comment(f"asking {self.name} for next action...")
-        with self.space, self.timer:
+        with self._measure("action"), self.memory, self.space, self.timer:
             # ask the real player
             action = self.player.action()
         comment(f"{self.name} returned action: {action!r}", depth=1)
         comment(self.timer.status(), depth=1)
         comment(self.space.status(), depth=1)
+        comment(self.memory.status(), depth=1)
+        self._collect_search_stats()
         # give back the result
         return action
 
     def turn(self, player, action):
         comment(f"updating {self.name} with actions...")
-        with self.space, self.timer:
+        with self._measure("turn"), self.memory, self.space, self.timer:
             # forward to the real player
             self.player.turn(player, action)
+        self.nturns += 1
         comment(self.timer.status(), depth=1)
         comment(self.space.status(), depth=1)
+        comment(self.memory.status(), depth=1)
+
+    @contextlib.contextmanager
+    def _measure(self, method, turn=None):
+        # record the timer's measurement even if the call fails or the
+        # time limit is exceeded (that is the call we most want to see)
+        if turn is None:
+            turn = self.nturns + 1
+        try:
+            yield
+        finally:
+            self.latency.record(method, self.n, turn, self.timer.elapsed)
+            self.memory.record(method, turn)
+
+    def _collect_search_stats(self):
+        # only for players that opt in by defining .search_stats()
+        search_stats = getattr(self.player, "search_stats", None)
+        if search_stats is None:
+            return
+        # attribute all CPU time since the last report to the search (the
+        # player may search in .turn() as well as in .action())
+        elapsed = self.timer.clock - self._search_clock
+        self._search_clock = self.timer.clock
+        record = _search_metrics(search_stats(), elapsed)
+        record["turn"] = self.nturns + 1
+        self.search.append(record)
+        comment(_format_search(record), depth=1)
+
+    def latency_summary(self):
+        """
+        Lines summarising this player's per-method latency percentiles.
+        """
+        return format_summary(self.latency)
+
+    def search_summary(self):
+        """
+        Lines summarising this player's search statistics over the game
+        (empty unless the player reports search statistics).
+        """
+        if not self.search:
+            return []
+        totals = {k: sum(r[k] for r in self.search) for k in SEARCH_COUNTERS}
+        totals["depth"] = max(r["depth"] for r in self.search)
+        elapsed = sum(r["time"] for r in self.search)
+        summary = _search_metrics(totals, elapsed)
+        # (the branching factor of the summed tree sizes is meaningless, so
+        # report the mean over searches instead)
+        searches = [r["ebf"] for r in self.search if r["nodes"]]
+        summary["ebf"] = sum(searches) / len(searches) if searches else 0.0
+        return [_format_search(summary, "total")]
+
+    def memory_summary(self):
+        """
+        Lines summarising this player's per-call allocation peaks and top
+        allocation sites (empty unless memory profiling is enabled).
+        """
+        return self.memory.summary()
+
+    def stats(self):
+        """
+        Machine-readable statistics about this player's game (for --stats).
+        """
+        package, cls = self.player_loc
+        return {
+            "name": self.name,
+            "package": f"{package}:{cls}",
+            "colour": self.colour,
+            "time": self.timer.clock,
+            "latency": self.latency.to_dict(),
+            "memory": self.memory.to_dict(),
+            "search": self.search or None,
+        }
+
+
+def game_stats(players, n, result):
+    """
+    Machine-readable record of a game's result and each player's statistics
+    (one line of a --stats file).
+    """
+    return {
+        "n": n,
+        "result": result,
+        "players": [player.stats() for player in players],
+    }
+
+
+# SEARCH STATISTICS
+
+# Counters players may report from .search_stats() (missing counters are
+# treated as 0; "depth" is the deepest search, in plies)
+SEARCH_COUNTERS = (
+    "nodes",
+    "leaves",
+    "cutoffs",
+    "first_move_cutoffs",
+    "tt_hits",
+    "eval_cache_hits",
+    "eval_cache_misses",
+    "depth",
+)
+
+
+def _search_metrics(counters, elapsed):
+    """
+    Combine reported search counters with the CPU time they took into a
+    record including the derived metrics: nodes per second, effective
+    branching factor, and the rate of cutoffs caused by the first move.
+    """
+    record = {key: counters.get(key, 0) for key in SEARCH_COUNTERS}
+    nodes, depth, cutoffs = record["nodes"], record["depth"], record["cutoffs"]
+    record["time"] = elapsed
+    record["nps"] = nodes / elapsed if elapsed > 0 else 0.0
+    record["ebf"] = nodes ** (1 / depth) if nodes and depth else 0.0
+    record["first_move_cutoff_rate"] = (
+        record["first_move_cutoffs"] / cutoffs if cutoffs else 0.0
+    )
+    return record
+
+
+def _format_search(record, label="search"):
+    return (
+        f"{label}: {record['nodes']:8d} nodes  {record['nps']:9.0f} nodes/s  "
+        f"depth {record['depth']:2d}  ebf {record['ebf']:6.2f}  "
+        f"cutoffs {record['cutoffs']} "
+        f"({record['first_move_cutoff_rate']:.0%} first move)  "
+        f"tt hits {record['tt_hits']}  "
+        f"eval cache hits {record['eval_cache_hits']}"
+    )
 
 
 def _load_player_class(package_name, class_name):
@@ -103,6 +304,7 @@ class _CountdownTimer:
         self.name = name
         self.limit = time_limit
         self.clock = 0
+        self.elapsed = 0
         self._status = ""
 
     def _set_status(self, status):
@@ -121,6 +323,7 @@ class _CountdownTimer:
     def __exit__(self, exc_type, exc_val, exc_tb):
         # accumulate elapsed time since __enter__
         elapsed = time.process_time() - self.start
+        self.elapsed = elapsed
         self.clock += elapsed
         self._set_status(
             f"time:  +{elapsed:6.3f}s  (just elapsed)  "
@@ -163,9 +366,18 @@ class _MemoryWatcher:
         Check up on the current and peak space usage of the process, printing
         stats and ensuring that peak usage is not exceeding limits
         """
+        global _WINDOW_PEAK_USAGE
         if _SPACE_ENABLED:
             curr_usage, peak_usage = _get_space_usage()
 
+            # VmPeak covers the whole life of the process. If it has not
+            # grown since set_space_line() (e.g. because an earlier game in
+            # the same process set it) then it says nothing about this game,
+            # so use the largest usage we have seen since then instead
+            _WINDOW_PEAK_USAGE = max(_WINDOW_PEAK_USAGE, curr_usage)
+            if peak_usage <= _PEAK_MEM_USAGE:
+                peak_usage = _WINDOW_PEAK_USAGE
+
             # adjust measurements to reflect usage of players and referee, not
             # the Python interpreter itself
             curr_usage -= _DEFAULT_MEM_USAGE
@@ -184,6 +396,125 @@ class _MemoryWatcher:
                     )
 
 
+class _AllocationTracker:
+    """
+    Context manager for measuring the memory allocated during a specific
+    section of code (much more precisely than _MemoryWatcher).
+
+    * uses tracemalloc to find the peak of Python allocations (including
+      numpy buffers) made during the section, relative to the start, and
+      the source lines responsible for the memory still held at the end.
+    * uses getrusage to find the resident set size high-water mark.
+    * tracing allocations slows down the traced code considerably, so this
+      is disabled unless `enabled` is True (the status is then empty).
+    """
+
+    def __init__(self, enabled=False, nsites=3):
+        self.enabled = enabled
+        self.nsites = nsites
+        self.calls = []
+        self._last = None
+        self._status = ""
+
+    def _set_status(self, status):
+        self._status = status
+
+    def status(self):
+        return self._status
+
+    def __enter__(self):
+        if self.enabled:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(_TRACE_FRAMES)
+            # clean up memory before taking the baseline
+            gc.collect()
+            self._before = _take_snapshot()
+            self._base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        return self  # unused
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.enabled:
+            return
+        curr, peak = tracemalloc.get_traced_memory()
+        diffs = _take_snapshot().compare_to(self._before, "lineno")
+        del self._before
+        sites = [
+            {"site": str(diff.traceback), "size": diff.size_diff}
+            for diff in diffs[: self.nsites]
+            if diff.size_diff > 0
+        ]
+        self._last = {
+            "peak": (peak - self._base) / _MB,
+            "retained": (curr - self._base) / _MB,
+            "rss_peak": _get_rss_peak(),
+            "sites": sites,
+        }
+        self._set_status(
+            f"alloc: {self._last['peak']:7.3f}MB (call peak)    "
+            f"{self._last['retained']:7.3f}MB (retained) "
+            f"{self._last['rss_peak']:7.3f}MB (rss peak) (shared)"
+        )
+
+    def record(self, method, turn):
+        """
+        Label and keep the measurement of the most recent section.
+        """
+        if self._last is not None:
+            self.calls.append({"method": method, "turn": turn, **self._last})
+            self._last = None
+
+    def summary(self):
+        lines = []
+        for method in sorted({call["method"] for call in self.calls}):
+            calls = [c for c in self.calls if c["method"] == method]
+            worst = max(calls, key=lambda c: c["peak"])
+            lines.append(
+                f"{method:>6}: {worst['peak']:7.3f}MB max call peak "
+                f"(turn {worst['turn']})"
+            )
+        sites = {}
+        for call in self.calls:
+            for site in call["sites"]:
+                sites[site["site"]] = sites.get(site["site"], 0) + site["size"]
+        top_sites = sorted(sites.items(), key=lambda s: -s[1])
+        for site, size in top_sites[: self.nsites]:
+            lines.append(f"{size / _MB:7.3f}MB retained by {site}")
+        return lines
+
+    def to_dict(self):
+        if not self.enabled:
+            return None
+        return {"calls": self.calls}
+
+
+# number of stack frames to record per allocation site
+_TRACE_FRAMES = 1
+
+_MB = 1024 * 1024
+
+# ignore the memory used by tracemalloc's own snapshots and this module
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def _get_rss_peak():
+    """
+    Find the peak resident set size of the current process, in MB (or 0 if
+    this cannot be measured on this platform).
+    """
+    if resource is None:
+        return 0
+    # ru_maxrss is in kB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
 def _get_space_usage():
     """
     Find the current and peak Virtual Memory usage of the current process,
@@ -202,6 +533,10 @@ def _get_space_usage():
 
 _DEFAULT_MEM_USAGE = 0
 
+# process peak usage when the line was set, and peak usage seen since then
+_PEAK_MEM_USAGE = 0
+_WINDOW_PEAK_USAGE = 0
+
 _SPACE_ENABLED = False
 
 
@@ -209,11 +544,16 @@ def set_space_line():
     """
     by default, the python interpreter uses a significant amount of space
     measure this first to later subtract from all measurements
+
+    this also starts a new accounting window for peak usage, so it can be
+    called again before each game when playing many games in one process
     """
     global _SPACE_ENABLED, _DEFAULT_MEM_USAGE
+    global _PEAK_MEM_USAGE, _WINDOW_PEAK_USAGE
 
     try:
-        _DEFAULT_MEM_USAGE, _ = _get_space_usage()
+        _DEFAULT_MEM_USAGE, _PEAK_MEM_USAGE = _get_space_usage()
+        _WINDOW_PEAK_USAGE = _DEFAULT_MEM_USAGE
         _SPACE_ENABLED = True
     except:
         # this also gives us a chance to detect if our space-measuring method
@@ -0,0 +1,252 @@
+"""
+Position snapshots: save the state of a game part-way through, and start
+new games from it (e.g. to measure players' speed in the midgame without
+playing out an opening every time).
+
+A position is stored as a JSON object (one per line in a position file):
+
+    {"n": 4, "cells": ["r...", ".b..", "..r.", "...."], "to_move": "blue",
+     "nturns": 3, "steal": false, "moves": [["PLACE", 0, 0], ...]}
+
+* cells   -- one string per row r, with one symbol per column q: "r" for a
+             red token, "b" for a blue token and "." for an empty cell.
+* to_move -- the colour of the player to move next (which must agree with
+             the number of turns played, since red always moves first).
+* nturns  -- the number of turns played so far (for the STEAL and maximum
+             turns rules).
+* steal   -- whether blue may still play STEAL (only ever on turn 2).
+* moves   -- optional: the actions that led to this position, from the
+             empty board. If present, they must lead to exactly these cells.
+
+Players are synchronised to the position with their `.setup(cells, nturns)`
+method, if they have one (`cells` maps each occupied (r, q) to "red" or
+"blue"), or else by replaying the move list through their `.turn()` method.
+
+Usage: python -m referee.position [options] n POSFILE
+(generates positions by random play; run with --help for details)
+"""
+
+import json
+import random
+import argparse
+import collections
+
+from referee.game import Game, IllegalActionException
+from referee.game import _PLAYER_AXIS, _PLAYER_TURN_ORDER
+from referee.game import _SYMBOL_TOKENS
+from referee.options import parse_board_sizes
+
+_TOKEN_SYMBOLS = {token: symbol for symbol, token in _SYMBOL_TOKENS.items()}
+
+# A position snapshot (see above); moves is None if unknown
+Position = collections.namedtuple(
+    "Position", "n cells to_move nturns steal moves", defaults=(None,)
+)
+
+
+def snapshot(game, moves=None):
+    """
+    Snapshot of a game's current position (with the given move list, if
+    it is known).
+    """
+    n = game.board.n
+    cells = tuple(
+        "".join(_TOKEN_SYMBOLS[game.board[(r, q)]] for q in range(n))
+        for r in range(n)
+    )
+    return Position(
+        n,
+        cells,
+        game._turn_player(),
+        game.nturns,
+        game.nturns == 1 and game.allow_steal,
+        None if moves is None else [tuple(action) for action in moves],
+    )
+
+
+def occupied_cells(position):
+    """
+    Dict mapping each occupied (r, q) of a position to "red" or "blue" (the
+    argument players' .setup() methods are given).
+    """
+    return {
+        (r, q): _SYMBOL_TOKENS[symbol]
+        for r, row in enumerate(position.cells)
+        for q, symbol in enumerate(row)
+        if symbol != "."
+    }
+
+
+def parse_position(data):
+    """
+    Convert a decoded JSON object into a Position, checking that it is
+    consistent. Raises ValueError if not.
+    """
+    missing = [field for field in Position._fields[:-1] if field not in data]
+    if missing:
+        raise ValueError(f"position is missing {', '.join(missing)}")
+    moves = data.get("moves")
+    if moves is not None:
+        moves = [tuple(action) for action in moves]
+    position = Position(
+        data["n"],
+        tuple(data["cells"]),
+        data["to_move"],
+        data["nturns"],
+        data["steal"],
+        moves,
+    )
+    n = position.n
+    if len(position.cells) != n or any(len(r) != n for r in position.cells):
+        raise ValueError(f"position cells are not a {n}x{n} board")
+    if not set("".join(position.cells)) <= set(_SYMBOL_TOKENS):
+        raise ValueError("position cells may only contain 'r', 'b' and '.'")
+    if position.to_move != _PLAYER_TURN_ORDER[position.nturns % 2]:
+        raise ValueError(
+            f"{position.to_move} cannot be to move after "
+            f"{position.nturns} turns"
+        )
+    if position.steal and position.nturns != 1:
+        raise ValueError("STEAL is only allowed on the second turn")
+    if moves is not None:
+        if len(moves) != position.nturns:
+            raise ValueError("position move list does not match nturns")
+        game = Game(n)
+        for turn, action in enumerate(moves, 1):
+            if game.over():
+                raise ValueError(
+                    f"position move list continues after the game ended "
+                    f"(turn {turn})"
+                )
+            try:
+                game.update(game._turn_player(), action)
+            except IllegalActionException as e:
+                raise ValueError(
+                    f"position move list has an illegal action on turn "
+                    f"{turn}: {e}"
+                ) from e
+        if snapshot(game).cells != position.cells:
+            raise ValueError("position move list does not lead to its cells")
+    return position
+
+
+def write_positions(filename, positions, mode="a"):
+    with open(filename, mode) as position_file:
+        for position in positions:
+            data = position._asdict()
+            if data["moves"] is None:
+                del data["moves"]
+            position_file.write(json.dumps(data) + "\n")
+
+
+def read_positions(filename):
+    """
+    Read all positions from a position file, as a list of Positions.
+    """
+    with open(filename) as position_file:
+        return [
+            parse_position(json.loads(line))
+            for line in position_file
+            if line.strip()
+        ]
+
+
+def load_position(spec):
+    """
+    Load one position given a specification of the form POSFILE[:INDEX]
+    (the INDEX-th position in the file, default 0).
+    """
+    filename, _, index = spec.rpartition(":")
+    if not filename or not index.isdigit():
+        filename, index = spec, 0
+    positions = read_positions(filename)
+    if not positions:
+        raise ValueError(f"no positions in {filename!r}")
+    if int(index) >= len(positions):
+        raise ValueError(
+            f"no position {index} in {filename!r} "
+            f"(it has {len(positions)})"
+        )
+    return positions[int(index)]
+
+
+def random_position(n, fill, rng):
+    """
+    Play random legal PLACE actions from the empty board until at least a
+    `fill` fraction of the board's cells are occupied, avoiding moves that
+    would win the game. Returns the position (with its move list), or None
+    if the game ended first anyway.
+    """
+    game = Game(n)
+    moves = []
+    occupied = 0
+    while occupied < fill * n * n:
+        empty = [
+            (r, q)
+            for r in range(n)
+            for q in range(n)
+            if not game.board.is_occupied((r, q))
+            and not (game.nturns == 0 and r * 2 == q * 2 == n - 1)
+        ]
+        rng.shuffle(empty)
+        colour = game._turn_player()
+        coord = next(
+            (c for c in empty if not _is_winning(game.board, colour, c)),
+            empty[0],
+        )
+        action = ("PLACE", *coord)
+        game.update(game._turn_player(), action)
+        moves.append(action)
+        if game.over():
+            return None
+        occupied += 1 - len(game.last_captures)
+    return snapshot(game, moves)
+
+
+def _is_winning(board, colour, coord):
+    # (captures only remove the opponent's tokens, so they cannot affect
+    # whether the placed token connects the player's edges)
+    board[coord] = colour
+    axis = _PLAYER_AXIS[colour]
+    axis_vals = [c[axis] for c in board.connected_coords(coord)]
+    board[coord] = None
+    return min(axis_vals) == 0 and max(axis_vals) == board.n - 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.position",
+        description="generate Cachex position snapshots at given board fill "
+        "levels by seeded random play.",
+    )
+    parser.add_argument(
+        "n",
+        type=parse_board_sizes,
+        help="size of the game board, or a range of sizes (e.g. 3-6)",
+    )
+    parser.add_argument("positions", metavar="POSFILE",
+        help="file to append the positions to")
+    parser.add_argument("-f", "--fill", type=float, nargs="+",
+        default=[0.25, 0.5, 0.75],
+        help="fractions of the board to fill (default: %(default)s)")
+    parser.add_argument("-k", "--count", type=int, default=1,
+        help="number of positions per board size and fill level "
+        "(default: %(default)s)")
+    parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+    options = parser.parse_args(argv)
+
+    rng = random.Random(options.seed)
+    for n in options.n:
+        for fill in options.fill:
+            positions = []
+            while len(positions) < options.count:
+                position = random_position(n, fill, rng)
+                if position is not None:
+                    positions.append(position)
+            write_positions(options.positions, positions)
+            print(f"n={n}, fill={fill:g}: {len(positions)} positions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Generate (position, move, outcome) training records by self-play, streaming
+them to a dataset directory as the games are played.
+
+Records are captured by a Game update hook (see Game), buffered in fixed
+size chunks, and written as compressed columnar blocks (one .npz "shard"
+file per chunk), so memory use is bounded by the chunk size no matter how
+many or how long the games are. A game's outcome is only known once it
+ends, by which time its earlier records may already be on disk, so
+outcomes go in a separate small table (stored alongside the records in
+each shard) and are joined to the records when the dataset is read.
+
+A dataset directory holds:
+* dataset.json -- the board size and a list of the runs that wrote to the
+                  dataset (each run's players, seed and range of game ids).
+* RUN-TASK-CHUNK.npz -- the shards. Each holds the record columns
+                  game (int64 game id), nturns (int16: turns played before
+                  the move, so the position's colour to move is red iff it
+                  is even), cells (int8, (K, n, n): 0 empty, 1 red, 2
+                  blue) and move (int16: r * n + q for PLACE, n * n for
+                  STEAL), and the outcome columns outcome_game (int64) and
+                  outcome (int8: a result code from referee.vecenv, or
+                  RESULT_ERROR if the game was abandoned after an error).
+
+Running again with the same dataset directory appends new games (with new
+game ids and, by default, new seeds). Shards are written to a temporary
+file and then renamed, so readers never see a partial shard.
+
+Usage: python -m referee.selfplay [options] n DATASET [player [player]]
+(run `python -m referee.selfplay --help` for details)
+"""
+
+import os
+import glob
+import json
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from referee.log import config, comment, quiet
+from referee.batch import make_specs, run_game, _init_worker
+from referee.vecenv import RESULT_RED, RESULT_BLUE, result_code
+from referee.options import parse_package_spec
+
+DATASET_VERSION = 1
+
+MANIFEST = "dataset.json"
+
+# Outcome of games that ended with an error (e.g. a crashing player)
+RESULT_ERROR = -1
+
+DEFAULT_CHUNK_SIZE = 16384
+
+
+class DatasetWriter:
+    """
+    Buffer records (from a Game update hook) and outcomes, writing them to
+    a new shard whenever `chunk_size` records have been collected:
+
+        writer = DatasetWriter(directory, n, "0000-00000")
+        writer.begin_game(game_id)
+        play(players, n, update_hooks=[writer.record], ...)
+        writer.end_game(result)
+        ...
+        writer.close()
+    """
+
+    def __init__(self, directory, n, prefix, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.directory = directory
+        self.n = n
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.game = self.nturns = None
+        self.chunks = 0
+        self.count = 0
+        self._games = np.zeros(chunk_size, dtype=np.int64)
+        self._nturns = np.zeros(chunk_size, dtype=np.int16)
+        self._cells = np.zeros((chunk_size, n, n), dtype=np.int8)
+        self._moves = np.zeros(chunk_size, dtype=np.int16)
+        self._outcomes = []
+
+    def begin_game(self, game):
+        """
+        Start recording the game with the given id.
+        """
+        self.game = game
+
+    def record(self, game, player, action):
+        """
+        Update hook: record the position and the action played in it.
+        """
+        n = self.n
+        i = self.count
+        self._games[i] = self.game
+        self._nturns[i] = game.nturns
+        self._cells[i] = game.board._data
+        if action[0] == "STEAL":
+            self._moves[i] = n * n
+        else:
+            self._moves[i] = action[1] * n + action[2]
+        self.count += 1
+        if self.count == self.chunk_size:
+            self.flush()
+
+    def end_game(self, result):
+        """
+        Record the result string of the current game (see play()).
+        """
+        if result is None or result.startswith("error"):
+            outcome = RESULT_ERROR
+        else:
+            outcome = result_code(result)
+        self._outcomes.append((self.game, outcome))
+        self.game = None
+
+    def flush(self):
+        """
+        Write the buffered records and outcomes (if any) to a new shard.
+        """
+        if not self.count and not self._outcomes:
+            return
+        k = self.count
+        outcomes = np.array(self._outcomes, dtype=np.int64).reshape(-1, 2)
+        name = os.path.join(
+            self.directory, f"{self.prefix}-{self.chunks:05d}.npz"
+        )
+        with open(name + ".tmp", "wb") as shard_file:
+            np.savez_compressed(
+                shard_file,
+                game=self._games[:k],
+                nturns=self._nturns[:k],
+                cells=self._cells[:k],
+                move=self._moves[:k],
+                outcome_game=outcomes[:, 0],
+                outcome=outcomes[:, 1].astype(np.int8),
+            )
+        os.replace(name + ".tmp", name)
+        self.chunks += 1
+        self.count = 0
+        self._outcomes = []
+
+    def close(self):
+        self.flush()
+
+
+def read_manifest(directory):
+    """
+    The manifest of a dataset directory (None if there is no dataset).
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    if manifest["version"] != DATASET_VERSION:
+        raise ValueError(f"unsupported dataset version {manifest['version']}")
+    return manifest
+
+
+def write_manifest(directory, manifest):
+    filename = os.path.join(directory, MANIFEST)
+    with open(filename + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(filename + ".tmp", filename)
+
+
+def read_dataset(directory):
+    """
+    Iterate over the records of a dataset, one shard at a time. Yields
+    dicts of the record columns (see above) plus outcome (the game's
+    result code; RESULT_NONE if it is not yet known, e.g. while the game
+    is still being played) and value (float32: 1 if the player to move
+    went on to win, -1 if they lost, 0 for draws and unknown outcomes).
+    Only the (small) outcome tables are held in memory throughout.
+    """
+    shards = sorted(glob.glob(os.path.join(directory, "*.npz")))
+    games = [np.zeros(0, dtype=np.int64)]
+    outcomes = [np.zeros(0, dtype=np.int8)]
+    for shard in shards:
+        with np.load(shard) as data:
+            games.append(data["outcome_game"])
+            outcomes.append(data["outcome"])
+    games, outcomes = np.concatenate(games), np.concatenate(outcomes)
+    order = np.argsort(games)
+    games, outcomes = games[order], outcomes[order]
+
+    for shard in shards:
+        with np.load(shard) as data:
+            records = {
+                name: data[name] for name in ("game", "nturns", "cells", "move")
+            }
+        index = np.searchsorted(games, records["game"])
+        known = index < len(games)
+        known[known] = games[index[known]] == records["game"][known]
+        outcome = np.zeros(len(index), dtype=np.int8)
+        outcome[known] = outcomes[index[known]]
+        to_move = records["nturns"] % 2 + 1
+        value = np.zeros(len(outcome), dtype=np.float32)
+        value[(outcome == RESULT_RED) | (outcome == RESULT_BLUE)] = -1
+        value[outcome == to_move] = 1
+        records["outcome"] = outcome
+        records["value"] = value
+        yield records
+
+
+def play_task(task):
+    """
+    Play a block of games (a list of (game id, GameSpec) pairs) in this
+    (worker) process, streaming their records to shards named after the
+    run and task numbers. Returns a list of (game id, result string).
+    """
+    directory, run, number, games, chunk_size = task
+    n = games[0][1].n
+    writer = DatasetWriter(directory, n, f"{run:04d}-{number:05d}", chunk_size)
+    results = []
+    for game_id, spec in games:
+        writer.begin_game(game_id)
+        result = run_game(spec, update_hooks=[writer.record])["result"]
+        writer.end_game(result)
+        results.append((game_id, result))
+    writer.close()
+    return results
+
+
+def _play_task_quietly(task):
+    # (for playing games in the main process, without its commentary)
+    with quiet():
+        return play_task(task)
+
+
+def selfplay(
+    directory,
+    n,
+    player_locs,
+    games,
+    seed=None,
+    workers=0,
+    games_per_task=16,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    time_limit=0,
+    space_limit=0,
+):
+    """
+    Play `games` games between the given players (alternating colours)
+    and add their records to the dataset in `directory` (creating it if
+    necessary). Seeds are consecutive from `seed`, which defaults to the
+    first new game id (so that each run appends different games). Yields
+    (game id, result string) for each game as it finishes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    if manifest is None:
+        manifest = {"version": DATASET_VERSION, "n": n, "runs": []}
+    elif manifest["n"] != n:
+        raise ValueError(
+            f"dataset {directory!r} has board size {manifest['n']}, not {n}"
+        )
+    first = sum(r["games"] for r in manifest["runs"])
+    if seed is None:
+        seed = first
+    run = {
+        "run": len(manifest["runs"]),
+        "players": [":".join(loc) for loc in player_locs],
+        "first_game": first,
+        "games": games,
+        "seed": seed,
+        "complete": False,
+    }
+    # (the run's game ids are reserved before any shards are written)
+    manifest["runs"].append(run)
+    write_manifest(directory, manifest)
+
+    specs = make_specs([n], player_locs, games, seed)
+    numbered = list(enumerate(specs, first))
+    tasks = [
+        (directory, run["run"], number, numbered[i:i + games_per_task],
+            chunk_size)
+        for number, i in enumerate(range(0, games, games_per_task))
+    ]
+    settings = (player_locs, time_limit, space_limit, False)
+    if workers > 0:
+        with multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=settings
+        ) as pool:
+            for results in pool.imap_unordered(play_task, tasks):
+                yield from results
+    else:
+        _init_worker(*settings, quiet=False)
+        for task in tasks:
+            yield from _play_task_quietly(task)
+
+    run["complete"] = True
+    write_manifest(directory, manifest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.selfplay",
+        description="stream (position, move, outcome) records from "
+        "self-play games to a dataset directory.",
+    )
+    parser.add_argument("n", type=int, help="size of the game board")
+    parser.add_argument("dataset", metavar="DATASET",
+        help="dataset directory (created, or appended to if it exists)")
+    parser.add_argument("player_locs", metavar="player", nargs="*",
+        type=parse_package_spec,
+        help="location of the Player class(es) playing (default: br4h "
+        "against itself)")
+    parser.add_argument("-g", "--games", type=int, default=100,
+        help="number of games to play (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of worker processes, or 0 to play in this process "
+        "(default: number of CPUs)")
+    parser.add_argument("-r", "--seed", type=int,
+        help="random seed for the first game (default: the first new game "
+        "id)")
+    parser.add_argument("-k", "--task-size", type=int, default=16,
+        help="games per worker task (default: %(default)s)")
+    parser.add_argument("-c", "--chunk-size", type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="records per shard (default: %(default)s)")
+    parser.add_argument("-t", "--time", metavar="time_limit", type=float,
+        default=0, help="limit on CPU time (float, seconds) for each player.")
+    parser.add_argument("-s", "--space", metavar="space_limit", type=float,
+        default=0, help="limit on memory space (float, MB) for each player.")
+    options = parser.parse_args(argv)
+    if options.n < 3:
+        parser.error("board size must be at least 3")
+    player_locs = options.player_locs or [parse_package_spec("br4h")]
+    if len(player_locs) > 2:
+        parser.error("at most 2 players may be given")
+    if len(player_locs) == 1:
+        player_locs = player_locs * 2
+
+    config(level=1)
+    for game_id, result in selfplay(
+        options.dataset,
+        options.n,
+        player_locs,
+        options.games,
+        options.seed,
+        options.workers,
+        options.task_size,
+        options.chunk_size,
+        options.time,
+        options.space,
+    ):
+        comment(f"game {game_id}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Decide whether Player class A is stronger than Player class B with as few
+games as possible, by playing colour-balanced pairs of games and running a
+sequential probability ratio test (SPRT) on the results after each pair.
+
+The test is between H0: elo(A - B) = elo0 and H1: elo(A - B) = elo1, and
+stops as soon as the log-likelihood ratio (LLR) leaves the interval
+[log(beta / (1 - alpha)), log((1 - beta) / alpha)]. Each pair of games
+(with the same seed and board size, A playing red in one and blue in the
+other) is one observation, with score 0, 1/4, 1/2, 3/4 or 1 for A (the
+"pentanomial" model), which accounts for the correlation between the two
+games of a pair. The LLR uses the usual normal approximation (GSPRT).
+
+Usage: python -m referee.sprt [options] n A B
+(run `python -m referee.sprt --help` for details)
+"""
+
+import math
+import argparse
+import collections
+import multiprocessing
+
+from referee.log import config, comment
+from referee.batch import GameSpec, GamePool, describe_result
+from referee.options import PackageSpecAction, parse_board_sizes
+
+# Pair scores for A in the pentanomial model
+PAIR_SCORES = (0, 0.25, 0.5, 0.75, 1)
+
+
+def elo_to_score(elo):
+    """
+    Expected score of a player `elo` Elo points stronger than its opponent.
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+class SPRT:
+    """
+    Sequential probability ratio test on the pentanomial results of game
+    pairs. Call `add(pair_score)` after each pair and check `status()`.
+    """
+
+    def __init__(self, elo0=0, elo1=10, alpha=0.05, beta=0.05):
+        self.s0 = elo_to_score(elo0)
+        self.s1 = elo_to_score(elo1)
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.counts = collections.Counter()
+
+    def add(self, pair_score):
+        self.counts[pair_score] += 1
+
+    def pairs(self):
+        return sum(self.counts.values())
+
+    def mean_var(self):
+        """
+        Mean and variance of the pair scores.
+        """
+        return _mean_var(self.counts)
+
+    def llr(self):
+        """
+        Log-likelihood ratio of H1 to H0 (normal approximation).
+        """
+        if self.pairs() < 2:
+            return 0.0
+        mean, var = _mean_var(self.counts)
+        if var == 0:
+            # (e.g. A has won every pair so far) regularise with one
+            # pseudo-observation of each possible pair score
+            pseudo = collections.Counter(dict.fromkeys(PAIR_SCORES, 1))
+            mean, var = _mean_var(self.counts + pseudo)
+        return (
+            self.pairs()
+            * (self.s1 - self.s0)
+            * (2 * mean - self.s0 - self.s1)
+            / (2 * var)
+        )
+
+    def status(self):
+        """
+        "H0" or "H1" if the test has accepted that hypothesis, else None.
+        """
+        llr = self.llr()
+        if llr <= self.lower:
+            return "H0"
+        if llr >= self.upper:
+            return "H1"
+        return None
+
+    def elo(self, z=1.96):
+        """
+        Estimated Elo difference (A - B) with a (95% by default) confidence
+        interval, as (elo, lower, upper).
+        """
+        mean, var = self.mean_var()
+        error = z * math.sqrt(var / self.pairs())
+        return (
+            score_to_elo(mean),
+            score_to_elo(mean - error),
+            score_to_elo(mean + error),
+        )
+
+
+def _mean_var(counts):
+    n = sum(counts.values())
+    mean = sum(s * c for s, c in counts.items()) / n
+    var = sum(c * (s - mean) ** 2 for s, c in counts.items()) / n
+    return mean, var
+
+
+def make_pair_specs(sizes, a_loc, b_loc, max_pairs, seed=0):
+    """
+    Generate game specs in pairs (A red then B red, with the same seed and
+    board size), cycling through the board sizes.
+    """
+    for i in range(max_pairs):
+        n = sizes[i % len(sizes)]
+        yield GameSpec(n, a_loc, b_loc, seed + i)
+        yield GameSpec(n, b_loc, a_loc, seed + i)
+
+
+def score_for(result, loc):
+    """
+    Points scored in a game by the player at loc (1 win, 0.5 draw, 0 loss),
+    or None if the game ended in an error.
+    """
+    outcome = result["result"]
+    spec = GameSpec(**result["spec"])
+    if outcome.startswith("winner: "):
+        winner = spec.red if outcome.endswith("red") else spec.blue
+        return 1.0 if tuple(winner) == tuple(loc) else 0.0
+    if outcome.startswith("draw"):
+        return 0.5
+    return None
+
+
+def run_sprt(pool, test, specs, a_loc):
+    """
+    Play game pairs from the pool until the test is conclusive (or the
+    specs run out, or a game ends in an error). Returns the test status.
+    """
+    results = pool.play(specs)
+    for first in results:
+        second = next(results)
+        scores = [score_for(first, a_loc), score_for(second, a_loc)]
+        if None in scores:
+            for result in (first, second):
+                comment(describe_result(result))
+            comment("stopping: a game ended in an error")
+            return None
+        test.add(sum(scores) / 2)
+        elo, lo, hi = test.elo()
+        comment(
+            f"pairs: {test.pairs():5d}  LLR: {test.llr():6.2f} "
+            f"[{test.lower:.2f}, {test.upper:.2f}]  "
+            f"elo: {elo:+7.1f} [{lo:+7.1f}, {hi:+7.1f}]"
+        )
+        if test.status() is not None:
+            return test.status()
+    return None
+
+
+def get_options(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.sprt",
+        description="play colour-balanced pairs of Cachex games between "
+        "Player classes A and B until an SPRT decides whether A is stronger.",
+    )
+    parser.add_argument(
+        "n",
+        type=parse_board_sizes,
+        help="size of the game board, or a range of sizes to cycle through "
+        "(e.g. 5-7)",
+    )
+    for name in ("A", "B"):
+        parser.add_argument(
+            f"{name.lower()}_loc",
+            metavar=name,
+            action=PackageSpecAction,
+            help=f"location of Player class {name}",
+        )
+    parser.add_argument("--elo0", type=float, default=0,
+        help="Elo difference under H0 (default: %(default)s)")
+    parser.add_argument("--elo1", type=float, default=10,
+        help="Elo difference under H1 (default: %(default)s)")
+    parser.add_argument("--alpha", type=float, default=0.05,
+        help="false positive rate (default: %(default)s)")
+    parser.add_argument("--beta", type=float, default=0.05,
+        help="false negative rate (default: %(default)s)")
+    parser.add_argument("-p", "--max-pairs", type=int, default=10000,
+        help="give up after this many pairs (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of worker processes, or 0 to play in this process "
+        "(default: number of CPUs)")
+    parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed for the first pair (default: %(default)s)")
+    parser.add_argument("-t", "--time", metavar="time_limit", type=float,
+        default=0, help="limit on CPU time (float, seconds) for each player.")
+    parser.add_argument("-s", "--space", metavar="space_limit", type=float,
+        default=0, help="limit on memory space (float, MB) for each player.")
+    options = parser.parse_args(argv)
+    if options.elo0 >= options.elo1:
+        parser.error("elo0 must be less than elo1")
+    return options
+
+
+def main(argv=None):
+    options = get_options(argv)
+    config(level=1)
+    test = SPRT(options.elo0, options.elo1, options.alpha, options.beta)
+    specs = make_pair_specs(
+        options.n, options.a_loc, options.b_loc, options.max_pairs,
+        options.seed,
+    )
+    with GamePool(
+        options.workers,
+        (options.a_loc, options.b_loc),
+        time_limit=options.time,
+        space_limit=options.space,
+    ) as pool:
+        status = run_sprt(pool, test, specs, options.a_loc)
+
+    comment("sprt result:", depth=-1)
+    if test.pairs():
+        elo, lo, hi = test.elo()
+        comment(
+            f"{test.pairs()} pairs ({2 * test.pairs()} games), "
+            f"elo(A - B): {elo:+.1f} (95% CI [{lo:+.1f}, {hi:+.1f}])",
+            depth=1,
+        )
+    if status == "H1":
+        comment(f"H1 accepted: A is stronger (elo >= {options.elo1:g})",
+            depth=1)
+    elif status == "H0":
+        comment(f"H0 accepted: A is not stronger (elo <= {options.elo0:g})",
+            depth=1)
+    else:
+        comment("inconclusive", depth=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+A vectorised environment that plays a batch of Cachex games at once, for
+self-play and tuning loops that step many games from one Python loop
+(without play()'s display, logging, player wrappers and result strings).
+
+The B games are held in NumPy arrays and stepped together:
+
+    env = VecEnv(n, B)
+    cells = env.reset(seeds=0)
+    while not env.done.all():
+        cells, rewards, ended = env.step(env.random_actions())
+
+Actions are integers: r * n + q to PLACE a token at (r, q), or n * n
+(STEAL_ACTION) to STEAL. The rules are applied exactly as by Game.update
+and Game._turn_detect_end (captures, the first-move centre and STEAL rules,
+wins, and draws by repeated states or the maximum number of turns), except
+that repeated states are recognised by a 64-bit hash of the board rather
+than by comparing whole boards.
+
+Observations are read-only views of the environment's arrays (they change
+as the games are stepped, so copy them if they need to be kept):
+* cells  -- (B, n, n) int8: 0 empty, 1 red, 2 blue (as in Board._data).
+* nturns -- (B,) number of turns played in each game.
+* result -- (B,) int8: RESULT_NONE while a game is in progress, else how
+            it ended (see RESULT_NAMES).
+
+Usage: python -m referee.vecenv [options] n
+(plays random games to measure throughput; run with --help for details)
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from referee.board import _CAPTURE_PATTERNS, _ADD
+from referee.game import Game, IllegalActionException, _MAX_REPEAT_STATES
+from referee.game import _MAX_TURNS
+
+# Game results
+RESULT_NONE = 0
+RESULT_RED = 1
+RESULT_BLUE = 2
+RESULT_DRAW_REPEAT = 3
+RESULT_DRAW_TURNS = 4
+RESULT_NAMES = {
+    RESULT_NONE: None,
+    RESULT_RED: "winner: red",
+    RESULT_BLUE: "winner: blue",
+    RESULT_DRAW_REPEAT: "draw: repeated state",
+    RESULT_DRAW_TURNS: "draw: maximum number of turns reached",
+}
+
+# Largest board whose rows fit in the (64 bit) bitboards used to detect wins
+MAX_N = 64
+
+# Value of the extra "off the board" cell at the end of each game's cells,
+# which capture patterns that would leave the board point to
+_OFF_BOARD = 3
+
+_ONE = np.uint64(1)
+
+# Number of bits in each game's filter of the board hashes seen so far
+_SEEN_BITS = 1024
+
+
+class VecEnv:
+    """
+    A batch of `num_games` Cachex games on an n x n board.
+    """
+
+    def __init__(self, n, num_games):
+        if not 3 <= n <= MAX_N:
+            raise ValueError(f"board size must be between 3 and {MAX_N}")
+        self.n = n
+        self.num_games = num_games
+        self.num_actions = n * n + 1
+        self.STEAL_ACTION = n * n
+
+        # (capture patterns of each cell as flat cell indices, with cells
+        # outside the board pointing to the off-board cell)
+        self._patterns = np.full((n * n, len(_CAPTURE_PATTERNS), 3), n * n)
+        for r in range(n):
+            for q in range(n):
+                for i, pattern in enumerate(_CAPTURE_PATTERNS):
+                    coords = [_ADD((r, q), step) for step in pattern]
+                    if all(0 <= a < n and 0 <= b < n for a, b in coords):
+                        self._patterns[r * n + q, i] = [
+                            a * n + b for a, b in coords
+                        ]
+        # (keys for hashing boards: the hash is the XOR of the keys of the
+        # occupied cells, so empty cells have key 0)
+        keys = np.random.default_rng(0).integers(
+            1, 2**63, size=(n * n, 3), dtype=np.uint64
+        )
+        keys[:, 0] = 0
+        self._keys = keys
+        self._row_bits = _ONE << np.arange(n, dtype=np.uint64)
+        self._transpose = np.arange(n * n).reshape(n, n).T.ravel()
+
+        self._board = np.zeros((num_games, n * n + 1), dtype=np.int8)
+        self._nturns = np.zeros(num_games, dtype=np.int32)
+        self._result = np.zeros(num_games, dtype=np.int8)
+        self._hash = np.zeros(num_games, dtype=np.uint64)
+        self._history = np.zeros((num_games, _MAX_TURNS + 1), dtype=np.uint64)
+        self._captures = np.zeros(num_games, dtype=np.int32)
+        # (a bitset of the hashes seen in each game, by their low bits, so
+        # that the history need only be searched for hashes that may have
+        # been seen before)
+        self._seen = np.zeros((num_games, _SEEN_BITS // 64), dtype=np.uint64)
+        # (each colour's tokens as bitboards: one uint64 per row, with bit
+        # q set for a token at (r, q), for detecting wins)
+        self._bits = np.zeros((num_games, 2, n), dtype=np.uint64)
+        # (and the tokens of each colour connected to that player's start
+        # edge, row 0 for red and column 0 for blue, kept up to date as
+        # tokens are placed and captured, so that a new token can only win
+        # if it joins them)
+        self._reach = np.zeros((num_games, 2, n), dtype=np.uint64)
+        self.rng = np.random.default_rng()
+
+        self.cells = _readonly(self._board[:, : n * n].reshape(-1, n, n))
+        self.nturns = _readonly(self._nturns)
+        self.result = _readonly(self._result)
+        self.reset()
+
+    @property
+    def done(self):
+        """
+        (B,) bool: whether each game has ended.
+        """
+        return self._result != RESULT_NONE
+
+    @property
+    def to_move(self):
+        """
+        (B,) int8: the colour to move in each game (1 red, 2 blue).
+        """
+        return (self._nturns % 2 + 1).astype(np.int8)
+
+    def reset(self, seeds=None, indices=None):
+        """
+        Start new games on the empty board: all of them, or only those with
+        the given indices (e.g. `np.flatnonzero(env.done)`). If seeds is
+        given (an int or a sequence of ints), reseed the generator used by
+        random_actions. Returns the cells observation.
+        """
+        if seeds is not None:
+            self.rng = np.random.default_rng(seeds)
+        if indices is None:
+            indices = slice(None)
+        self._board[indices] = 0
+        self._board[indices, -1] = _OFF_BOARD
+        self._nturns[indices] = 0
+        self._result[indices] = RESULT_NONE
+        self._hash[indices] = 0
+        self._history[indices, 0] = 0
+        self._captures[indices] = 0
+        self._seen[indices] = 0
+        self._seen[indices, 0] = _ONE  # (the empty board's hash, 0)
+        self._bits[indices] = 0
+        self._reach[indices] = 0
+        return self.cells
+
+    def legal_actions(self):
+        """
+        (B, n * n + 1) bool mask of the actions allowed in each game (all
+        False in games that have ended).
+        """
+        n = self.n
+        mask = np.empty((self.num_games, self.num_actions), dtype=bool)
+        np.equal(self._board[:, : n * n], 0, out=mask[:, : n * n])
+        if n % 2 == 1:
+            centre = (n // 2) * n + n // 2
+            mask[self._nturns == 0, centre] = False
+        mask[:, self.STEAL_ACTION] = self._nturns == 1
+        mask[self.done] = False
+        return mask
+
+    def random_actions(self):
+        """
+        A uniformly random legal action for each game in progress (and 0
+        for games that have ended).
+        """
+        scores = self.rng.random(
+            (self.num_games, self.num_actions), dtype=np.float32
+        )
+        # (legal actions score in [1, 2), illegal ones in [0, 1))
+        scores += self.legal_actions()
+        return scores.argmax(axis=1)
+
+    def step(self, actions):
+        """
+        Play one action (a (B,) array of ints, see above) in every game in
+        progress; actions for games that have ended are ignored. Raises
+        IllegalActionException if any action is not allowed (leaving all
+        games unchanged). Returns (cells, rewards, ended): the cells
+        observation, (B,) float32 rewards for the player who just moved (1
+        if they won, else 0), and (B,) bool marking the games that ended on
+        this step.
+        """
+        n = self.n
+        actions = np.asarray(actions)
+        games = np.flatnonzero(self._result == RESULT_NONE)
+        actions = actions[games]
+        self._validate(games, actions)
+
+        steal = actions == self.STEAL_ACTION
+        place_games, cells = games[~steal], actions[~steal]
+        steal_games = games[steal]
+        colours = (self._nturns[place_games] % 2 + 1).astype(np.int8)
+
+        # apply PLACE actions (and their captures) and STEAL actions
+        self._board[place_games, cells] = colours
+        self._hash[place_games] ^= self._keys[cells, colours]
+        self._bits[place_games, colours - 1, cells // n] |= (
+            self._row_bits[cells % n]
+        )
+        cut_games, cut_colours = self._apply_captures(
+            place_games, cells, colours
+        )
+        if len(steal_games):
+            swapped = self._board[steal_games, : n * n][:, self._transpose]
+            swapped[swapped != 0] ^= 3
+            self._board[steal_games, : n * n] = swapped
+            self._hash[steal_games] = np.bitwise_xor.reduce(
+                self._keys[np.arange(n * n), swapped], axis=1
+            )
+            swapped = swapped.reshape(-1, 1, n, n) == np.array([1, 2])[
+                :, None, None
+            ]
+            self._bits[steal_games] = (swapped * self._row_bits).sum(
+                axis=3, dtype=np.uint64
+            )
+            cut_games = np.concatenate((cut_games, steal_games, steal_games))
+            cut_colours = np.concatenate(
+                (cut_colours, np.repeat(np.int8([1, 2]), len(steal_games)))
+            )
+
+        # end the turn and check for the end of the game (in the same order
+        # as Game._turn_detect_end)
+        self._nturns[games] += 1
+        nturns = self._nturns[games]
+        self._history[games, nturns] = self._hash[games]
+        result = np.zeros(len(games), dtype=np.int8)
+        # (Game only checks the just-placed token's connection, from turn
+        # 2n - 1, but no player can connect their edges any earlier, and
+        # the last player to move can only connect them with that token)
+        won = self._update_reach(
+            place_games, cells, colours, cut_games, cut_colours
+        )
+        result[np.flatnonzero(~steal)[won]] = colours[won]
+        bucket = self._hash[games] % np.uint64(_SEEN_BITS)
+        words, bits = bucket // np.uint64(64), _ONE << (bucket % np.uint64(64))
+        seen = (self._seen[games, words] & bits) != 0
+        self._seen[games, words] |= bits
+        # (without captures the number of tokens never goes down, so a state
+        # can only repeat in games with captures)
+        repeated = seen & (self._captures[games] > 0) & (result == RESULT_NONE)
+        if repeated.any():
+            check = np.flatnonzero(repeated)
+            length = nturns[check].max() + 1
+            counts = (
+                self._history[games[check], :length]
+                == self._hash[games[check], None]
+            )
+            counts &= np.arange(length) <= nturns[check, None]
+            draw = counts.sum(axis=1) >= _MAX_REPEAT_STATES
+            result[check[draw]] = RESULT_DRAW_REPEAT
+        result[(result == RESULT_NONE) & (nturns >= _MAX_TURNS)] = (
+            RESULT_DRAW_TURNS
+        )
+        self._result[games] = result
+
+        rewards = np.zeros(self.num_games, dtype=np.float32)
+        rewards[games] = (result == RESULT_RED) | (result == RESULT_BLUE)
+        ended = np.zeros(self.num_games, dtype=bool)
+        ended[games] = result != RESULT_NONE
+        return self.cells, rewards, ended
+
+    def _validate(self, games, actions):
+        """
+        Raise IllegalActionException if any of the actions is not allowed.
+        """
+        n = self.n
+        nturns = self._nturns[games]
+        outside = (actions < 0) | (actions > self.STEAL_ACTION)
+        steal = actions == self.STEAL_ACTION
+        cells = np.where(outside | steal, n * n, actions)
+        problems = (
+            (outside, "is not a PLACE or STEAL action"),
+            (steal & (nturns != 1), "is a STEAL, which is only allowed on "
+                "blue's first move"),
+            ((nturns == 0) & (n % 2 == 1) & (cells == (n // 2) * (n + 1)),
+                "is a PLACE in the centre cell on the first move"),
+            (~steal & ~outside & (self._board[games, cells] != 0),
+                "is a PLACE on an occupied cell"),
+        )
+        for illegal, message in problems:
+            if illegal.any():
+                i = np.flatnonzero(illegal)[0]
+                raise IllegalActionException(
+                    f"Action {actions[i]} in game {games[i]} {message}. "
+                    "See the specification/game rules for details."
+                )
+
+    def _apply_captures(self, games, cells, colours):
+        """
+        Apply the captures of tokens just placed at the given cells.
+        Returns the games, and the colour in each, where tokens connected to
+        the player's start edge were captured (whose reach must be found
+        again).
+        """
+        patterns = self._patterns[cells]
+        tokens = self._board[games[:, None, None], patterns]
+        opponents = (3 - colours)[:, None]
+        matches = (
+            (tokens[:, :, 0] == colours[:, None])
+            & (tokens[:, :, 1] == opponents)
+            & (tokens[:, :, 2] == opponents)
+        )
+        i, j = np.nonzero(matches)
+        if not len(i):
+            return games[:0], colours[:0]
+        # (overlapping diamonds can capture the same token twice)
+        captured = np.unique(
+            games[i, None] * (self.n * self.n) + patterns[i, j, 1:]
+        )
+        captured_games, captured_cells = np.divmod(captured, self.n * self.n)
+        opponents = self._board[captured_games, captured_cells]
+        self._board[captured_games, captured_cells] = 0
+        np.bitwise_xor.at(
+            self._hash, captured_games, self._keys[captured_cells, opponents]
+        )
+        np.add.at(self._captures, captured_games, 1)
+        r, q = np.divmod(captured_cells, self.n)
+        np.bitwise_and.at(
+            self._bits, (captured_games, opponents - 1, r), ~self._row_bits[q]
+        )
+        # (a capture can cut off the captured player's other tokens from
+        # their start edge, if the captured token was connected to it)
+        cut = self._reach[captured_games, opponents - 1, r] & self._row_bits[q]
+        cut = cut != 0
+        cut_games, first = np.unique(captured_games[cut], return_index=True)
+        return cut_games, opponents[cut][first]
+
+    def _update_reach(self, games, cells, colours, cut_games, cut_colours):
+        """
+        Add the tokens just placed at the given cells to their players'
+        reach, where they join it, and find the reach of the cut games'
+        colours again from their start edges. Returns whether each placed
+        token now connects both of its player's edges.
+        """
+        n = self.n
+        rows, bits = cells // n, self._row_bits[cells % n]
+        placed = np.zeros((len(games), n), dtype=np.uint64)
+        placed[np.arange(len(games)), rows] = bits
+        reach = self._reach[games, colours - 1]
+        # (a token that neither is on its player's start edge nor touches
+        # their reach is not connected to the start edge, so can't win)
+        joined = np.where(colours == 1, rows == 0, bits == _ONE)
+        joined |= (_grow(placed) & reach).any(axis=1)
+        joined = np.flatnonzero(joined)
+        starts = self._bits[cut_games, cut_colours - 1]
+        starts[cut_colours == 2] &= _ONE
+        starts[cut_colours == 1, 1:] = 0
+
+        # (fill both at once: the cut games' colours are never the colours
+        # just placed, so they are different reaches)
+        games = np.concatenate((games[joined], cut_games))
+        colours = np.concatenate((colours[joined], cut_colours))
+        reach = _fill(
+            np.concatenate((reach[joined] | placed[joined], starts)),
+            self._bits[games, colours - 1],
+        )
+        self._reach[games, colours - 1] = reach
+
+        won = np.zeros(len(rows), dtype=bool)
+        reach = reach[: len(joined)]
+        won[joined] = np.where(
+            colours[: len(joined)] == 1,
+            reach[:, -1] != 0,
+            (np.bitwise_or.reduce(reach, axis=1) & self._row_bits[-1]) != 0,
+        )
+        return won
+
+
+def _grow(reached):
+    """
+    The cells of (B, n) row bitboards together with their neighbours. (The
+    neighbours of (r, q) are (r, q +- 1), (r + 1, q - 1), (r + 1, q),
+    (r - 1, q) and (r - 1, q + 1))
+    """
+    grown = reached | (reached << _ONE) | (reached >> _ONE)
+    grown[:, 1:] |= reached[:, :-1] | (reached[:, :-1] >> _ONE)
+    grown[:, :-1] |= reached[:, 1:] | (reached[:, 1:] << _ONE)
+    return grown
+
+
+def _fill(reached, own):
+    """
+    Flood-fill (B, n) row bitboards of reached cells through the own cells,
+    returning every own cell connected to a reached cell (or reached).
+    """
+    filled = reached.copy()
+    index = np.arange(len(reached))
+    while len(index):
+        grown = _grow(reached) & own
+        # (keep filling only where the cluster is still growing)
+        growing = (grown != reached).any(axis=1)
+        filled[index[~growing]] = grown[~growing]
+        index = index[growing]
+        reached, own = grown[growing], own[growing]
+    return filled
+
+
+def _readonly(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def check_against_game(env, games, rng):
+    """
+    Play `games` random games in the environment and through Game.update
+    side by side, and raise AssertionError if they ever disagree (on the
+    board, or on whether and how the game ended). Returns a dict counting
+    the results of the games.
+    """
+    n = env.n
+    counts = {}
+    env.reset(seeds=int(rng.integers(2**32)))
+    referees = [Game(n) for _ in range(env.num_games)]
+    while sum(counts.values()) < games:
+        actions = env.random_actions()
+        active = np.flatnonzero(~env.done)
+        env.step(actions)
+        for i in active:
+            game = referees[i]
+            if actions[i] == env.STEAL_ACTION:
+                action = ("STEAL",)
+            else:
+                action = ("PLACE", *map(int, divmod(actions[i], n)))
+            game.update(game._turn_player(), action)
+            assert (env.cells[i] == game.board._data).all(), (i, action)
+            assert env.result[i] == result_code(game.result), (i, game.result)
+            if game.over():
+                name = RESULT_NAMES[result_code(game.result)]
+                counts[name] = counts.get(name, 0) + 1
+        finished = np.flatnonzero(env.done)
+        env.reset(indices=finished)
+        for i in finished:
+            referees[i] = Game(n)
+    return counts
+
+
+def result_code(result):
+    """
+    The result code (see RESULT_NAMES) of a Game's result string (None for
+    a game in progress).
+    """
+    if result is None:
+        return RESULT_NONE
+    if result.startswith("winner"):
+        return RESULT_RED if result.endswith("red") else RESULT_BLUE
+    if "maximum" in result:
+        return RESULT_DRAW_TURNS
+    return RESULT_DRAW_REPEAT
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="referee.vecenv",
+        description="play random Cachex games in a vectorised environment "
+        "to measure its throughput.",
+    )
+    parser.add_argument("n", type=int, help="size of the game board")
+    parser.add_argument("-B", "--batch", type=int, default=1024,
+        help="number of games played at once (default: %(default)s)")
+    parser.add_argument("-m", "--moves", type=int, default=1000000,
+        help="number of moves to play (default: %(default)s)")
+    parser.add_argument("-r", "--seed", type=int, default=0,
+        help="random seed (default: %(default)s)")
+    parser.add_argument("-c", "--check", type=int, metavar="GAMES",
+        help="instead, check that GAMES random games agree exactly with "
+        "the referee's Game class")
+    options = parser.parse_args(argv)
+
+    env = VecEnv(options.n, options.batch)
+    if options.check is not None:
+        rng = np.random.default_rng(options.seed)
+        results = check_against_game(env, options.check, rng)
+        print(f"{options.check} games agree: {results}")
+        return
+
+    env.reset(seeds=options.seed)
+    played = games = 0
+    stepping = 0.0
+    start = time.perf_counter()
+    while played < options.moves:
+        actions = env.random_actions()
+        played += env.num_games - np.count_nonzero(env.done)
+        step_start = time.perf_counter()
+        env.step(actions)
+        stepping += time.perf_counter() - step_start
+        finished = np.flatnonzero(env.done)
+        games += len(finished)
+        env.reset(indices=finished)
+    elapsed = time.perf_counter() - start
+    print(f"n={options.n}, B={options.batch}: {played} moves, {games} games")
+    print(f"  {played / elapsed:.0f} moves/s (with random action selection)")
+    print(f"  {played / stepping:.0f} moves/s (step only)")
+
+
+if __name__ == "__main__":
+    main()